@@ -0,0 +1 @@
+default_app_config = 'pydoc.core.apps.CoreConfig'
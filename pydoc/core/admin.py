@@ -1,6 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Case, IntegerField, Sum, When
+from django.db.models.functions import Coalesce
+from pydoc.core import campaigns
+from pydoc.core.mirror import MirrorError, mirror_distribution
 from pydoc.core.models import Package, Release, Classifier, \
-    Distribution, PackageIndex
+    Distribution, PackageIndex, Build, RebuildCampaign
 
 
 class PackageIndexAdmin(admin.ModelAdmin):
@@ -68,10 +72,64 @@ class DistributionAdmin(admin.ModelAdmin):
 
     def mirror_distribution(self, request, queryset):
         for distribution in queryset:
-            distribution.mirror_package(commit=True)
+            try:
+                mirror_distribution(distribution)
+            except (MirrorError, IOError) as e:
+                self.message_user(request, str(e), level=messages.ERROR)
+
+
+class BuildAdmin(admin.ModelAdmin):
+    list_display = ('release', 'state', 'queue', 'attempt', 'queued_at', 'duration',
+                    'download_seconds', 'extract_seconds', 'autoapi_seconds',
+                    'read_seconds', 'write_seconds',)
+    search_fields = ('release__package__name', 'release__version', 'reason',)
+    list_filter = ('state', 'queue', 'campaign',)
+    raw_id_fields = ('release',)
+    date_hierarchy = 'queued_at'
+
+
+class RebuildCampaignAdmin(admin.ModelAdmin):
+    list_display = ('name', 'state', 'rate', 'total', 'scheduled', 'skipped', 'done', 'failed',
+                    'created', 'finished_at',)
+    list_filter = ('state',)
+    readonly_fields = ('cursor', 'total', 'scheduled', 'skipped', 'finished_at',)
+    actions = ('pause', 'resume',)
+
+    def get_queryset(self, request):
+        # Counted in the changelist query rather than per row
+        def count(*states):
+            return Coalesce(Sum(Case(When(builds__state__in=states, then=1), default=0,
+                                     output_field=IntegerField())), 0)
+        return super(RebuildCampaignAdmin, self).get_queryset(request).annotate(
+            done_count=count(Build.SUCCESS),
+            failed_count=count(Build.FAILED, Build.NO_WHEEL),
+        )
+
+    def done(self, obj):
+        return obj.done_count
+    done.admin_order_field = 'done_count'
+
+    def failed(self, obj):
+        return obj.failed_count
+    failed.admin_order_field = 'failed_count'
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.total = obj.releases().count()
+        super(RebuildCampaignAdmin, self).save_model(request, obj, form, change)
+
+    def pause(self, request, queryset):
+        for campaign in queryset:
+            campaigns.pause(campaign)
+
+    def resume(self, request, queryset):
+        for campaign in queryset:
+            campaigns.resume(campaign)
 
 
 admin.site.register(Package, PackageAdmin)
 admin.site.register(Release, ReleaseAdmin)
 admin.site.register(Distribution, DistributionAdmin)
+admin.site.register(Build, BuildAdmin)
+admin.site.register(RebuildCampaign, RebuildCampaignAdmin)
 admin.site.register(Classifier)
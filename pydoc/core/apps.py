@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'pydoc.core'
+    verbose_name = 'Core'
+
+    def ready(self):
+        from . import receivers  # noqa
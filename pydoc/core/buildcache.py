@@ -0,0 +1,221 @@
+"""
+Persistent Sphinx build directories, reused between builds of a package.
+
+Every package gets a cache directory keyed by the package name and a hash of
+the build toolchain (Sphinx, sphinx-autoapi, the theme and our templates)::
+
+    <BUILD_CACHE_DIR>/<package>-<toolchain>/
+        src/         stable source directory sphinx-build reads from
+        doctrees/    the pickled Sphinx environment and doctrees
+        html/        the persistent sphinx-build output directory
+        parsed/      modules parsed by AutoAPI, see pydoc.sphinx.parsecache
+        sources.json content hash of every file in src/
+
+Sources are synced into ``src/`` by content hash, so unchanged modules keep
+their modification time and Sphinx doesn't read them again. The output is
+then published to ``DOCS_DIR`` copying only the pages that changed.
+"""
+
+import fcntl
+import hashlib
+import importlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template.loader import get_template
+
+# Bump to throw away every existing build cache
+CACHE_VERSION = 1
+TEMPLATES = ['sphinx/conf.py.tmpl', 'sphinx/index.rst.tmpl']
+TOOLCHAIN = ['sphinx', 'autoapi', 'sphinx_rtd_theme']
+
+# Written by pydoc.sphinx, the docnames of the last build
+PAGES_FILE = '.pydoc-pages.json'
+# Also written by pydoc.sphinx, the stage durations and counters of the last build
+STATS_FILE = '.pydoc-stats.json'
+# Generated pages that don't come from a source document
+SPECIAL_PAGES = ('genindex', 'search', 'py-modindex')
+
+_toolchain_key = None
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def toolchain_key():
+    """Hash of everything besides the sources that affects the build output."""
+    global _toolchain_key  # pylint: disable=global-statement
+    if _toolchain_key is None:
+        digest = hashlib.sha256(str(CACHE_VERSION).encode('utf-8'))
+        for name in TOOLCHAIN:
+            try:
+                module = importlib.import_module(name)
+            except ImportError:
+                continue
+            digest.update('{}={}'.format(name, getattr(module, '__version__', '')).encode('utf-8'))
+        for name in TEMPLATES:
+            digest.update(get_template(name).template.source.encode('utf-8'))
+        _toolchain_key = digest.hexdigest()
+    return _toolchain_key
+
+
+def _walk(root):
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            yield os.path.relpath(path, root), path
+
+
+class BuildCache(object):
+
+    def __init__(self, project):
+        self.root = os.path.join(
+            settings.BUILD_CACHE_DIR, '{}-{}'.format(project, toolchain_key()[:16]))
+        self.src = os.path.join(self.root, 'src')
+        self.doctrees = os.path.join(self.root, 'doctrees')
+        self.html = os.path.join(self.root, 'html')
+        self.parsed = os.path.join(self.root, 'parsed')
+        self.manifest_path = os.path.join(self.root, 'sources.json')
+
+    @contextmanager
+    def lock(self):
+        """Hold the cache for one build, builds of the same package wait."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield self
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as manifest:
+                return json.load(manifest)
+        except (IOError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        with open(self.manifest_path, 'w') as out:
+            json.dump(manifest, out)
+
+    def sync_sources(self, source_dir, extra_files=None):
+        """
+        Make ``src/`` match ``source_dir`` plus ``extra_files``.
+
+        ``extra_files`` maps relative paths to text content. Only new or
+        changed files are written, files gone from the source are deleted.
+        Returns the number of files ``(written, removed, unchanged)``.
+        """
+        old = self._load_manifest()
+        new = {}
+        written = unchanged = 0
+        for relpath, path in _walk(source_dir):
+            new[relpath] = file_hash(path)
+            target = os.path.join(self.src, relpath)
+            if old.get(relpath) == new[relpath] and os.path.exists(target):
+                unchanged += 1
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(path, target)
+            written += 1
+        for relpath, content in (extra_files or {}).items():
+            data = content.encode('utf-8')
+            new[relpath] = hashlib.sha256(data).hexdigest()
+            target = os.path.join(self.src, relpath)
+            if old.get(relpath) == new[relpath] and os.path.exists(target):
+                unchanged += 1
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as out:
+                out.write(data)
+            written += 1
+        removed = 0
+        for relpath in set(old) - set(new):
+            try:
+                os.remove(os.path.join(self.src, relpath))
+                removed += 1
+            except OSError:
+                pass
+        self._save_manifest(new)
+        return written, removed, unchanged
+
+    def read_stats(self):
+        try:
+            with open(os.path.join(self.html, STATS_FILE)) as stats:
+                return json.load(stats)
+        except (IOError, ValueError):
+            return {}
+
+    def _current_pages(self):
+        try:
+            with open(os.path.join(self.html, PAGES_FILE)) as pages:
+                return set(json.load(pages)) | set(SPECIAL_PAGES)
+        except (IOError, ValueError):
+            return None
+
+    @staticmethod
+    def _docname(relpath):
+        relpath = relpath.replace(os.sep, '/')
+        if relpath.startswith('_sources/'):
+            docname = relpath[len('_sources/'):]
+            for suffix in ('.txt', '.rst', '.md'):
+                if docname.endswith(suffix):
+                    docname = docname[:-len(suffix)]
+            return docname
+        if relpath.endswith('.html'):
+            return relpath[:-len('.html')]
+        return None
+
+    def output_files(self):
+        """
+        Yield ``(relpath, path)`` for the output of the last build.
+
+        Pages of documents that no longer exist are deleted instead.
+        """
+        pages = self._current_pages()
+        for relpath, path in list(_walk(self.html)):
+            if os.path.basename(relpath).startswith('.'):
+                continue
+            docname = self._docname(relpath)
+            if pages is not None and docname is not None and docname not in pages:
+                # Left behind by a build of another version
+                os.remove(path)
+                continue
+            yield relpath, path
+
+    def publish(self, outdir):
+        """
+        Copy the output of the last build to ``outdir``.
+
+        Only files whose content differs from ``outdir`` are written, and
+        pages of documents that no longer exist are dropped from both.
+        Returns the number of files ``(written, removed)``.
+        """
+        wanted = set()
+        written = 0
+        for relpath, path in self.output_files():
+            wanted.add(relpath)
+            target = os.path.join(outdir, relpath)
+            if (os.path.exists(target) and
+                    os.path.getsize(target) == os.path.getsize(path) and
+                    file_hash(target) == file_hash(path)):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(path, target)
+            written += 1
+        removed = 0
+        if os.path.exists(outdir):
+            for relpath, path in list(_walk(outdir)):
+                if relpath not in wanted:
+                    os.remove(path)
+                    removed += 1
+        return written, removed
@@ -0,0 +1,151 @@
+"""
+Run documentation builds as limited subprocesses.
+
+Each ``sphinx-build`` runs in its own process group with a wall clock timeout
+and an address space limit, its output goes to a per release log file, and a
+non zero exit status raises :class:`BuildError`. A fixed number of build slots,
+shared through lock files, caps how many builds run at once on one machine,
+and a build that waits too long for one fails with :class:`SlotTimeout`.
+"""
+
+import fcntl
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+LOG_TAIL = 4000
+
+
+class BuildError(Exception):
+
+    def __init__(self, message, log_tail=''):
+        super(BuildError, self).__init__(message)
+        self.log_tail = log_tail
+
+
+class BuildTimeout(BuildError):
+    pass
+
+
+class SlotTimeout(BuildError):
+    pass
+
+
+def sphinx_jobs():
+    """Number of ``sphinx-build -j`` processes, splitting the cores between slots."""
+    if settings.SPHINX_BUILD_JOBS:
+        return settings.SPHINX_BUILD_JOBS
+    return max(1, (os.cpu_count() or 1) // settings.BUILD_CONCURRENCY)
+
+
+def artifact_path(directory_name, extension):
+    """Path of a build's log, report or profile in ``BUILD_LOG_DIR``."""
+    log_dir = settings.BUILD_LOG_DIR()
+    os.makedirs(log_dir, exist_ok=True)
+    return os.path.join(log_dir, '{}.{}'.format(directory_name, extension))
+
+
+def log_path(directory_name):
+    return artifact_path(directory_name, 'log')
+
+
+def read_tail(path, size=LOG_TAIL):
+    with open(path, 'rb') as log_file:
+        log_file.seek(0, os.SEEK_END)
+        log_file.seek(max(0, log_file.tell() - size))
+        return log_file.read().decode('utf-8', 'replace')
+
+
+@contextmanager
+def build_slot(poll=1.0, timeout=None):
+    """
+    Wait for one of the ``BUILD_CONCURRENCY`` build slots of this machine.
+
+    Raises :class:`SlotTimeout` when none frees up within ``timeout``
+    seconds, ``BUILD_SLOT_TIMEOUT`` by default.
+    """
+    timeout = timeout or settings.BUILD_SLOT_TIMEOUT
+    deadline = time.time() + timeout
+    lock_dir = settings.BUILD_LOCK_DIR
+    os.makedirs(lock_dir, exist_ok=True)
+    while True:
+        for slot in range(settings.BUILD_CONCURRENCY):
+            lock_file = open(os.path.join(lock_dir, 'slot-{}.lock'.format(slot)), 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            try:
+                yield slot
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+            return
+        if time.time() >= deadline:
+            raise SlotTimeout('No build slot was free after {}s'.format(timeout))
+        time.sleep(poll)
+
+
+def _limit_memory(limit):
+    def set_limits():
+        if limit:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    return set_limits
+
+
+def run_command(args, log_file_path, timeout=None, memory_limit=None, cwd=None):
+    """
+    Run ``args``, appending stdout and stderr to ``log_file_path``.
+
+    The process and its children are killed once ``timeout`` seconds pass.
+    Raises :class:`BuildTimeout` on timeout and :class:`BuildError` on a non
+    zero exit status.
+    """
+    timeout = timeout or settings.BUILD_TIMEOUT
+    memory_limit = memory_limit if memory_limit is not None else settings.BUILD_MEMORY_LIMIT
+    with open(log_file_path, 'ab') as log_file:
+        log_file.write('$ {}\n'.format(' '.join(args)).encode('utf-8'))
+        log_file.flush()
+        proc = subprocess.Popen(
+            args, stdout=log_file, stderr=subprocess.STDOUT, cwd=cwd,
+            preexec_fn=_limit_memory(memory_limit), start_new_session=True,
+        )
+        try:
+            returncode = proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+            raise BuildTimeout(
+                '{} timed out after {}s'.format(args[0], timeout),
+                read_tail(log_file_path),
+            )
+    if returncode != 0:
+        raise BuildError(
+            '{} exited with status {}'.format(args[0], returncode),
+            read_tail(log_file_path),
+        )
+
+
+def run_sphinx(srcdir, outdir, doctreedir, log_file_path, profile_path=None):
+    """Run sphinx-build, under cProfile writing to ``profile_path`` if given."""
+    args = [
+        'sphinx-build', '-b', 'html',
+        '-j', str(sphinx_jobs()),
+        '-d', doctreedir,
+        srcdir, outdir,
+    ]
+    if profile_path:
+        # Profiles only see the main process, so read and write serially
+        args[0] = shutil.which('sphinx-build')
+        args[4] = '1'
+        args = [sys.executable, '-m', 'cProfile', '-o', profile_path] + args
+    print(' '.join(args))
+    run_command(args, log_file_path)
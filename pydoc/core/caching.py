@@ -0,0 +1,57 @@
+"""
+Cached fragments with stale-while-revalidate.
+
+Values are stored with a freshness deadline and kept well past it. Once an
+entry is stale, the first request to take the refresh lock recomputes it
+while every other request keeps serving the stale value, so an expiring
+entry never causes a stampede. Invalidating an entry only marks it stale.
+"""
+
+import time
+
+from django.core.cache import cache
+
+STALE_TIMEOUT = 60 * 60 * 24
+LOCK_TIMEOUT = 60
+COLD_WAIT = 2.0
+
+HOME_BUILT_COUNT = 'home:built-count'
+HOME_POPULAR = 'home:popular'
+HOME_RECENT = 'home:recent'
+
+
+def _lock_key(key):
+    return '{}:lock'.format(key)
+
+
+def cached_fragment(key, compute, timeout):
+    """Return the cached value of ``key``, computing it with ``compute()``."""
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until or not cache.add(_lock_key(key), True, LOCK_TIMEOUT):
+            return value
+    elif not cache.add(_lock_key(key), True, LOCK_TIMEOUT):
+        # Somebody else is computing the first value, give them a moment
+        deadline = time.time() + COLD_WAIT
+        while time.time() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return compute()
+
+    try:
+        value = compute()
+        cache.set(key, (value, time.time() + timeout), timeout + STALE_TIMEOUT)
+    finally:
+        cache.delete(_lock_key(key))
+    return value
+
+
+def invalidate(*keys):
+    """Mark ``keys`` stale, the next request refreshes them."""
+    for key in keys:
+        entry = cache.get(key)
+        if entry is not None:
+            cache.set(key, (entry[0], 0), STALE_TIMEOUT)
@@ -0,0 +1,81 @@
+"""
+Rebuild campaigns, see :class:`~pydoc.core.models.RebuildCampaign`.
+
+Rebuilding the whole corpus after a toolchain upgrade used to queue every
+release at once. A campaign instead claims the next batch of its releases
+every minute, at most its ``rate`` and never more than the backfill queue
+has room for, and schedules them on ``builds.backfill``. Any number of
+workers consuming that queue share the work. Pausing a campaign stops new
+batches, builds already queued still run.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import scheduler
+from .models import RebuildCampaign
+
+
+def _claim(campaign_id):
+    """Move the cursor past the next batch and return it."""
+    with transaction.atomic():
+        campaign = RebuildCampaign.objects.select_for_update().get(pk=campaign_id)
+        if campaign.state != RebuildCampaign.RUNNING:
+            return campaign, []
+        room = (settings.BUILD_QUEUE_LIMITS[scheduler.BACKFILL] -
+                scheduler.queue_length(scheduler.BACKFILL))
+        size = min(campaign.rate, room)
+        if size <= 0:
+            return campaign, []
+        batch = campaign.next_batch(size)
+        if batch:
+            campaign.cursor = batch[-1][0]
+        if len(batch) < size:
+            campaign.state = RebuildCampaign.SCHEDULED
+            campaign.finished_at = timezone.now()
+        campaign.save(update_fields=['cursor', 'state', 'finished_at'])
+    return campaign, batch
+
+
+def advance(campaign_id):
+    """Schedule the next batch of a running campaign, returns the builds scheduled."""
+    campaign, batch = _claim(campaign_id)
+    scheduled = skipped = 0
+    for _, project, version in batch:
+        result = scheduler.schedule_build(project, version, scheduler.BACKFILL,
+                                          campaign_id=campaign.pk)
+        if result is None:
+            skipped += 1
+        else:
+            scheduled += 1
+    if batch:
+        RebuildCampaign.objects.filter(pk=campaign.pk).update(
+            scheduled=F('scheduled') + scheduled, skipped=F('skipped') + skipped)
+        print('Campaign {}: scheduled {}, skipped {}'.format(campaign, scheduled, skipped))
+    return scheduled
+
+
+def advance_all():
+    for campaign_id in RebuildCampaign.objects.filter(
+            state=RebuildCampaign.RUNNING).values_list('pk', flat=True):
+        advance(campaign_id)
+
+
+def create(name, rate=60, **criteria):
+    """Start a campaign, ``criteria`` are the ``RebuildCampaign`` criteria fields."""
+    campaign = RebuildCampaign(name=name, rate=rate, **criteria)
+    campaign.total = campaign.releases().count()
+    campaign.save()
+    return campaign
+
+
+def pause(campaign):
+    RebuildCampaign.objects.filter(pk=campaign.pk, state=RebuildCampaign.RUNNING).update(
+        state=RebuildCampaign.PAUSED)
+
+
+def resume(campaign):
+    RebuildCampaign.objects.filter(pk=campaign.pk, state=RebuildCampaign.PAUSED).update(
+        state=RebuildCampaign.RUNNING)
@@ -0,0 +1,23 @@
+import threading
+from http.server import HTTPServer
+
+import pytest
+
+
+@pytest.fixture
+def http_server():
+    """Start stub HTTP servers on free local ports, returns a function taking the handler class."""
+    servers = []
+
+    def start(handler_class):
+        server = HTTPServer(('127.0.0.1', 0), handler_class)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        servers.append(server)
+        return 'http://127.0.0.1:{}'.format(server.server_port)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,163 @@
+"""
+Storage of built documentation.
+
+With ``DOCS_STORAGE = 'files'`` every release is a directory of files in
+``DOCS_DIR``, served by the web server. With ``'archive'`` every release is a
+single uncompressed zip file, ``DOCS_DIR/<name>-<version>.zip``, served by
+:class:`~pydoc.core.views.DocsView`.
+
+Archives are read through ``mmap``, with an index from member name to the
+offset of its data built once per archive and process, so a member is a
+slice of the mapping. A rebuild writes a new archive next to the old one and
+renames it into place, readers notice the new inode on their next request.
+"""
+
+import os
+import mmap
+import struct
+import threading
+import zipfile
+
+from django.conf import settings
+
+ARCHIVE_SUFFIX = '.zip'
+
+# Local file header, up to the name and extra field lengths
+_LOCAL_HEADER = struct.Struct('<4s22xHH')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+def archive_path(directory_name):
+    return os.path.join(settings.DOCS_DIR(), directory_name + ARCHIVE_SUFFIX)
+
+
+def pack(files, path):
+    """
+    Write ``(relpath, path)`` pairs to the archive at ``path``, atomically.
+
+    Members are stored uncompressed so they can be served straight from
+    the mapping. Returns the number of members.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    count = 0
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for relpath, file_path in sorted(files):
+                archive.write(file_path, relpath.replace(os.sep, '/'))
+                count += 1
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+def unpack(path, directory):
+    """Extract an archive to ``directory``, the ``files`` layout."""
+    with zipfile.ZipFile(path) as archive:
+        archive.extractall(directory)
+
+
+class Archive(object):
+
+    """A mapped archive and the offsets and sizes of its members."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as archive_file:
+            stat = os.fstat(archive_file.fileno())
+            self.key = (stat.st_ino, stat.st_mtime, stat.st_size)
+            self.mtime = stat.st_mtime
+            self.map = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+            # Index the file that was mapped, the path may be replaced meanwhile
+            self.members = {}
+            with zipfile.ZipFile(archive_file) as archive:
+                for info in archive.infolist():
+                    if info.compress_type != zipfile.ZIP_STORED:
+                        continue
+                    signature, name_length, extra_length = _LOCAL_HEADER.unpack_from(
+                        self.map, info.header_offset)
+                    if signature != _LOCAL_HEADER_SIGNATURE:
+                        continue
+                    offset = info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+                    self.members[info.filename] = (offset, info.file_size)
+
+    def read(self, name):
+        """Return a ``memoryview`` of member ``name``, or ``None``."""
+        try:
+            offset, size = self.members[name]
+        except KeyError:
+            return None
+        return memoryview(self.map)[offset:offset + size]
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def open_archive(path):
+    """
+    Return the :class:`Archive` at ``path``, or ``None`` if there is none.
+
+    Archives stay mapped for the life of the process, and are mapped again
+    once a rebuild replaced them. Old mappings are released when the last
+    response using them is done.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        with _archives_lock:
+            _archives.pop(path, None)
+        return None
+    key = (stat.st_ino, stat.st_mtime, stat.st_size)
+    with _archives_lock:
+        archive = _archives.get(path)
+        if archive is not None and archive.key == key:
+            return archive
+    archive = Archive(path)
+    with _archives_lock:
+        if len(_archives) >= settings.DOCS_ARCHIVES_OPEN:
+            _archives.clear()
+        _archives[path] = archive
+    return archive
+
+
+def read_member(directory_name, path):
+    """
+    Return the content of ``path`` in a release's docs, in either layout.
+
+    The content is a ``memoryview`` of the archive or the file's bytes, or
+    ``None`` when the release or the file doesn't exist.
+    """
+    if settings.DOCS_STORAGE == 'archive':
+        archive = open_archive(archive_path(directory_name))
+        if archive is not None:
+            return archive.read(path)
+    file_path = os.path.normpath(os.path.join(settings.DOCS_DIR(), directory_name, path))
+    if not file_path.startswith(os.path.join(settings.DOCS_DIR(), directory_name) + os.sep):
+        return None
+    try:
+        with open(file_path, 'rb') as member:
+            return member.read()
+    except (IOError, OSError):
+        return None
+
+
+def last_modified(directory_name, path):
+    """Return the modification time of ``path`` in a release's docs, or ``None``."""
+    if settings.DOCS_STORAGE == 'archive':
+        archive = open_archive(archive_path(directory_name))
+        if archive is not None:
+            return archive.mtime if path in archive.members else None
+    try:
+        return os.path.getmtime(os.path.join(settings.DOCS_DIR(), directory_name, path))
+    except OSError:
+        return None
+
+
+def exists(directory_name, path):
+    if settings.DOCS_STORAGE == 'archive':
+        archive = open_archive(archive_path(directory_name))
+        return archive is not None and path in archive.members
+    return os.path.exists(os.path.join(settings.DOCS_DIR(), directory_name, path))
@@ -0,0 +1,272 @@
+"""
+Extract the Python sources AutoAPI documents from a distribution.
+
+Only ``.py`` files under the top level packages and modules are written,
+everything else (extension modules, data files, metadata) is skipped without
+being decompressed where the format allows it. Members matching
+``AUTOAPI_IGNORE`` are skipped too, matching either their path or any of its
+directories.
+
+Packages, including namespace packages without an ``__init__.py``, are
+extracted to a directory of their name. Top level modules go to
+``MODULES_DIR``, so AutoAPI can be pointed at a directory for them as well.
+
+Source archives are read as a stream. The bytes written, the bytes
+decompressed and the number of members are limited, an archive over a
+limit raises :class:`ExtractError`.
+"""
+
+import csv
+import io
+import os
+import shutil
+import tarfile
+import zipfile
+from collections import namedtuple
+from fnmatch import fnmatch
+
+MODULES_DIR = '_modules'
+SOURCE_SUFFIX = '.py'
+CHUNK_SIZE = 64 * 1024
+
+MAX_BYTES = 100 * 1024 ** 2
+MAX_SCANNED = 1024 ** 3
+MAX_MEMBERS = 50000
+
+# Top level directories and modules of source archives that aren't the package
+SDIST_SKIP_DIRS = {'build', 'dist', 'doc', 'docs', 'examples', 'test', 'tests', 'benchmarks'}
+SDIST_SKIP_MODULES = {'setup.py', 'conftest.py', 'ez_setup.py', 'distribute_setup.py',
+                      'fabfile.py', 'noxfile.py', 'runtests.py', 'versioneer.py'}
+
+_TOP_LEVEL = '.egg-info/top_level.txt'
+_WANTED = (SOURCE_SUFFIX, _TOP_LEVEL)
+
+Extracted = namedtuple('Extracted', 'autoapi_dirs files bytes skipped')
+
+
+class ExtractError(Exception):
+    pass
+
+
+class _Writer(object):
+
+    """Writes members below ``target`` and keeps count against the limits."""
+
+    def __init__(self, target, ignore, max_bytes, max_members, max_scanned):
+        self.target = os.path.abspath(target)
+        self.ignore = ignore
+        self.max_bytes = max_bytes
+        self.max_members = max_members
+        self.max_scanned = max_scanned
+        self.files = self.bytes = self.skipped = self.members = self.scanned = 0
+
+    def member(self, size=0):
+        """Count a member of the archive, ``size`` being decompressed to read past it."""
+        self.members += 1
+        self.scanned += size
+        if self.members > self.max_members:
+            raise ExtractError('More than {} members'.format(self.max_members))
+        if self.scanned > self.max_scanned:
+            raise ExtractError('More than {} bytes to decompress'.format(self.max_scanned))
+
+    def write(self, relpath, source):
+        if is_ignored(relpath, self.ignore):
+            self.skipped += 1
+            return
+        path = os.path.join(self.target, *relpath.split('/'))
+        if not os.path.abspath(path).startswith(self.target + os.sep):
+            self.skipped += 1
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.bytes += len(chunk)
+                if self.bytes > self.max_bytes:
+                    raise ExtractError('More than {} bytes of sources'.format(self.max_bytes))
+                out.write(chunk)
+        self.files += 1
+
+
+def _module_path(relpath):
+    """Where a source goes, and the AutoAPI directory it belongs to."""
+    if '/' in relpath:
+        return relpath, relpath.split('/', 1)[0]
+    return MODULES_DIR + '/' + relpath, MODULES_DIR
+
+
+def is_ignored(path, patterns):
+    """Whether ``path`` or one of its directories matches one of ``patterns``."""
+    parts = path.split('/')
+    for pattern in patterns:
+        if fnmatch(path, pattern):
+            return True
+        if any(fnmatch(part, pattern) for part in parts[:-1]):
+            return True
+    return False
+
+
+def _metadata_dir(names):
+    for name in names:
+        first = name.split('/', 1)[0]
+        if first.endswith('.dist-info'):
+            return first
+    return None
+
+
+def wheel_sources(wheel):
+    """
+    List the Python sources of an open ``ZipFile`` wheel.
+
+    Uses the ``RECORD`` when there is one, and ``top_level.txt`` to tell the
+    importable names from anything else the wheel installs.
+    """
+    members = wheel.namelist()
+    dist_info = _metadata_dir(members)
+    names = members
+    if dist_info is not None and dist_info + '/RECORD' in members:
+        record = wheel.read(dist_info + '/RECORD').decode('utf-8')
+        names = [row[0] for row in csv.reader(io.StringIO(record)) if row]
+    members = set(members)
+    sources = [
+        name for name in names
+        if name.endswith(SOURCE_SUFFIX) and name in members and
+        not name.split('/', 1)[0].endswith(('.dist-info', '.data'))
+    ]
+    if dist_info is not None and dist_info + '/top_level.txt' in members:
+        top_level = set(
+            line.strip().replace('\\', '/').split('/', 1)[0] for line in
+            wheel.read(dist_info + '/top_level.txt').decode('utf-8').splitlines()
+            if line.strip()
+        )
+        sources = [
+            name for name in sources
+            if name.split('/', 1)[0] in top_level or
+            name[:-len(SOURCE_SUFFIX)] in top_level
+        ]
+    return sources
+
+
+def extract_wheel(wheel_path, target, ignore=(), max_bytes=MAX_BYTES,
+                  max_members=MAX_MEMBERS, max_scanned=MAX_SCANNED):
+    """
+    Extract the sources of the wheel at ``wheel_path`` into ``target``.
+
+    Returns an :class:`Extracted` with the AutoAPI directories relative to
+    ``target``, and the number of files and bytes written.
+    """
+    writer = _Writer(target, ignore, max_bytes, max_members, max_scanned)
+    autoapi_dirs = set()
+    with zipfile.ZipFile(wheel_path) as wheel:
+        for name in wheel_sources(wheel):
+            writer.member()
+            relpath, autoapi_dir = _module_path(name)
+            files = writer.files
+            with wheel.open(name) as member:
+                writer.write(relpath, member)
+            if writer.files > files:
+                autoapi_dirs.add(autoapi_dir)
+    return Extracted(sorted(autoapi_dirs), writer.files, writer.bytes, writer.skipped)
+
+
+def _sdist_members(path, filename):
+    """
+    Yield ``(name, size, fileobj or None)`` for the files of a source archive.
+
+    Only sources and ``top_level.txt`` files come with a file object.
+    """
+    if filename.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.filename.endswith('/'):
+                    continue
+                if info.filename.endswith(_WANTED):
+                    with archive.open(info) as member:
+                        yield info.filename, info.file_size, member
+                else:
+                    # Never decompressed
+                    yield info.filename, 0, None
+        return
+    # A single pass over the stream, members can't be skipped without decompressing
+    with tarfile.open(path, mode='r|*') as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            if info.name.endswith(_WANTED):
+                yield info.name, info.size, archive.extractfile(info)
+            else:
+                yield info.name, info.size, None
+
+
+def _sdist_relpath(name):
+    """The path of a source archive member within the installed package, or ``None``."""
+    parts = name.replace('\\', '/').lstrip('/').split('/')
+    # Strip the <name>-<version> directory and a src layout
+    parts = parts[1:]
+    if len(parts) > 1 and parts[0] == 'src':
+        parts = parts[1:]
+    if not parts or '..' in parts:
+        return None
+    if len(parts) == 1:
+        return None if parts[0] in SDIST_SKIP_MODULES else parts[0]
+    if parts[0] in SDIST_SKIP_DIRS or parts[0].endswith('.egg-info') or parts[0].startswith('.'):
+        return None
+    return '/'.join(parts)
+
+
+def extract_sdist(sdist_path, filename, target, ignore=(), max_bytes=MAX_BYTES,
+                  max_members=MAX_MEMBERS, max_scanned=MAX_SCANNED):
+    """
+    Extract the package sources of a source archive into ``target``.
+
+    ``filename`` tells the archive format. Top level directories are kept
+    when they contain an ``__init__.py`` at any depth, or when the archive's
+    ``top_level.txt`` names them.
+    """
+    writer = _Writer(target, ignore, max_bytes, max_members, max_scanned)
+    top_level = None
+    for name, size, member in _sdist_members(sdist_path, filename):
+        writer.member(size)
+        if member is None:
+            continue
+        if name.endswith(_TOP_LEVEL):
+            if name.count('/') == 2:
+                top_level = set(
+                    line.strip() for line in
+                    member.read(CHUNK_SIZE).decode('utf-8', 'replace').splitlines()
+                    if line.strip()
+                )
+            continue
+        relpath = _sdist_relpath(name)
+        if relpath is not None:
+            writer.write(_module_path(relpath)[0], member)
+
+    autoapi_dirs = []
+    names = os.listdir(target) if os.path.isdir(target) else []
+    for name in sorted(names):
+        path = os.path.join(target, name)
+        if name == MODULES_DIR:
+            for module in os.listdir(path):
+                if top_level is not None and module[:-len(SOURCE_SUFFIX)] not in top_level:
+                    os.remove(os.path.join(path, module))
+            if os.listdir(path):
+                autoapi_dirs.append(name)
+            continue
+        if top_level is not None:
+            keep = name in top_level
+        else:
+            keep = any('__init__.py' in filenames for _, _, filenames in os.walk(path))
+        if keep:
+            autoapi_dirs.append(name)
+        else:
+            shutil.rmtree(path)
+    return Extracted(autoapi_dirs, writer.files, writer.bytes, writer.skipped)
+
+
+def extract(path, filename, target, ignore=(), **limits):
+    """Extract a wheel or source archive, see :func:`extract_wheel` and :func:`extract_sdist`."""
+    if filename.endswith('.whl'):
+        return extract_wheel(path, target, ignore, **limits)
+    return extract_sdist(path, filename, target, ignore, **limits)
@@ -0,0 +1,213 @@
+"""
+Build the releases listed in a requirements file, like ``pip freeze`` output.
+
+Requirements are parsed with ``packaging``, so extras, environment markers,
+``===`` pins and ``--hash`` options work. ``-r`` includes are followed,
+other options are ignored. Editable, URL and path requirements can't be
+found on PyPI and are reported as errors. A requirement without a single
+``==`` or ``===`` pin builds the package's latest release. Names are
+compared in their PEP 503 normalized form, so ``Zope_Interface`` finds the
+``zope.interface`` package.
+
+The metadata of all the packages is fetched concurrently with
+:func:`~pydoc.core.utils.update_packages`, the releases are then looked up in
+a few queries and the builds are scheduled in one pass.
+"""
+
+import itertools
+import os
+import re
+from collections import Counter, OrderedDict, namedtuple
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name, canonicalize_version
+
+from . import scheduler
+from .models import Distribution, Package, Release, is_buildable
+from .utils import update_packages
+
+QUEUED = 'queued'
+NOT_QUEUED = 'not queued'
+BUILT = 'already built'
+NO_WHEEL = 'no wheel'
+ERROR = 'error'
+STATUSES = (QUEUED, NOT_QUEUED, BUILT, NO_WHEEL, ERROR)
+
+Entry = namedtuple('Entry', 'line name version error')
+
+_COMMENT = re.compile(r'(^|\s+)#.*$')
+_HASH = re.compile(r'\s+--hash[=\s]\S+')
+_EGG = re.compile(r'#egg=([A-Za-z0-9_.\-]+)')
+
+
+def _logical_lines(lines):
+    """Join continued lines and drop comments."""
+    pending = ''
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.endswith('\\'):
+            pending += line[:-1] + ' '
+            continue
+        line = _COMMENT.sub('', pending + line).strip()
+        pending = ''
+        if line:
+            yield line
+    if pending.strip():
+        yield _COMMENT.sub('', pending).strip()
+
+
+def _pinned_version(requirement):
+    specs = list(requirement.specifier)
+    if len(specs) == 1 and specs[0].operator in ('==', '===') and '*' not in specs[0].version:
+        return specs[0].version
+    return None
+
+
+def parse_requirements(lines, base_dir='.', _included=None):
+    """Yield an :class:`Entry` for every requirement of ``lines``."""
+    included = _included if _included is not None else set()
+    for line in _logical_lines(lines):
+        option, _, value = line.partition(' ')
+        if option.startswith('--') and '=' in option:
+            option, _, value = line.partition('=')
+        value = value.strip()
+        if option in ('-r', '--requirement'):
+            path = os.path.normpath(os.path.join(base_dir, value))
+            if path in included:
+                continue
+            included.add(path)
+            try:
+                with open(path) as requirements:
+                    yield from parse_requirements(
+                        list(requirements), os.path.dirname(path), included)
+            except (IOError, OSError) as e:
+                yield Entry(line, value, None, 'cannot read {}: {}'.format(path, e.strerror))
+            continue
+        if option in ('-e', '--editable'):
+            egg = _EGG.search(value)
+            yield Entry(line, canonicalize_name(egg.group(1)) if egg else value, None,
+                        'editable requirement')
+            continue
+        if line.startswith('-'):
+            continue
+        try:
+            requirement = Requirement(_HASH.sub('', line))
+        except InvalidRequirement:
+            yield Entry(line, line, None, 'not a requirement')
+            continue
+        name = canonicalize_name(requirement.name)
+        if requirement.url:
+            yield Entry(line, name, None, 'URL requirement')
+            continue
+        yield Entry(line, name, _pinned_version(requirement), None)
+
+
+def _stored_names(names):
+    """
+    Map normalized names to the names their packages are stored under.
+
+    Packages are stored under their lowercased PyPI name, which may use ``_``
+    or ``.`` where the normalized name has ``-``, every spelling is looked up.
+    """
+    spellings = {}
+    for name in names:
+        parts = name.split('-')
+        if len(parts) <= 5:
+            combinations = itertools.product('-_.', repeat=len(parts) - 1)
+        else:
+            # Too many to try them all, only a single kind of separator
+            combinations = [(separator,) * (len(parts) - 1) for separator in '-_.']
+        for separators in combinations:
+            spelling = parts[0] + ''.join(
+                separator + part for separator, part in zip(separators, parts[1:]))
+            spellings[spelling] = name
+    stored = {}
+    for spelling in Package.objects.filter(name__in=list(spellings)).values_list(
+            'name', flat=True):
+        stored.setdefault(spellings[spelling], spelling)
+    return stored
+
+
+def _find_releases(entries):
+    """Map ``(name, version)`` to ``(release_id, version, built)``, ``None`` for latest."""
+    names = {entry.name for entry in entries}
+    latest_ids = dict(
+        Package.objects.filter(name__in=names).values_list('name', 'latest_release_id'))
+    found = {}
+    exact = {}
+    canonical = {}
+    for pk, name, version, built in Release.objects.filter(package_id__in=names).values_list(
+            'pk', 'package_id', 'version', 'built'):
+        release = (pk, version, built)
+        exact[(name, version)] = release
+        canonical.setdefault((name, canonicalize_version(version)), release)
+        if pk == latest_ids.get(name):
+            found[(name, None)] = release
+    for entry in entries:
+        if entry.version is None:
+            continue
+        release = exact.get((entry.name, entry.version))
+        if release is None and '===' not in entry.line:
+            # == compares PEP 440 versions, 1.0 matches a 1.0.0 release
+            release = canonical.get((entry.name, canonicalize_version(entry.version)))
+        if release is not None:
+            found[(entry.name, entry.version)] = release
+    return found
+
+
+def process_requirements(lines, base_dir='.', priority=scheduler.BACKFILL):
+    """
+    Update and build the packages of a requirements file.
+
+    Returns ``(name, version, status)`` rows, see ``STATUSES``.
+    """
+    parsed = list(parse_requirements(lines, base_dir))
+    stored = _stored_names({entry.name for entry in parsed if entry.error is None})
+    unique = OrderedDict()
+    for entry in parsed:
+        if entry.error is None:
+            entry = entry._replace(name=stored.get(entry.name, entry.name))
+        unique.setdefault((entry.name, entry.version), entry)
+    entries = list(unique.values())
+    valid = [entry for entry in entries if entry.error is None]
+
+    update_packages(OrderedDict.fromkeys(entry.name for entry in valid))
+    releases = _find_releases(valid)
+    release_ids = [release[0] for release in releases.values()]
+    buildable = {
+        release_id for release_id, filetype, filename in
+        Distribution.objects.filter(release_id__in=release_ids).values_list(
+            'release_id', 'filetype', 'filename')
+        if is_buildable(filetype, filename)
+    }
+
+    rows = []
+    to_build = []
+    for entry in entries:
+        if entry.error is not None:
+            rows.append((entry.name, entry.version or '', '{}: {}'.format(ERROR, entry.error)))
+            continue
+        release = releases.get((entry.name, entry.version))
+        if release is None:
+            rows.append((entry.name, entry.version or '', '{}: not on PyPI'.format(ERROR)))
+            continue
+        release_id, version, built = release
+        if built:
+            rows.append((entry.name, version, BUILT))
+        elif release_id not in buildable:
+            rows.append((entry.name, version, NO_WHEEL))
+        else:
+            to_build.append(len(rows))
+            rows.append((entry.name, version, None))
+
+    for index in to_build:
+        name, version, _ = rows[index]
+        result = scheduler.schedule_build(name, version, priority)
+        rows[index] = (name, version, QUEUED if result is not None else NOT_QUEUED)
+    return rows
+
+
+def summarize(rows):
+    """Counts of ``rows`` by status, errors of all kinds counted together."""
+    counts = Counter(status.split(':', 1)[0] for _, _, status in rows)
+    return OrderedDict((status, counts.get(status, 0)) for status in STATUSES)
@@ -0,0 +1,82 @@
+"""
+Index the generated API docs of a release.
+
+After a build, the per-page JSON dumps written by :mod:`pydoc.sphinx` are read
+back to collect the documented symbols and the text of every page.
+"""
+
+import html
+import os
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import transaction
+
+from pydoc.sphinx import iter_pages
+
+from .models import Page, Symbol
+
+# Sphinx renders every documented Python object as <dl class="kind"><dt id="name">,
+# 2.0 and later as <dl class="py kind"><dt class="sig ..." id="name">
+OBJECT_RE = re.compile(
+    r'<dl class="(?:py )?(?P<kind>[a-z]+)">\s*<dt(?: [^>]*?)? id="(?P<name>[^"]+)"')
+MODULE_RE = re.compile(r'id="module-(?P<name>[^"]+)"')
+TAG_RE = re.compile(r'<[^>]+>')
+SPACE_RE = re.compile(r'\s+')
+
+MAX_TEXT = 100000
+
+
+def page_text(body):
+    return SPACE_RE.sub(' ', html.unescape(TAG_RE.sub(' ', body))).strip()[:MAX_TEXT]
+
+
+def extract_symbols(pagename, body):
+    """Yield ``(name, kind, path)`` for the objects documented in ``body``."""
+    for match in MODULE_RE.finditer(body):
+        yield (match.group('name'), 'module',
+               '{}.html#module-{}'.format(pagename, match.group('name')))
+    for match in OBJECT_RE.finditer(body):
+        yield (match.group('name'), match.group('kind'),
+               '{}.html#{}'.format(pagename, match.group('name')))
+
+
+def index_release(release):
+    """
+    Replace the page and symbol index of ``release`` with its current docs.
+
+    Only the rows of this release are touched, so rebuilding one release
+    doesn't affect the rest of the index.
+    """
+    json_dir = os.path.join(settings.JSON_DIR(), release.release_name)
+    pages = []
+    symbols = {}
+    for pagename, context in iter_pages(json_dir):
+        body = context.get('body') or ''
+        pages.append(Page(
+            release=release,
+            path=pagename[:1000],
+            title=page_text(context.get('title') or '')[:1000],
+            text=page_text(body),
+        ))
+        for name, kind, path in extract_symbols(pagename, body):
+            if len(name) > 255 or len(path) > 1000:
+                continue
+            symbols[name] = Symbol(
+                release=release,
+                name=name,
+                short_name=name.rsplit('.', 1)[-1].lower(),
+                kind=kind,
+                path=path,
+            )
+
+    with transaction.atomic():
+        Page.objects.filter(release=release).delete()
+        Symbol.objects.filter(release=release).delete()
+        Page.objects.bulk_create(pages, batch_size=500)
+        Symbol.objects.bulk_create(symbols.values(), batch_size=1000)
+        Page.objects.filter(release=release).update(
+            search_vector=SearchVector('title', weight='A') + SearchVector('text', weight='B'))
+    print('Indexed {}: {} pages, {} symbols'.format(release, len(pages), len(symbols)))
+    return len(pages), len(symbols)
@@ -29,5 +29,14 @@ class Command(BaseCommand):
             help='Build unbuilt versions of this package',
         )
 
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            dest='profile',
+            default=False,
+            help='Run the builds under cProfile, profiles are saved next to the build logs',
+        )
+
     def handle(self, *args, **options):
-        handle_build(packages=args, latest=options['latest'], built=options['built'])
+        handle_build(packages=args, latest=options['latest'], built=options['built'],
+                     profile=options['profile'])
@@ -0,0 +1,79 @@
+"""
+Summarize where build time goes.
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Sum
+from django.utils import timezone
+
+from pydoc.core.models import Build
+from pydoc.core.scheduler import expire_stale_builds
+
+
+class Command(BaseCommand):
+    help = """Print the time spent in each build stage over recent builds"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            dest='days',
+            type=int,
+            default=7,
+            help='Only count builds queued in the last DAYS days',
+        )
+        parser.add_argument(
+            '--slowest',
+            dest='slowest',
+            type=int,
+            default=10,
+            help='Number of slowest builds to list',
+        )
+
+    def handle(self, *args, **options):
+        expire_stale_builds()
+        since = timezone.now() - datetime.timedelta(days=options['days'])
+        builds = Build.objects.filter(queued_at__gte=since)
+
+        for state in builds.values('state').annotate(count=Count('pk')).order_by('state'):
+            print('{state:<20} {count:>8}'.format(**state))
+        print()
+
+        finished = builds.filter(state=Build.SUCCESS)
+        aggregates = {}
+        for stage in Build.STAGES:
+            field = '{}_seconds'.format(stage)
+            aggregates[stage + '_avg'] = Avg(field)
+            aggregates[stage + '_max'] = Max(field)
+            aggregates[stage + '_sum'] = Sum(field)
+        totals = finished.aggregate(**aggregates)
+        grand_total = sum(totals[stage + '_sum'] or 0 for stage in Build.STAGES) or 1
+        print('{:<10} {:>10} {:>10} {:>7}'.format('stage', 'avg', 'max', 'share'))
+        for stage in Build.STAGES:
+            print('{:<10} {:>10.1f} {:>10.1f} {:>6.1f}%'.format(
+                stage, totals[stage + '_avg'] or 0, totals[stage + '_max'] or 0,
+                100.0 * (totals[stage + '_sum'] or 0) / grand_total))
+        print()
+
+        parsing = finished.aggregate(hits=Sum('parse_cache_hits'),
+                                     misses=Sum('parse_cache_misses'),
+                                     saved=Sum('parse_seconds_saved'))
+        parsed = (parsing['hits'] or 0) + (parsing['misses'] or 0)
+        if parsed:
+            print('Parse cache: {:.1f}% of {} modules hit, {:.1f}s saved'.format(
+                100.0 * (parsing['hits'] or 0) / parsed, parsed, parsing['saved'] or 0))
+            print()
+
+        slowest = (
+            finished.exclude(started_at=None).exclude(finished_at=None)
+            .annotate(took=ExpressionWrapper(F('finished_at') - F('started_at'),
+                                             output_field=DurationField()))
+            .select_related('release').order_by('-took')[:options['slowest']]
+        )
+        for build in slowest:
+            stages = ' '.join(
+                '{}={:.1f}'.format(stage, getattr(build, '{}_seconds'.format(stage)) or 0)
+                for stage in Build.STAGES)
+            print('{:<50} {:>8.1f} {}'.format(
+                str(build.release), build.took.total_seconds(), stages))
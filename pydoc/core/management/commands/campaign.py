@@ -0,0 +1,99 @@
+"""
+Start, list, pause and resume rebuild campaigns.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime, parse_date
+
+from pydoc.core import campaigns
+from pydoc.core.buildcache import toolchain_key
+from pydoc.core.models import RebuildCampaign
+
+
+def _datetime(value):
+    parsed = parse_datetime(value) or parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = """Rebuild releases in batches, see pydoc/core/campaigns.py"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['start', 'list', 'pause', 'resume'])
+        parser.add_argument('campaign', nargs='?', type=int,
+                            help='The campaign to pause or resume')
+
+        parser.add_argument(
+            '--name',
+            dest='name',
+            default='',
+            help='Name of a new campaign, defaults to the current toolchain',
+        )
+        parser.add_argument(
+            '--latest',
+            action='store_true',
+            dest='latest',
+            default=False,
+            help='Only rebuild the latest release of each package',
+        )
+        parser.add_argument(
+            '--not-built',
+            action='store_false',
+            dest='built',
+            default=True,
+            help='Also build releases that were never built',
+        )
+        parser.add_argument(
+            '--built-before',
+            dest='built_before',
+            type=_datetime,
+            default=None,
+            help='Only rebuild releases not built successfully since this date',
+        )
+        parser.add_argument(
+            '--toolchain',
+            dest='toolchain',
+            default='',
+            help='Only rebuild releases built with this toolchain, see buildcache.toolchain_key',
+        )
+        parser.add_argument(
+            '--rate',
+            dest='rate',
+            type=int,
+            default=60,
+            help='Builds to schedule per minute',
+        )
+
+    def handle(self, *args, **options):
+        action = options['action']
+        if action == 'start':
+            campaign = campaigns.create(
+                options['name'] or 'Rebuild with {}'.format(toolchain_key()[:16]),
+                rate=options['rate'],
+                latest_only=options['latest'],
+                built_only=options['built'],
+                built_before=options['built_before'],
+                toolchain=options['toolchain'],
+            )
+            print('Started campaign {} "{}": {} releases at {} per minute'.format(
+                campaign.pk, campaign, campaign.total, campaign.rate))
+        elif action == 'list':
+            print('{:>4} {:<40} {:<10} {:>8} {:>8} {:>8} {:>8} {:>8}'.format(
+                'id', 'name', 'state', 'total', 'done', 'failed', 'skipped', 'left'))
+            for campaign in RebuildCampaign.objects.all():
+                progress = campaign.progress()
+                print('{:>4} {:<40} {:<10} {total:>8} {done:>8} {failed:>8} {skipped:>8} '
+                      '{remaining:>8}'.format(campaign.pk, str(campaign)[:40], campaign.state,
+                                              **progress))
+        else:
+            if options['campaign'] is None:
+                raise CommandError('Which campaign to {}?'.format(action))
+            try:
+                campaign = RebuildCampaign.objects.get(pk=options['campaign'])
+            except RebuildCampaign.DoesNotExist:
+                raise CommandError('No campaign {}'.format(options['campaign']))
+            getattr(campaigns, action)(campaign)
+            campaign.refresh_from_db()
+            print('Campaign {} is {}'.format(campaign.pk, campaign.state))
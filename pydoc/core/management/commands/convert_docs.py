@@ -0,0 +1,61 @@
+"""
+Convert built docs between the files and archive layouts.
+"""
+
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pydoc.core import docstore
+
+
+class Command(BaseCommand):
+    help = """Pack release directories in DOCS_DIR into archives, or unpack them"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('args', nargs='*', metavar='release',
+                            help='<name>-<version> of the releases to convert, default all')
+        parser.add_argument(
+            '--to',
+            dest='layout',
+            choices=['archive', 'files'],
+            default='archive',
+            help='Layout to convert to',
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            dest='delete',
+            default=False,
+            help='Delete the old layout once converted',
+        )
+
+    def handle(self, *args, **options):
+        docs_dir = settings.DOCS_DIR()
+        if options['layout'] == 'archive':
+            releases = args or sorted(
+                name for name in os.listdir(docs_dir)
+                if os.path.isdir(os.path.join(docs_dir, name)))
+            for release in releases:
+                directory = os.path.join(docs_dir, release)
+                files = [
+                    (os.path.relpath(os.path.join(root, filename), directory),
+                     os.path.join(root, filename))
+                    for root, _, filenames in os.walk(directory) for filename in filenames
+                ]
+                count = docstore.pack(files, docstore.archive_path(release))
+                if options['delete']:
+                    shutil.rmtree(directory)
+                print('Packed {} files of {}'.format(count, release))
+        else:
+            releases = args or sorted(
+                name[:-len(docstore.ARCHIVE_SUFFIX)] for name in os.listdir(docs_dir)
+                if name.endswith(docstore.ARCHIVE_SUFFIX))
+            for release in releases:
+                path = docstore.archive_path(release)
+                docstore.unpack(path, os.path.join(docs_dir, release))
+                if options['delete']:
+                    os.remove(path)
+                print('Unpacked {}'.format(release))
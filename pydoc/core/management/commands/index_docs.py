@@ -0,0 +1,22 @@
+"""
+Index the generated docs of built releases for symbol and page search.
+"""
+
+from django.core.management.base import BaseCommand
+
+from pydoc.core.indexing import index_release
+from pydoc.core.models import Release
+
+
+class Command(BaseCommand):
+    help = """Index the docs of built releases, all of them or of the packages passed in"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('args', nargs='*')
+
+    def handle(self, *args, **options):
+        releases = Release.objects.filter(built=True)
+        if args:
+            releases = releases.filter(package__name__in=args)
+        for release in releases.iterator():
+            index_release(release)
@@ -4,9 +4,7 @@ pypi.
 """
 
 from django.core.management.base import BaseCommand
-from pydoc.core.utils import updated_packages_since, update_package, thread_update, build_changelog
-from pydoc.core.models import Package
-import datetime
+from pydoc.core.utils import build_changelog
 
 
 class Command(BaseCommand):
@@ -14,11 +12,11 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument(
-            '--build',
-            action='store_true',
+            '--no-build',
+            action='store_false',
             dest='build',
             default=True,
-            help='Build changelog as well as update',
+            help='Only update the changed packages, the next run still builds them',
         )
 
         parser.add_argument(
@@ -26,17 +24,10 @@ class Command(BaseCommand):
             dest='minutes',
             type=int,
             default=120,
-            help='Number of minutes to go back',
+            help='Number of minutes to go back on the first run, later runs '
+                 'continue from the last processed serial',
         )
 
     def handle(self, *args, **options):
-        if options['build']:
-            print('Building changelog')
-            build_changelog(minutes=options['minutes'])
-        else:
-            since = datetime.datetime.utcnow() - datetime.timedelta(days=1)
-            print("updating change from pypi since %s" % since)
-            packages = updated_packages_since(since)
-            print('Processing {} packages'.format(len(packages)))
-            queryset = Package.objects.filter(name__in=packages).iterator()
-            thread_update(queryset=queryset, task=update_package)
+        print('Processing changelog')
+        build_changelog(build=options['build'], minutes=options['minutes'])
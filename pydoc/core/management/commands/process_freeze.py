@@ -1,22 +1,40 @@
 """
-Management command for loading all the known packages from the official
-pypi.
+Build the releases of a requirements file or pip freeze output.
 """
 
+import os
 import sys
+
 from django.core.management.base import BaseCommand
-from pydoc.core.utils import handle_build
+
+from pydoc.core import scheduler
+from pydoc.core.freeze import process_requirements, summarize
 
 
 class Command(BaseCommand):
-    help = """Build docs from pip freeze output"""
+    help = """Build docs from pip freeze output, read from the files given or stdin"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('args', nargs='*')
+
+        parser.add_argument(
+            '--priority',
+            dest='priority',
+            choices=scheduler.PRIORITIES,
+            default=scheduler.BACKFILL,
+            help='The queue to schedule the builds on',
+        )
 
     def handle(self, *args, **options):
-        for line in sys.stdin:
-            line = line.strip()
-            if not line or '#' in line:
-                continue
-            print(line)
-            package, version = line.split('==')
-            print("Building %s:%s" % (package, version))
-            handle_build(packages=[package], version=version, built=False)
+        if args:
+            # Include every file, so their packages are fetched and scheduled as one batch
+            lines = ['-r {}\n'.format(os.path.abspath(path)) for path in args]
+        else:
+            lines = list(sys.stdin)
+        rows = process_requirements(lines, '.', options['priority'])
+
+        for name, version, status in rows:
+            print('{:<40} {:<20} {}'.format(name, version, status))
+        print()
+        for status, count in summarize(rows).items():
+            print('{:<15} {:>6}'.format(status, count))
@@ -0,0 +1,58 @@
+"""
+Backfill the denormalized latest release fields and search vectors of packages.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from pydoc.core.models import Package, Release
+from pydoc.core.search import update_search_vector
+
+
+class Command(BaseCommand):
+    help = """Recompute Package.latest_release, latest_built_release and search_vector"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size',
+            type=int,
+            default=1000,
+            help='Number of packages to update per transaction',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last = ''
+        updated = 0
+        while True:
+            names = list(
+                Package.objects.filter(name__gt=last).order_by('name')
+                .values_list('name', flat=True)[:chunk_size]
+            )
+            if not names:
+                break
+            releases = Release.objects.filter(package__in=names)
+            latest = {
+                package: (pk, package_info) for package, pk, package_info in
+                releases.latest_per_package().values_list('package_id', 'pk', 'package_info')
+            }
+            latest_built = {
+                package: (pk, version) for package, pk, version in
+                releases.filter(built=True).latest_per_package()
+                .values_list('package_id', 'pk', 'version')
+            }
+            with transaction.atomic():
+                for name in names:
+                    latest_pk, package_info = latest.get(name, (None, {}))
+                    built_pk, built_version = latest_built.get(name, (None, ''))
+                    package = Package(pk=name)
+                    Package.objects.filter(pk=name).update(
+                        latest_release=latest_pk,
+                        latest_built_release=built_pk,
+                        latest_built_version=built_version,
+                    )
+                    update_search_vector(package, package_info or {})
+            updated += len(names)
+            last = names[-1]
+            print('Updated {} packages'.format(updated))
@@ -10,5 +10,14 @@ from pydoc.core.utils import update_package_list
 class Command(BaseCommand):
     help = """Update the package index (packages only. no releases.)"""
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            dest='restart',
+            default=False,
+            help='Ignore the checkpoint of an interrupted import',
+        )
+
     def handle(self, *args, **options):
-        update_package_list()
+        update_package_list(restart=options['restart'])
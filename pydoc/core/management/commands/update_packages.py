@@ -5,7 +5,7 @@ pypi.
 
 from django.core.management.base import BaseCommand
 from pydoc.core.models import Package
-from pydoc.core.utils import update_package, thread_update
+from pydoc.core.utils import update_package, update_packages
 
 
 class Command(BaseCommand):
@@ -17,10 +17,9 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         if not args:
-            # update all packages! using iterator() because querysets get cahced
-            # and we access files in the loop. they use a lot of ram.
-            queryset = Package.objects.all().iterator()
-            thread_update(queryset=queryset, task=update_package)
+            # update all packages! only the names are loaded, the metadata is
+            # fetched concurrently and written as it comes in.
+            update_packages(Package.objects.values_list('name', flat=True))
         for package_name in args:
             try:
                 package = Package.objects.get(name=package_name)
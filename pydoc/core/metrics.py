@@ -0,0 +1,146 @@
+"""
+In-process counters and timers.
+
+Metrics are plain floats keyed by name. Timers are recorded as a pair of
+counters, ``<name>_seconds_total`` and ``<name>_count``. :class:`Spans`
+additionally keeps the timed sections of one job for its report, and
+:func:`prometheus_text` renders metrics in the Prometheus text format.
+
+Counters only live in the process that records them, and ``/metrics`` is
+served by a web process, so counters incremented in a Celery worker are
+never exported. Build metrics come from the ``Build`` table instead, see
+:func:`build_samples`.
+"""
+
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name, seconds):
+    with _lock:
+        _counters[name + '_seconds_total'] += seconds
+        _counters[name + '_count'] += 1
+
+
+@contextmanager
+def timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def snapshot():
+    """Return a copy of all the metrics of this process."""
+    with _lock:
+        return dict(_counters)
+
+
+class Spans(object):
+
+    """The timed sections of one job, also recorded as ``<prefix><name>`` timers."""
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.spans = []
+
+    def add(self, name, seconds, start=None):
+        entry = {'name': name, 'start': start, 'seconds': seconds}
+        self.spans.append(entry)
+        observe(self.prefix + name, seconds)
+        return entry
+
+    @contextmanager
+    def span(self, name):
+        """Time the block, the yielded dict gets its ``seconds`` once it ends."""
+        entry = {'name': name, 'start': time.time(), 'seconds': None}
+        perf_start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['seconds'] = time.perf_counter() - perf_start
+            self.spans.append(entry)
+            observe(self.prefix + name, entry['seconds'])
+
+
+def _metric_name(name, prefix):
+    return prefix + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def prometheus_text(samples, prefix='pydoc_'):
+    """
+    Render ``(name, type, labels, value)`` samples as Prometheus text.
+
+    ``type`` is ``counter`` or ``gauge`` and ``labels`` a dict, samples of
+    one metric should be adjacent.
+    """
+    lines = []
+    seen = set()
+    for name, kind, labels, value in samples:
+        metric = _metric_name(name, prefix)
+        if metric not in seen:
+            seen.add(metric)
+            lines.append('# TYPE {} {}'.format(metric, kind))
+        if labels:
+            metric += '{' + ','.join(
+                '{}="{}"'.format(key, str(labels[key]).replace('\\', '\\\\').replace('"', '\\"'))
+                for key in sorted(labels)) + '}'
+        lines.append('{} {}'.format(metric, repr(float(value))))
+    return '\n'.join(lines) + '\n'
+
+
+def process_samples():
+    """The metrics of this process as counter samples."""
+    return [(name, 'counter', {}, value) for name, value in sorted(snapshot().items())]
+
+
+BUILD_SAMPLES_CACHE_KEY = 'metrics:builds'
+BUILD_SAMPLES_TIMEOUT = 30
+
+
+def build_samples():
+    """
+    Build metrics from the database, shared by all the workers.
+
+    Cached for ``BUILD_SAMPLES_TIMEOUT`` seconds, so scrapes from several
+    Prometheus servers don't each aggregate the build table.
+    """
+    from django.core.cache import cache
+    from django.db.models import Count, Sum
+    from .models import Build
+    from .scheduler import PRIORITIES, queue_length
+
+    samples = cache.get(BUILD_SAMPLES_CACHE_KEY)
+    if samples is not None:
+        return samples
+
+    samples = []
+    for row in Build.objects.order_by().values('state').annotate(count=Count('pk')):
+        samples.append(('builds', 'gauge', {'state': row['state']}, row['count']))
+    for queue in PRIORITIES:
+        samples.append(('build_queue_length', 'gauge', {'queue': queue}, queue_length(queue)))
+
+    fields = ['{}_seconds'.format(stage) for stage in Build.STAGES]
+    fields += [field for field, _ in Build.COUNTERS]
+    totals = Build.objects.filter(state=Build.SUCCESS).aggregate(
+        **{field: Sum(field) for field in fields})
+    for stage in Build.STAGES:
+        samples.append(('build_stage_seconds_total', 'counter', {'stage': stage},
+                        totals['{}_seconds'.format(stage)] or 0))
+    for field, _ in Build.COUNTERS:
+        samples.append(('build_{}_total'.format(field), 'counter', {}, totals[field] or 0))
+
+    cache.set(BUILD_SAMPLES_CACHE_KEY, samples, BUILD_SAMPLES_TIMEOUT)
+    return samples
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_packagemetadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packageindex',
+            name='last_serial',
+            field=models.BigIntegerField(blank=True, help_text='The last changelog serial that has been processed', null=True),
+        ),
+    ]
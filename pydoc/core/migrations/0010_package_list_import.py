@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_packageindex_last_serial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packageindex',
+            name='list_checkpoint',
+            field=models.CharField(blank=True, default='', help_text='The last package name stored by an unfinished package list import', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='removed_from_remote_at',
+            field=models.DateTimeField(blank=True, help_text='The time the package was found missing from the index', null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from pydoc.core.versions import version_sort_key, is_prerelease
+
+
+def fill_sort_keys(apps, schema_editor):
+    Release = apps.get_model('core', 'Release')
+    releases = Release.objects.filter(sort_key='').only('pk', 'version')
+    for release in releases.iterator():
+        Release.objects.filter(pk=release.pk).update(
+            sort_key=version_sort_key(release.version),
+            is_prerelease=is_prerelease(release.version),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_package_list_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='release',
+            name='sort_key',
+            field=models.CharField(blank=True, default='', help_text='PEP 440 ordering of the version, see versions.py', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='release',
+            name='is_prerelease',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterModelOptions(
+            name='release',
+            options={'get_latest_by': 'sort_key', 'ordering': ['-created'], 'verbose_name': 'release', 'verbose_name_plural': 'releases'},
+        ),
+        migrations.RunPython(fill_sort_keys, migrations.RunPython.noop),
+        migrations.AlterIndexTogether(
+            name='release',
+            index_together=set([('package', 'is_prerelease', 'sort_key')]),
+        ),
+    ]
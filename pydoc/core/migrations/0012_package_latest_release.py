@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_release_sort_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='latest_release',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.Release'),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='latest_built_release',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.Release'),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='latest_built_version',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+        # Same ordering as ReleaseQuerySet.latest_per_package
+        migrations.RunSQL(
+            """
+            UPDATE core_package p SET latest_release_id = latest.id
+            FROM (
+                SELECT DISTINCT ON (package_id) package_id, id FROM core_release
+                ORDER BY package_id, is_prerelease, sort_key DESC
+            ) latest
+            WHERE latest.package_id = p.name;
+            UPDATE core_package p SET
+                latest_built_release_id = latest.id,
+                latest_built_version = latest.version
+            FROM (
+                SELECT DISTINCT ON (package_id) package_id, id, version FROM core_release
+                WHERE built
+                ORDER BY package_id, is_prerelease, sort_key DESC
+            ) latest
+            WHERE latest.package_id = p.name;
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_package_latest_release'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='package',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, null=True),
+        ),
+        migrations.RunSQL(
+            """
+            CREATE INDEX core_package_name_trgm ON core_package
+                USING gin (name gin_trgm_ops);
+            CREATE INDEX core_package_search_vector ON core_package
+                USING gin (search_vector);
+            """,
+            """
+            DROP INDEX core_package_name_trgm;
+            DROP INDEX core_package_search_vector;
+            """,
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE core_package p SET search_vector =
+                setweight(to_tsvector('simple', p.name), 'A') ||
+                setweight(to_tsvector('english', coalesce(r.package_info->>'summary', '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(r.package_info->>'keywords', '')), 'C')
+            FROM core_release r
+            WHERE r.id = p.latest_release_id;
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
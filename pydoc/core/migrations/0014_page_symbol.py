@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_package_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Page',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(help_text='the Sphinx page name', max_length=1000)),
+                ('title', models.CharField(blank=True, max_length=1000)),
+                ('text', models.TextField(blank=True)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(blank=True, null=True)),
+                ('release', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='core.Release')),
+            ],
+            options={
+                'verbose_name': 'page',
+                'verbose_name_plural': 'pages',
+            },
+        ),
+        migrations.CreateModel(
+            name='Symbol',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, help_text='the full dotted name', max_length=255)),
+                ('short_name', models.CharField(db_index=True, help_text='the lowercased last part of the name', max_length=255)),
+                ('kind', models.CharField(max_length=32)),
+                ('path', models.CharField(help_text='the page and anchor, relative to the release docs', max_length=1000)),
+                ('release', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='symbols', to='core.Release')),
+            ],
+            options={
+                'verbose_name': 'symbol',
+                'verbose_name_plural': 'symbols',
+            },
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_page_search_vector ON core_page USING gin (search_vector);',
+            'DROP INDEX core_page_search_vector;',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_page_symbol'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularPackage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('position', models.PositiveIntegerField(db_index=True, help_text='1 is the most popular package')),
+                ('rank', models.IntegerField(blank=True, help_text='the libraries.io SourceRank', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'popular package',
+                'verbose_name_plural': 'popular packages',
+                'ordering': ['position'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_popularpackage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='distribution',
+            name='sha256_digest',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_distribution_sha256_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Build',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('success', 'Success'), ('failed', 'Failed'), ('skipped-no-wheel', 'Skipped, no wheel')], db_index=True, default='queued', max_length=32)),
+                ('queue', models.CharField(blank=True, max_length=32)),
+                ('reason', models.TextField(blank=True, help_text='why the build failed')),
+                ('log_excerpt', models.TextField(blank=True, help_text='the end of the build log')),
+                ('attempt', models.PositiveIntegerField(default=1, help_text='consecutive failed builds, this one included')),
+                ('retry_after', models.DateTimeField(blank=True, help_text='a failed release is not built again before', null=True)),
+                ('download_seconds', models.FloatField(blank=True, null=True)),
+                ('extract_seconds', models.FloatField(blank=True, null=True)),
+                ('autoapi_seconds', models.FloatField(blank=True, null=True)),
+                ('read_seconds', models.FloatField(blank=True, null=True)),
+                ('write_seconds', models.FloatField(blank=True, null=True)),
+                ('queued_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('release', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='builds', to='core.Release')),
+            ],
+            options={
+                'verbose_name': 'build',
+                'verbose_name_plural': 'builds',
+                'ordering': ['-queued_at'],
+                'get_latest_by': 'queued_at',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_build'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='pages_written',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='json_bytes',
+            field=models.BigIntegerField(blank=True, help_text='size of the JSON page dumps', null=True),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='json_seconds',
+            field=models.FloatField(blank=True, help_text='time spent dumping JSON pages, part of write', null=True),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='modules_parsed',
+            field=models.PositiveIntegerField(blank=True, help_text='modules documented by AutoAPI', null=True),
+        ),
+    ]
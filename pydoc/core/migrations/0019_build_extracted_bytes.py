@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_build_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='extracted_bytes',
+            field=models.BigIntegerField(blank=True, help_text='size of the sources extracted', null=True),
+        ),
+    ]
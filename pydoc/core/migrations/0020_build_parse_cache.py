@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_build_extracted_bytes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='parse_cache_hits',
+            field=models.PositiveIntegerField(blank=True, help_text='modules loaded from the parse cache', null=True),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='parse_cache_misses',
+            field=models.PositiveIntegerField(blank=True, help_text='modules AutoAPI had to parse', null=True),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='parse_seconds_saved',
+            field=models.FloatField(blank=True, help_text='parse time the cache hits saved', null=True),
+        ),
+    ]
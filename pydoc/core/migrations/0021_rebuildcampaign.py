@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_build_parse_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RebuildCampaign',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('state', models.CharField(choices=[('running', 'Running'), ('paused', 'Paused'), ('scheduled', 'All scheduled')], db_index=True, default='running', max_length=32)),
+                ('latest_only', models.BooleanField(default=False, help_text='only the latest release of each package')),
+                ('built_only', models.BooleanField(default=True, help_text='only releases with docs')),
+                ('built_before', models.DateTimeField(blank=True, help_text='only releases not built successfully since', null=True)),
+                ('toolchain', models.CharField(blank=True, help_text='only releases built with this toolchain', max_length=16)),
+                ('rate', models.PositiveIntegerField(default=60, help_text='builds scheduled per minute')),
+                ('cursor', models.IntegerField(default=0, help_text='the last release scheduled')),
+                ('total', models.PositiveIntegerField(default=0, help_text='releases selected when created')),
+                ('scheduled', models.PositiveIntegerField(default=0)),
+                ('skipped', models.PositiveIntegerField(default=0, help_text='already scheduled, failed recently or no such release')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, help_text='when the last batch was scheduled', null=True)),
+            ],
+            options={
+                'verbose_name': 'rebuild campaign',
+                'verbose_name_plural': 'rebuild campaigns',
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='campaign',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='builds', to='core.RebuildCampaign'),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='toolchain',
+            field=models.CharField(blank=True, db_index=True, help_text='see buildcache.toolchain_key', max_length=16),
+        ),
+    ]
@@ -0,0 +1,144 @@
+"""
+Local mirror of the distribution files builds read.
+
+Files are stored by the sha256 of their content under ``MIRROR_DIR``, so a
+file uploaded for several releases is stored once, and verified against the
+md5 and sha256 digests PyPI publishes. A blob's mtime is bumped whenever a
+build uses it, and :func:`prune` evicts the least recently used blobs once
+the mirror grows past ``MIRROR_MAX_SIZE``.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Distribution
+from .pypi import get_client
+
+CHUNK_SIZE = 64 * 1024
+
+
+class MirrorError(Exception):
+    pass
+
+
+def blob_name(sha256):
+    """Path of a blob relative to ``MEDIA_ROOT``, as stored in ``Distribution.file``."""
+    mirror_dir = os.path.relpath(settings.MIRROR_DIR(), settings.MEDIA_ROOT)
+    return os.path.join(mirror_dir, sha256[:2], sha256[2:4], sha256)
+
+
+def blob_path(sha256):
+    return os.path.join(settings.MEDIA_ROOT, blob_name(sha256))
+
+
+def _touch(path):
+    try:
+        os.utime(path, None)
+        return True
+    except OSError:
+        return False
+
+
+def download(url, md5_digest='', sha256_digest=''):
+    """
+    Stream ``url`` into the mirror and return its sha256.
+
+    The digests are checked while the file is written, and the blob only
+    appears in the mirror once it has been verified.
+    """
+    tmp_dir = os.path.join(settings.MIRROR_DIR(), 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    client = get_client()
+    with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as out:
+        try:
+            resp = client.session.get(url, stream=True, timeout=client.timeout)
+            if resp.status_code != 200:
+                raise MirrorError('Invalid status code on {}: {}'.format(url, resp.status_code))
+            for chunk in resp.iter_content(CHUNK_SIZE):
+                md5.update(chunk)
+                sha256.update(chunk)
+                out.write(chunk)
+            out.flush()
+            if md5_digest and md5.hexdigest() != md5_digest:
+                raise MirrorError('md5 mismatch on {}: {}'.format(url, md5.hexdigest()))
+            if sha256_digest and sha256.hexdigest() != sha256_digest:
+                raise MirrorError('sha256 mismatch on {}: {}'.format(url, sha256.hexdigest()))
+            digest = sha256.hexdigest()
+            path = blob_path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(out.name, path)
+        except Exception:
+            os.remove(out.name)
+            raise
+    return digest
+
+
+def mirror_distribution(distribution):
+    """
+    Return the local path of ``distribution``, downloading it if needed.
+
+    Nothing is downloaded when the distribution, or another one with the
+    same sha256, is already in the mirror. The mirrored file is only reused
+    while it is the blob of the distribution's current sha256, ingestion
+    updates a changed file's digests in place.
+    """
+    digest = distribution.sha256_digest
+    if (digest and distribution.file.name == blob_name(digest) and
+            _touch(distribution.file.path)):
+        return distribution.file.path
+
+    if not (digest and _touch(blob_path(digest))):
+        print('Mirroring {}'.format(distribution.url))
+        digest = download(distribution.url, distribution.md5_digest, distribution.sha256_digest)
+
+    distribution.file.name = blob_name(digest)
+    distribution.sha256_digest = digest
+    distribution.mirrored_at = timezone.now()
+    Distribution.objects.filter(pk=distribution.pk).update(
+        file=distribution.file.name, sha256_digest=digest,
+        mirrored_at=distribution.mirrored_at)
+    return distribution.file.path
+
+
+def prune(max_size=None, min_age=60 * 60):
+    """
+    Evict the least recently used blobs until the mirror fits ``max_size``.
+
+    Blobs used in the last ``min_age`` seconds are kept, a build may be
+    about to open them. Returns the number of evicted blobs.
+    """
+    max_size = max_size if max_size is not None else settings.MIRROR_MAX_SIZE
+    root = settings.MIRROR_DIR()
+    blobs = []
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == root and 'tmp' in dirnames:
+            dirnames.remove('tmp')
+        for filename in filenames:
+            stat = os.stat(os.path.join(dirpath, filename))
+            blobs.append((stat.st_mtime, stat.st_size, filename))
+            total += stat.st_size
+
+    evicted = []
+    cutoff = time.time() - min_age
+    for mtime, size, sha256 in sorted(blobs):
+        if total <= max_size or mtime > cutoff:
+            break
+        try:
+            os.remove(blob_path(sha256))
+        except OSError:
+            continue
+        total -= size
+        evicted.append(blob_name(sha256))
+
+    if evicted:
+        Distribution.objects.filter(file__in=evicted).update(file='', mirrored_at=None)
+    print('Pruned mirror: {} evicted, {} bytes kept'.format(len(evicted), total))
+    return len(evicted)
@@ -3,13 +3,21 @@ Most of this modeling came from https://github.com/stefanfoulis/django-packagein
 Thanks to all those who contributed.
 """
 
+import datetime
+import json
 import xmlrpc
+import zlib
+from fnmatch import fnmatch
 
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.search import SearchVectorField
 
 from . import conf
+from .versions import version_sort_key, is_prerelease
 
 
 try:
@@ -20,6 +28,15 @@ except NameError:
 PYPI_API_URL = 'https://pypi.python.org/pypi'
 PYPI_SIMPLE_URL = 'https://pypi.python.org/simple'
 MIRROR_FILETYPES = ['*.zip', '*.tgz', '*.egg', '*.tar.gz', '*.tar.bz2']
+# Source archives builds can read, see extract.py
+SDIST_FILETYPES = ['*.zip', '*.tgz', '*.tar.gz', '*.tar.bz2']
+
+
+def is_buildable(filetype, filename):
+    """Whether docs can be built from a distribution, see ``Release.build_distribution``."""
+    if filetype == 'bdist_wheel':
+        return True
+    return filetype == 'sdist' and any(fnmatch(filename, pattern) for pattern in SDIST_FILETYPES)
 
 
 class Classifier(models.Model):
@@ -41,6 +58,12 @@ class PackageIndexManager(models.Manager):
 class PackageIndex(models.Model):
     slug = models.CharField(max_length=255, unique=True, default='pypi')
     updated_from_remote_at = models.DateTimeField(null=True, blank=True)
+    last_serial = models.BigIntegerField(
+        null=True, blank=True,
+        help_text='The last changelog serial that has been processed')
+    list_checkpoint = models.CharField(
+        max_length=255, blank=True, default='',
+        help_text='The last package name stored by an unfinished package list import')
     xml_rpc_url = models.URLField(blank=True, default=PYPI_API_URL)
     simple_url = models.URLField(blank=True, default=PYPI_SIMPLE_URL)
 
@@ -64,8 +87,21 @@ class Package(models.Model):
     name = models.CharField(max_length=255, unique=True, primary_key=True)
     auto_hide = models.BooleanField(default=True, blank=False)
     updated_from_remote_at = models.DateTimeField(null=True, blank=True)
+    removed_from_remote_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text='The time the package was found missing from the index')
     parsed_external_links_at = models.DateTimeField(null=True, blank=True)
 
+    # Denormalized from releases, kept up to date by update_latest()
+    latest_release = models.ForeignKey('Release', null=True, blank=True, related_name='+',
+                                       on_delete=models.SET_NULL)
+    latest_built_release = models.ForeignKey('Release', null=True, blank=True,
+                                             related_name='+', on_delete=models.SET_NULL)
+    latest_built_version = models.CharField(max_length=128, blank=True, default='')
+
+    # Name, summary and keywords, see search.py
+    search_vector = SearchVectorField(null=True, blank=True)
+
     class Meta:
         verbose_name = _(u"package")
         verbose_name_plural = _(u"packages")
@@ -81,10 +117,20 @@ class Package(models.Model):
 
     @property
     def latest(self):
-        try:
-            return self.releases.latest()
-        except Release.DoesNotExist:
-            return None
+        return self.releases.latest_version()
+
+    def update_latest(self):
+        """Point the latest release fields at the package's current releases."""
+        latest = self.releases.latest_version()
+        latest_built = self.releases.filter(built=True).latest_version()
+        self.latest_release = latest
+        self.latest_built_release = latest_built
+        self.latest_built_version = latest_built.version if latest_built else ''
+        Package.objects.filter(pk=self.pk).update(
+            latest_release=latest,
+            latest_built_release=latest_built,
+            latest_built_version=self.latest_built_version,
+        )
 
     def get_release(self, version):
         """Return the release object for version, or None"""
@@ -94,9 +140,45 @@ class Package(models.Model):
             return None
 
 
+class ReleaseQuerySet(models.QuerySet):
+
+    def by_version(self):
+        """Highest version first, final releases before pre-releases."""
+        return self.order_by('is_prerelease', '-sort_key')
+
+    def latest_version(self):
+        return self.by_version().first()
+
+    # Django 1.10's get_latest_by takes a single field, which can't put
+    # final releases before pre-releases, so latest() orders like by_version
+
+    def latest(self, field_name=None):
+        if field_name is not None:
+            return super(ReleaseQuerySet, self).latest(field_name)
+        release = self.latest_version()
+        if release is None:
+            raise self.model.DoesNotExist('Release matching query does not exist.')
+        return release
+
+    def earliest(self, field_name=None):
+        if field_name is not None:
+            return super(ReleaseQuerySet, self).earliest(field_name)
+        release = self.order_by('-is_prerelease', 'sort_key').first()
+        if release is None:
+            raise self.model.DoesNotExist('Release matching query does not exist.')
+        return release
+
+    def latest_per_package(self):
+        """The latest release of each package, in a single query."""
+        return self.order_by('package', 'is_prerelease', '-sort_key').distinct('package')
+
+
 class Release(models.Model):
     package = models.ForeignKey(Package, related_name="releases")
     version = models.CharField(max_length=128)
+    sort_key = models.CharField(max_length=255, blank=True, default='',
+                                help_text='PEP 440 ordering of the version, see versions.py')
+    is_prerelease = models.BooleanField(default=False)
     metadata_version = models.CharField(max_length=64, default='1.0')
     package_info = JSONField(default=dict)
     built = models.BooleanField(default=False)
@@ -104,25 +186,48 @@ class Release(models.Model):
 
     is_from_external = models.BooleanField(default=False)
 
+    objects = ReleaseQuerySet.as_manager()
+
     class Meta:
         verbose_name = _(u"release")
         verbose_name_plural = _(u"releases")
         unique_together = ("package", "version")
-        get_latest_by = 'distributions__uploaded_at'
+        index_together = [("package", "is_prerelease", "sort_key")]
+        get_latest_by = 'sort_key'
         ordering = ['-created']
 
     def __str__(self):
         return self.release_name
 
+    def set_sort_key(self):
+        self.sort_key = version_sort_key(self.version)
+        self.is_prerelease = is_prerelease(self.version)
+
+    def save(self, *args, **kwargs):
+        if not self.sort_key:
+            self.set_sort_key()
+        super(Release, self).save(*args, **kwargs)
+
     @property
     def release_name(self):
-        return u"%s-%s" % (self.package.name, self.version)
+        # The package primary key is its name, this avoids loading the package
+        return u"%s-%s" % (self.package_id, self.version)
 
     @models.permalink
     def get_absolute_url(self):
-        return ('packageindex-release', (), {'package': self.package.name,
+        return ('packageindex-release', (), {'package': self.package_id,
                                              'version': self.version})
 
+    def build_distribution(self):
+        """The distribution to build the docs from, a wheel or else an sdist."""
+        wheel = self.distributions.filter(filetype='bdist_wheel').first()
+        if wheel is not None:
+            return wheel
+        for dist in self.distributions.filter(filetype='sdist'):
+            if is_buildable(dist.filetype, dist.filename):
+                return dist
+        return None
+
     @property
     def summary(self):
         return self.package_info.get('summary', u'')
@@ -149,6 +254,7 @@ class Distribution(models.Model):
                           max_length=5000)
     size = models.IntegerField(null=True, blank=True)
     md5_digest = models.CharField(max_length=32, blank=True)
+    sha256_digest = models.CharField(max_length=64, blank=True)
     filetype = models.CharField(max_length=32, blank=False,
                                 choices=conf.DIST_FILE_TYPES)
     pyversion = models.CharField(max_length=16, blank=True,
@@ -188,3 +294,344 @@ class Distribution(models.Model):
         if self.file:
             return self.file.url
         return self.url
+
+
+class PackageMetadata(models.Model):
+
+    """The last JSON document fetched from PyPI for a package.
+
+    The body is stored zlib compressed along with the HTTP cache validators,
+    so refreshes can be conditional requests. ``ingested`` records whether the
+    stored body has been written to the release and distribution tables.
+    """
+
+    name = models.CharField(max_length=255, primary_key=True)
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    body = models.BinaryField()
+    ingested = models.BooleanField(default=False)
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _(u"package metadata")
+        verbose_name_plural = _(u"package metadata")
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def package_json(self):
+        try:
+            data = json.loads(zlib.decompress(bytes(self.body)).decode('utf-8'))
+            data['info']['name'] = data['info']['name'].lower()
+            return data
+        except Exception as e:
+            print('JSON Error: {}'.format(e))
+        return ''
+
+    def mark_ingested(self):
+        PackageMetadata.objects.filter(pk=self.pk, etag=self.etag).update(ingested=True)
+        self.ingested = True
+
+
+class PopularPackage(models.Model):
+
+    """A package from the libraries.io popularity ranking."""
+
+    name = models.CharField(max_length=255, unique=True)
+    position = models.PositiveIntegerField(db_index=True,
+                                           help_text='1 is the most popular package')
+    rank = models.IntegerField(null=True, blank=True,
+                               help_text='the libraries.io SourceRank')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _(u"popular package")
+        verbose_name_plural = _(u"popular packages")
+        ordering = ['position']
+
+    def __str__(self):
+        return self.name
+
+
+class Page(models.Model):
+
+    """A page of a release's generated API docs, indexed for full text search."""
+
+    release = models.ForeignKey(Release, related_name='pages')
+    path = models.CharField(max_length=1000, help_text='the Sphinx page name')
+    title = models.CharField(max_length=1000, blank=True)
+    text = models.TextField(blank=True)
+    search_vector = SearchVectorField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _(u"page")
+        verbose_name_plural = _(u"pages")
+
+    def __str__(self):
+        return self.path
+
+    def get_absolute_url(self):
+        return '/pypi/{}/{}.html'.format(self.release.release_name, self.path)
+
+
+class Symbol(models.Model):
+
+    """A module, class, function or other object documented in a release."""
+
+    release = models.ForeignKey(Release, related_name='symbols')
+    name = models.CharField(max_length=255, db_index=True,
+                            help_text='the full dotted name')
+    short_name = models.CharField(max_length=255, db_index=True,
+                                  help_text='the lowercased last part of the name')
+    kind = models.CharField(max_length=32)
+    path = models.CharField(max_length=1000,
+                            help_text='the page and anchor, relative to the release docs')
+
+    class Meta:
+        verbose_name = _(u"symbol")
+        verbose_name_plural = _(u"symbols")
+
+    def __str__(self):
+        return self.name
+
+
+class Build(models.Model):
+
+    """One attempt at building the docs of a release.
+
+    Stage durations are in seconds. ``autoapi``, ``read`` and ``write`` are
+    reported by the ``pydoc.sphinx`` extension from inside sphinx-build, as
+    are the counters.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    NO_WHEEL = 'skipped-no-wheel'
+    STATES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCESS, 'Success'),
+        (FAILED, 'Failed'),
+        (NO_WHEEL, 'Skipped, no wheel'),
+    )
+    STAGES = ('download', 'extract', 'autoapi', 'read', 'write')
+    # Build fields and the name pydoc.sphinx reports them under
+    COUNTERS = (
+        ('pages_written', 'pages'),
+        ('json_bytes', 'json_bytes'),
+        ('json_seconds', 'json_seconds'),
+        ('modules_parsed', 'modules'),
+        ('extracted_bytes', 'extracted_bytes'),
+        ('parse_cache_hits', 'parse_hits'),
+        ('parse_cache_misses', 'parse_misses'),
+        ('parse_seconds_saved', 'parse_saved'),
+    )
+
+    release = models.ForeignKey(Release, related_name='builds')
+    state = models.CharField(max_length=32, choices=STATES, default=QUEUED, db_index=True)
+    queue = models.CharField(max_length=32, blank=True)
+    campaign = models.ForeignKey('RebuildCampaign', null=True, blank=True, related_name='builds',
+                                 on_delete=models.SET_NULL)
+    toolchain = models.CharField(max_length=16, blank=True, db_index=True,
+                                 help_text='see buildcache.toolchain_key')
+    reason = models.TextField(blank=True, help_text='why the build failed')
+    log_excerpt = models.TextField(blank=True, help_text='the end of the build log')
+    attempt = models.PositiveIntegerField(default=1,
+                                          help_text='consecutive failed builds, this one included')
+    retry_after = models.DateTimeField(null=True, blank=True,
+                                       help_text='a failed release is not built again before')
+
+    download_seconds = models.FloatField(null=True, blank=True)
+    extract_seconds = models.FloatField(null=True, blank=True)
+    autoapi_seconds = models.FloatField(null=True, blank=True)
+    read_seconds = models.FloatField(null=True, blank=True)
+    write_seconds = models.FloatField(null=True, blank=True)
+
+    pages_written = models.PositiveIntegerField(null=True, blank=True)
+    json_bytes = models.BigIntegerField(null=True, blank=True,
+                                        help_text='size of the JSON page dumps')
+    json_seconds = models.FloatField(null=True, blank=True,
+                                     help_text='time spent dumping JSON pages, part of write')
+    modules_parsed = models.PositiveIntegerField(null=True, blank=True,
+                                                 help_text='modules documented by AutoAPI')
+    extracted_bytes = models.BigIntegerField(null=True, blank=True,
+                                             help_text='size of the sources extracted')
+    parse_cache_hits = models.PositiveIntegerField(
+        null=True, blank=True, help_text='modules loaded from the parse cache')
+    parse_cache_misses = models.PositiveIntegerField(
+        null=True, blank=True, help_text='modules AutoAPI had to parse')
+    parse_seconds_saved = models.FloatField(
+        null=True, blank=True, help_text='parse time the cache hits saved')
+
+    queued_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _(u"build")
+        verbose_name_plural = _(u"builds")
+        ordering = ['-queued_at']
+        get_latest_by = 'queued_at'
+
+    def __str__(self):
+        return '{} {}'.format(self.release, self.state)
+
+    @property
+    def duration(self):
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+
+    def start(self):
+        from .buildcache import toolchain_key
+        self.state = self.RUNNING
+        self.started_at = timezone.now()
+        self.toolchain = toolchain_key()[:16]
+        self.save(update_fields=['state', 'started_at', 'toolchain'])
+
+    def set_stats(self, stats):
+        for stage in self.STAGES:
+            if stage in stats:
+                setattr(self, '{}_seconds'.format(stage), stats[stage])
+        for field, name in self.COUNTERS:
+            if name in stats:
+                setattr(self, field, stats[name])
+
+    def report(self, spans=()):
+        """The build as a JSON serializable dict."""
+        def isoformat(value):
+            return value.isoformat() if value else None
+        return {
+            'package': self.release.package_id,
+            'version': self.release.version,
+            'state': self.state,
+            'queue': self.queue,
+            'attempt': self.attempt,
+            'reason': self.reason,
+            'queued_at': isoformat(self.queued_at),
+            'started_at': isoformat(self.started_at),
+            'finished_at': isoformat(self.finished_at),
+            'duration': self.duration,
+            'stages': {
+                stage: getattr(self, '{}_seconds'.format(stage)) for stage in self.STAGES
+            },
+            'counters': {field: getattr(self, field) for field, _ in self.COUNTERS},
+            'spans': list(spans),
+        }
+
+    def finish(self, state, reason='', log_excerpt=''):
+        """Record the outcome, failures back off exponentially per release."""
+        self.state = state
+        self.reason = reason
+        self.log_excerpt = log_excerpt
+        self.finished_at = timezone.now()
+        if state == self.FAILED:
+            previous = (
+                self.release.builds.exclude(pk=self.pk)
+                .filter(state__in=[self.SUCCESS, self.FAILED]).first()
+            )
+            if previous is not None and previous.state == self.FAILED:
+                self.attempt = previous.attempt + 1
+            delay = min(settings.BUILD_RETRY_BASE * 2 ** (self.attempt - 1),
+                        settings.BUILD_RETRY_MAX)
+            self.retry_after = self.finished_at + datetime.timedelta(seconds=delay)
+        self.save()
+
+
+class RebuildCampaign(models.Model):
+
+    """A rebuild of many releases, scheduled a batch at a time.
+
+    The releases are selected by the criteria fields and walked in primary
+    key order, ``cursor`` being the last one scheduled, so a campaign never
+    loads its whole selection. ``tasks.advance_campaigns`` schedules up to
+    ``rate`` builds per running campaign every minute on the backfill queue.
+    """
+
+    RUNNING = 'running'
+    PAUSED = 'paused'
+    SCHEDULED = 'scheduled'
+    STATES = (
+        (RUNNING, 'Running'),
+        (PAUSED, 'Paused'),
+        (SCHEDULED, 'All scheduled'),
+    )
+
+    name = models.CharField(max_length=255)
+    state = models.CharField(max_length=32, choices=STATES, default=RUNNING, db_index=True)
+
+    latest_only = models.BooleanField(default=False,
+                                      help_text='only the latest release of each package')
+    built_only = models.BooleanField(default=True, help_text='only releases with docs')
+    built_before = models.DateTimeField(null=True, blank=True,
+                                        help_text='only releases not built successfully since')
+    toolchain = models.CharField(max_length=16, blank=True,
+                                 help_text='only releases built with this toolchain')
+    rate = models.PositiveIntegerField(default=60, help_text='builds scheduled per minute')
+
+    cursor = models.IntegerField(default=0, help_text='the last release scheduled')
+    total = models.PositiveIntegerField(default=0, help_text='releases selected when created')
+    scheduled = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(
+        default=0, help_text='already scheduled, failed recently or no such release')
+
+    created = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True,
+                                       help_text='when the last batch was scheduled')
+
+    class Meta:
+        verbose_name = _(u"rebuild campaign")
+        verbose_name_plural = _(u"rebuild campaigns")
+        ordering = ['-created']
+
+    def __str__(self):
+        return self.name
+
+    def releases(self):
+        """The selected releases, in the order they are scheduled."""
+        releases = Release.objects.order_by('pk')
+        if self.latest_only:
+            releases = releases.filter(
+                pk__in=Package.objects.exclude(latest_release=None).values('latest_release'))
+        if self.built_only:
+            releases = releases.filter(built=True)
+        if self.built_before:
+            releases = releases.exclude(pk__in=Build.objects.filter(
+                state=Build.SUCCESS, finished_at__gte=self.built_before).values('release_id'))
+        if self.toolchain:
+            # The toolchain of each release's latest successful build
+            latest_success = (
+                Build.objects.filter(state=Build.SUCCESS)
+                .order_by('release_id', '-finished_at').distinct('release_id').values('pk')
+            )
+            releases = releases.filter(pk__in=Build.objects.filter(
+                pk__in=latest_success, toolchain=self.toolchain).values('release_id'))
+        return releases
+
+    def next_batch(self, size):
+        """The next ``size`` releases after the cursor, as ``(pk, package, version)``."""
+        return list(
+            self.releases().filter(pk__gt=self.cursor)
+            .values_list('pk', 'package_id', 'version')[:size]
+        )
+
+    def progress(self):
+        """Counts of the campaign's builds, see ``Build.STATES``, and what's left."""
+        counts = dict(
+            self.builds.order_by().values_list('state').annotate(models.Count('pk'))
+        )
+        done = counts.get(Build.SUCCESS, 0)
+        failed = counts.get(Build.FAILED, 0) + counts.get(Build.NO_WHEEL, 0)
+        pending = counts.get(Build.QUEUED, 0) + counts.get(Build.RUNNING, 0)
+        return {
+            'total': self.total,
+            'scheduled': self.scheduled,
+            'skipped': self.skipped,
+            'done': done,
+            'failed': failed,
+            'pending': pending,
+            'remaining': max(self.total - self.scheduled - self.skipped, 0) + pending,
+        }
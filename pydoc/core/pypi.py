@@ -0,0 +1,264 @@
+"""
+HTTP client for the PyPI JSON API.
+
+All PyPI metadata fetches go through a shared :class:`PyPIClient`, which keeps
+a pool of keep-alive connections, rate limits per host, and retries throttled
+or failing responses with jittered exponential backoff.
+
+Responses are kept in the :class:`~pydoc.core.models.PackageMetadata` table,
+so refreshes are conditional requests and an unchanged package costs a 304.
+"""
+
+import random
+import threading
+import time
+import zlib
+from collections import namedtuple
+from queue import Full, Queue
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import PackageMetadata
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_STOP = object()
+
+PackageResponse = namedtuple('PackageResponse', 'name status content etag last_modified')
+
+
+class RateLimiter(object):
+
+    """Spaces out requests so each host sees at most ``rate`` requests/second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, host):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PyPIClient(object):
+
+    """Pooled, rate limited client for ``<base_url>/<name>/json``."""
+
+    def __init__(self, base_url=None, concurrency=None, rate=None, retries=None,
+                 timeout=None, backoff=0.5, max_retry_after=None):
+        self.base_url = (base_url or getattr(
+            settings, 'PYPI_URL', 'https://pypi.python.org/pypi')).rstrip('/')
+        self.concurrency = concurrency or getattr(settings, 'PYPI_FETCH_CONCURRENCY', 20)
+        self.retries = retries if retries is not None else getattr(settings, 'PYPI_RETRIES', 3)
+        self.timeout = timeout or getattr(settings, 'PYPI_TIMEOUT', 10)
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after or getattr(settings, 'PYPI_MAX_RETRY_AFTER', 60)
+        self.limiter = RateLimiter(
+            rate if rate is not None else getattr(settings, 'PYPI_RATE_LIMIT', 300))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def url(self, name):
+        return '{base}/{name}/json'.format(base=self.base_url, name=name)
+
+    def _delay(self, attempt, resp=None):
+        retry_after = resp.headers.get('Retry-After') if resp is not None else None
+        if retry_after and retry_after.isdigit():
+            # A misbehaving server shouldn't park a fetcher for hours
+            return min(float(retry_after), self.max_retry_after)
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def get(self, url, headers=None):
+        """GET ``url``, retrying connection errors and 429/5xx responses."""
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(host)
+            try:
+                resp = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+            if resp.status_code not in RETRY_STATUSES or attempt == self.retries:
+                return resp
+            time.sleep(self._delay(attempt, resp))
+        return resp
+
+    def fetch(self, name, etag='', last_modified=''):
+        """
+        Conditionally fetch package ``name``.
+
+        Returns a :class:`PackageResponse`; ``status`` is ``None`` when the
+        request itself failed and ``content`` is only set on a 200.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        try:
+            resp = self.get(self.url(name), headers=headers)
+        except requests.RequestException as e:
+            print('Request Error on {}: {}'.format(name, e))
+            return PackageResponse(name, None, b'', '', '')
+        return PackageResponse(
+            name, resp.status_code,
+            resp.content if resp.status_code == 200 else b'',
+            resp.headers.get('ETag', ''), resp.headers.get('Last-Modified', ''),
+        )
+
+    def fetch_many(self, names, validators=None, queue_size=None):
+        """
+        Fetch many packages concurrently.
+
+        Yields a :class:`PackageResponse` per name in completion order.
+        ``validators`` maps names to the ``(etag, last_modified)`` pair to send
+        with the request. Fetches run on ``concurrency`` worker threads and
+        feed a bounded queue, so a slow consumer (the database writer) applies
+        backpressure to the fetchers. ``names`` is consumed from a background
+        thread, so pass plain names rather than a lazy queryset.
+
+        When the consumer stops early, by ``break`` or an exception, the
+        threads notice and exit after their current request.
+        """
+        validators = validators or {}
+        todo = Queue(maxsize=self.concurrency * 2)
+        done = Queue(maxsize=queue_size or self.concurrency * 4)
+        stopped = threading.Event()
+
+        def put(queue, item):
+            """Put ``item`` unless the consumer went away, returns whether it did."""
+            while not stopped.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def feeder():
+            for name in names:
+                if not put(todo, name):
+                    return
+            for _ in range(self.concurrency):
+                put(todo, _STOP)
+
+        def worker():
+            while not stopped.is_set():
+                name = todo.get()
+                if name is _STOP:
+                    put(done, _STOP)
+                    return
+                try:
+                    response = self.fetch(name, *validators.get(name, ('', '')))
+                except Exception as e:  # pylint: disable=broad-except
+                    print('Fetch Error on {}: {}'.format(name, e))
+                    response = PackageResponse(name, None, b'', '', '')
+                if not put(done, response):
+                    return
+
+        threads = [threading.Thread(target=feeder)]
+        threads += [threading.Thread(target=worker) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        running = self.concurrency
+        try:
+            while running:
+                item = done.get()
+                if item is _STOP:
+                    running -= 1
+                    continue
+                yield item
+        finally:
+            stopped.set()
+            # Wake the workers waiting for names, the feeder has stopped filling
+            for _ in range(self.concurrency):
+                try:
+                    todo.put_nowait(_STOP)
+                except Full:
+                    break
+
+
+_client = None
+
+
+def get_client():
+    """Return the process wide :class:`PyPIClient`."""
+    global _client  # pylint: disable=global-statement
+    if _client is None:
+        _client = PyPIClient()
+    return _client
+
+
+def validators_for(cached):
+    if cached is None:
+        return ('', '')
+    return (cached.etag, cached.last_modified)
+
+
+def store_response(response, cached=None):
+    """
+    Apply a fetch response to the metadata cache.
+
+    Returns the up to date :class:`PackageMetadata` row, or ``None`` when the
+    package could not be fetched. A 304 leaves the row untouched, and a 200
+    whose body did not change keeps its ``ingested`` flag.
+    """
+    if response.status == 304 and cached is not None:
+        return cached
+    if response.status != 200:
+        print('Invalid Status code on {}: {}'.format(response.name, response.status))
+        return None
+    body = zlib.compress(response.content)
+    if cached is None:
+        cached = PackageMetadata(name=response.name)
+    elif bytes(cached.body) == body:
+        cached.etag = response.etag
+        cached.last_modified = response.last_modified
+        cached.save(update_fields=['etag', 'last_modified', 'fetched_at'])
+        return cached
+    cached.body = body
+    cached.etag = response.etag
+    cached.last_modified = response.last_modified
+    cached.ingested = False
+    cached.save()
+    return cached
+
+
+def _fetched_key(name):
+    return 'pypi:fetched:{}'.format(name)
+
+
+def fetch_package(name):
+    """
+    Return the cached :class:`PackageMetadata` for ``name``, refreshed from PyPI.
+
+    Packages fetched in the last ``PYPI_CACHE_FRESH`` seconds, by any
+    process, are read from the database without asking PyPI again, so the
+    several lookups one web request or task makes for the same package share
+    a single fetch.
+    """
+    cached = PackageMetadata.objects.filter(name=name).first()
+    if cached is not None and cache.get(_fetched_key(name)):
+        return cached
+    meta = store_response(get_client().fetch(name, *validators_for(cached)), cached)
+    if meta is not None:
+        cache.set(_fetched_key(name), True, getattr(settings, 'PYPI_CACHE_FRESH', 60))
+    return meta
@@ -0,0 +1,20 @@
+"""
+Signal receivers, connected in :class:`pydoc.core.apps.CoreConfig`.
+"""
+
+from django.dispatch import receiver
+
+from .caching import invalidate, HOME_BUILT_COUNT, HOME_POPULAR, HOME_RECENT
+from .signals import release_built, package_updated
+
+
+@receiver(release_built)
+def refresh_home_on_build(sender, release, **kwargs):
+    invalidate(HOME_BUILT_COUNT, HOME_POPULAR, HOME_RECENT)
+
+
+@receiver(package_updated)
+def refresh_home_on_update(sender, package, stats, **kwargs):
+    # Ingestion refreshes Package.latest_built_release, which the popular block reads
+    if stats['inserted']:
+        invalidate(HOME_POPULAR)
@@ -0,0 +1,238 @@
+"""
+Build scheduling.
+
+Builds go to one of three Celery queues, so a backfill of thousands of
+releases doesn't hold up a build somebody asked for on the site::
+
+    builds.interactive  builds requested through the site
+    builds.changelog    releases that just appeared on PyPI
+    builds.backfill     everything else, management commands and bulk jobs
+
+Run a worker per queue, or at least one that only consumes
+``builds.interactive``, since a worker reading several queues doesn't
+prioritize between them.
+
+Each (package, version) is scheduled at most once until its build finishes,
+a build of the package's latest release counting as one of that version.
+Scheduling it again at a higher priority supersedes the queued task, the old
+one notices when it starts and exits. Changelog builds are delayed by
+``BUILD_COALESCE_DELAY`` and don't name a version, a queued one whose package
+got a newer release leaves it to that release's build, so any number of
+uploads to a package in that window end in one build of its latest release. Every
+queue has a limit in ``BUILD_QUEUE_LIMITS``, past which new builds are
+refused rather than queued.
+
+Every scheduled build gets a :class:`~pydoc.core.models.Build` record. A
+release whose last build failed isn't scheduled again until the build's
+``retry_after``, which doubles with every consecutive failure. Builds whose
+task was lost are failed by :func:`expire_stale_builds`.
+"""
+
+import datetime
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Build, Package, Release
+
+INTERACTIVE = 'builds.interactive'
+CHANGELOG = 'builds.changelog'
+BACKFILL = 'builds.backfill'
+
+# Highest priority first
+PRIORITIES = (INTERACTIVE, CHANGELOG, BACKFILL)
+
+# Counters are only a guard against runaway queues, let them heal if they drift
+COUNTER_TIMEOUT = 60 * 60 * 24
+
+
+def _latest_version(project):
+    return (
+        Package.objects.filter(name=project)
+        .values_list('latest_release__version', flat=True).first()
+    )
+
+
+def _build_key(project, version):
+    """Key of a release's build, a build of the latest release shares its version's key."""
+    return 'build:{}:{}'.format(project, version or _latest_version(project) or 'latest')
+
+
+def _queued_key(queue):
+    return 'build-queued:{}'.format(queue)
+
+
+def queue_length(queue):
+    """Builds scheduled on ``queue`` that haven't started yet."""
+    return cache.get(_queued_key(queue)) or 0
+
+
+def _incr(queue, delta):
+    key = _queued_key(queue)
+    cache.add(key, 0, COUNTER_TIMEOUT)
+    try:
+        if delta > 0:
+            cache.incr(key, delta)
+        elif cache.get(key):
+            cache.decr(key, -delta)
+    except ValueError:
+        # Expired between add and incr
+        pass
+
+
+def in_backoff(release_id):
+    """Whether the last build of the release failed and may not be retried yet."""
+    last = (
+        Build.objects.filter(release_id=release_id)
+        .filter(state__in=[Build.SUCCESS, Build.FAILED]).first()
+    )
+    return (last is not None and last.state == Build.FAILED and
+            last.retry_after is not None and last.retry_after > timezone.now())
+
+
+def expire_stale_builds():
+    """
+    Fail the builds whose task was lost.
+
+    A worker killed at the task's hard time limit, or a task dropped by the
+    broker, leaves its build running or queued. Running builds past the
+    time limit count as failed attempts. Builds queued for longer than
+    ``BUILD_QUEUED_EXPIRY`` are closed without a backoff, as they never ran.
+    Returns the number of builds expired.
+    """
+    now = timezone.now()
+    running_cutoff = now - datetime.timedelta(
+        seconds=settings.BUILD_SLOT_TIMEOUT + settings.BUILD_TIMEOUT + 60 * 5)
+    expired = 0
+    for build in Build.objects.filter(state=Build.RUNNING, started_at__lt=running_cutoff):
+        build.finish(Build.FAILED, 'The build task was lost or killed')
+        expired += 1
+    expired += Build.objects.filter(
+        state=Build.QUEUED,
+        queued_at__lt=now - datetime.timedelta(seconds=settings.BUILD_QUEUED_EXPIRY),
+    ).update(state=Build.FAILED, reason='The build task never started', finished_at=now)
+    if expired:
+        print('Expired {} stale builds'.format(expired))
+    return expired
+
+
+def schedule_build(project, version=None, priority=BACKFILL, profile=False, campaign_id=None):
+    """
+    Queue a build of ``project`` at ``version``, or of its latest release.
+
+    With ``profile`` the build runs under cProfile, see ``tasks.build``, a
+    queued build of the release without it is replaced by a profiled one on
+    the higher of the two queues. ``campaign_id`` is the
+    :class:`~pydoc.core.models.RebuildCampaign` the build is part of.
+
+    Returns the Celery ``AsyncResult``, or ``None`` when the release is
+    already running or scheduled at the same or higher priority, failed
+    recently, has nothing to build from, or the queue is full.
+    """
+    from .tasks import build  # noqa
+
+    if priority == CHANGELOG:
+        # Coalesced, the build picks the latest release when it runs
+        version = None
+    key = _build_key(project, version)
+    token = uuid.uuid4().hex
+    entry = {'token': token, 'queue': priority, 'running': False, 'profile': profile}
+    timeout = settings.BUILD_TIMEOUT + settings.BUILD_COALESCE_DELAY + 60 * 60
+
+    if queue_full(priority):
+        print('Build queue {} is full, not scheduling {}-{}'.format(
+            priority, project, version or 'latest'))
+        return None
+    release_id = None
+    if version:
+        release = Release.objects.filter(package_id=project, version=version).only('pk').first()
+        if release is None:
+            print('Unknown release {}-{}'.format(project, version))
+            return None
+        release_id = release.pk
+        if in_backoff(release_id):
+            print('Build of {}-{} failed recently, not scheduling'.format(project, version))
+            return None
+        if release.build_distribution() is None:
+            print('No wheel or sdist to build {}-{}, not scheduling'.format(project, version))
+            return None
+
+    if cache.add(key, entry, timeout):
+        if release_id is not None:
+            entry['build_id'] = Build.objects.create(
+                release_id=release_id, queue=priority, campaign_id=campaign_id).pk
+            cache.set(key, entry, timeout)
+    else:
+        current = cache.get(key)
+        add_profile = profile and current is not None and not current.get('profile')
+        if current is None or current['running'] or (
+                PRIORITIES.index(current['queue']) <= PRIORITIES.index(priority) and
+                not add_profile):
+            print('Build of {}-{} already {}{}'.format(
+                project, version or 'latest',
+                'running' if current and current['running'] else 'scheduled',
+                ', not profiling it' if add_profile else ''))
+            return None
+        # Move it up to the higher priority queue or profile it, the old task will skip
+        if PRIORITIES.index(current['queue']) < PRIORITIES.index(priority):
+            priority = entry['queue'] = current['queue']
+        entry['build_id'] = current.get('build_id')
+        if entry['build_id'] is not None:
+            Build.objects.filter(pk=entry['build_id']).update(queue=priority)
+        cache.set(key, entry, timeout)
+        _incr(current['queue'], -1)
+
+    _incr(priority, 1)
+    countdown = settings.BUILD_COALESCE_DELAY if priority == CHANGELOG else None
+    return build.apply_async(
+        kwargs={'project': project, 'version': version, 'token': token,
+                'build_id': entry.get('build_id'), 'profile': profile, 'key': key},
+        queue=priority, countdown=countdown,
+    )
+
+
+def queue_full(queue):
+    return queue_length(queue) >= settings.BUILD_QUEUE_LIMITS[queue]
+
+
+def start_build(project, version, token, key=None):
+    """
+    Mark a scheduled build as running.
+
+    Returns ``False`` when the task was superseded and should not run.
+    Builds queued without a token, from before the scheduler, always run.
+    ``key`` is the key the build was scheduled under, a build of the latest
+    release whose package got a newer one since leaves it to that
+    release's build, if there is one.
+    """
+    if token is None:
+        return True
+    key = key or _build_key(project, version)
+    entry = cache.get(key)
+    if entry is not None and entry['token'] != token:
+        print('Build of {}-{} was rescheduled, skipping'.format(project, version or 'latest'))
+        return False
+    latest_key = _build_key(project, version)
+    if latest_key != key and cache.get(latest_key) is not None:
+        print('Build of {}-latest was superseded by a newer release, skipping'.format(project))
+        if entry is not None:
+            _incr(entry['queue'], -1)
+            cache.delete(key)
+        return False
+    if entry is not None:
+        _incr(entry['queue'], -1)
+        entry['running'] = True
+        cache.set(key, entry, settings.BUILD_TIMEOUT + 60 * 60)
+    return True
+
+
+def finish_build(project, version, token, key=None):
+    """Allow the release to be scheduled again."""
+    if token is None:
+        return
+    key = key or _build_key(project, version)
+    entry = cache.get(key)
+    if entry is not None and entry['token'] == token:
+        cache.delete(key)
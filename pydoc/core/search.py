@@ -0,0 +1,56 @@
+"""
+Package search.
+
+Packages are matched on their name with the trigram index, and on their
+summary and keywords with a weighted full text vector. Results are ranked by
+text rank plus name similarity, with exact and prefix name matches boosted.
+"""
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramSimilarity)
+from django.db.models import Case, F, FloatField, Q, TextField, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Package
+
+EXACT_BOOST = 10.0
+PREFIX_BOOST = 1.0
+
+
+def update_search_vector(package, package_info):
+    """Index the name, summary and keywords of ``package``."""
+    def text(value):
+        return Value(value or '', output_field=TextField())
+
+    Package.objects.filter(pk=package.pk).update(search_vector=(
+        SearchVector(text(package.name), config='simple', weight='A') +
+        SearchVector(text(package_info.get('summary')), config='english', weight='B') +
+        SearchVector(text(package_info.get('keywords')), config='english', weight='C')
+    ))
+
+
+def search_packages(query):
+    """Return built packages matching ``query``, best match first."""
+    query = query.strip().lower()
+    if not query:
+        return Package.objects.none()
+    search_query = SearchQuery(query, config='english')
+    boost = Case(
+        When(name=query, then=Value(EXACT_BOOST)),
+        When(name__startswith=query, then=Value(PREFIX_BOOST)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    return (
+        Package.objects
+        .filter(latest_built_release__isnull=False)
+        .filter(
+            Q(search_vector=search_query) |
+            Q(name__trigram_similar=query) |
+            Q(name__contains=query)
+        )
+        .annotate(rank=Coalesce(SearchRank(F('search_vector'), search_query), Value(0.0)) +
+                  TrigramSimilarity('name', query) + boost)
+        .order_by('-rank', 'name')
+        .select_related('latest_built_release')
+    )
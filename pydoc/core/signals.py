@@ -0,0 +1,11 @@
+"""
+Signals sent when documentation or package data changes.
+"""
+
+from django.dispatch import Signal
+
+# Sent by the build task once a release's docs are built
+release_built = Signal(providing_args=['release'])
+
+# Sent by ingestion when a package's releases or distributions changed
+package_updated = Signal(providing_args=['package', 'stats'])
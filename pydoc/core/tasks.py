@@ -1,16 +1,21 @@
 from __future__ import absolute_import
 
+import cProfile
 import json
 import os
 import tempfile
-import urllib.request
-import zipfile
 
 from celery import Celery
 from django.apps import apps, AppConfig
 from django.conf import settings
+from django.db import transaction
 from django.template.loader import get_template
 
+from . import docstore, metrics
+from .builder import BuildError, artifact_path, build_slot, log_path, run_sphinx
+from .buildcache import BuildCache, STATS_FILE
+from .extract import extract
+
 
 if not settings.configured:
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pydoc.settings.local')  # pragma: no cover
@@ -31,85 +36,217 @@ class CeleryConfig(AppConfig):
         app.autodiscover_tasks(lambda: installed_apps, force=True)
 
 
-def _build_docs(project, version, project_url, project_filename, releases):
+def _build_docs(project, version, archive_path, filename, releases, spans, profile=False):
+    """
+    Build the docs of a wheel or source archive, ``filename`` tells which.
+
+    Returns the stage durations and counters, see ``Build.set_stats``.
+    """
     conf_template = get_template('sphinx/conf.py.tmpl')
     index_template = get_template('sphinx/index.rst.tmpl')
+    cache = BuildCache(project)
 
-    with tempfile.TemporaryDirectory() as tmp_dir:
+    # BUILD_TMP_DIR can point at a tmpfs, extraction then never hits the disk
+    with tempfile.TemporaryDirectory(dir=settings.BUILD_TMP_DIR or None) as tmp_dir:
         directory_name = "{name}-{version}".format(name=project, version=version)
-        filename = os.path.join(tmp_dir, project_filename)
         extract_dir = os.path.join(tmp_dir, directory_name)
-        urllib.request.urlretrieve(project_url, filename=filename)
-        with zipfile.ZipFile(filename, "r") as zip_ref:
-            zip_ref.extractall(extract_dir)
-        print('File now in %s' % extract_dir)
-
-        autoapi_dirs = []
-        for possible_project in os.listdir(extract_dir):
-            if '__init__.py' in os.listdir(os.path.join(extract_dir, possible_project)):
-                autoapi_dirs.append(os.path.join(extract_dir, possible_project))
+        with spans.span('extract') as extract_span:
+            extracted = extract(
+                archive_path, filename, extract_dir, settings.AUTOAPI_IGNORE,
+                max_bytes=settings.EXTRACT_MAX_BYTES, max_members=settings.EXTRACT_MAX_MEMBERS,
+                max_scanned=settings.EXTRACT_MAX_SCANNED)
+        stats = {'extract': extract_span['seconds'], 'extracted_bytes': extracted.bytes}
+        print('Extracted {} files, {} bytes to {}, skipped {}'.format(
+            extracted.files, extracted.bytes, extract_dir, extracted.skipped))
+
+        # Sphinx runs in the package's cache directory, so the environment and
+        # doctrees of the previous build are reused for unchanged modules
+        autoapi_dirs = [os.path.join(cache.src, path) for path in extracted.autoapi_dirs]
         print('Autoapi now in %s' % autoapi_dirs)
 
-        conf_filename = os.path.join(extract_dir, 'conf.py')
-        with open(conf_filename, 'w+') as conf_file:
-            to_write = conf_template.render(dict(
-                autoapi_dirs=json.dumps(autoapi_dirs),
-                project=project,
-                version=version,
-                releases=releases,
-                output_directory=settings.JSON_DIR(),
-                python_path=settings.ROOT_DIR(),
-            ))
-            conf_file.write(to_write)
-        print('Conf File now in %s' % conf_filename)
-
-        index_filename = os.path.join(extract_dir, 'index.rst')
-        with open(index_filename, 'w+') as index_file:
-            to_write = index_template.render(dict(
-                project=project,
-                version=version,
-            ))
-            index_file.write(to_write)
-        print('Index File now in %s' % index_filename)
-
-        outdir = settings.DOCS_DIR.path(directory_name)
-        if not os.path.exists(outdir.root):
-            os.makedirs(outdir.root)
-        print('Running Sphinx')
-        sphinx_command = 'sphinx-build -b html ' \
-            '-d {root}_build/{name}-doctrees {root} {outdir}'.format(
-                outdir=outdir.root,
-                root=extract_dir,
-                name=directory_name
-            )
-        print(sphinx_command)
-        os.system(sphinx_command)
+        conf = conf_template.render(dict(
+            autoapi_dirs=json.dumps(autoapi_dirs),
+            autoapi_ignore=json.dumps(settings.AUTOAPI_IGNORE),
+            project=project,
+            version=version,
+            releases=releases,
+            output_directory=settings.JSON_DIR(),
+            json_bundle=settings.JSON_BUNDLE,
+            parse_cache=cache.parsed,
+            python_path=settings.ROOT_DIR(),
+        ))
+        index = index_template.render(dict(
+            project=project,
+            version=version,
+        ))
+
+        with cache.lock():
+            with spans.span('sync'):
+                written, removed, unchanged = cache.sync_sources(
+                    extract_dir, {'conf.py': conf, 'index.rst': index})
+            print('Sources in {}: {} changed, {} removed, {} unchanged'.format(
+                cache.src, written, removed, unchanged))
+
+            outdir = settings.DOCS_DIR.path(directory_name)
+            print('Running Sphinx')
+            log_file_path = log_path(directory_name)
+            if os.path.exists(log_file_path):
+                os.remove(log_file_path)
+            if os.path.exists(os.path.join(cache.html, STATS_FILE)):
+                os.remove(os.path.join(cache.html, STATS_FILE))
+            with spans.span('sphinx'):
+                run_sphinx(
+                    srcdir=cache.src,
+                    outdir=cache.html,
+                    doctreedir=cache.doctrees,
+                    log_file_path=log_file_path,
+                    profile_path=artifact_path(directory_name, 'sphinx.prof') if profile else None,
+                )
+            sphinx_stats = cache.read_stats()
+            for stage in ('autoapi', 'read', 'write'):
+                if stage in sphinx_stats:
+                    spans.add('sphinx_' + stage, sphinx_stats[stage])
+            stats.update(sphinx_stats)
+            if 'parse_hits' in sphinx_stats:
+                print('Parse cache: {} hits, {} misses, {:.1f}s saved'.format(
+                    sphinx_stats['parse_hits'], sphinx_stats['parse_misses'],
+                    sphinx_stats['parse_saved']))
+            with spans.span('publish'):
+                if settings.DOCS_STORAGE == 'archive':
+                    path = docstore.archive_path(directory_name)
+                    count = docstore.pack(cache.output_files(), path)
+                    print('Published {} files to {}'.format(count, path))
+                else:
+                    written, removed = cache.publish(outdir.root)
+                    print('Published to {}: {} changed, {} removed'.format(
+                        outdir.root, written, removed))
+    return stats
+
+
+@app.task(soft_time_limit=settings.BUILD_SLOT_TIMEOUT + settings.BUILD_TIMEOUT + 60,
+          time_limit=settings.BUILD_SLOT_TIMEOUT + settings.BUILD_TIMEOUT + 120)
+def build(project, version=None, token=None, build_id=None, profile=False, key=None):
+    """
+    Build the docs of a release, see :mod:`pydoc.core.scheduler`.
+
+    With ``profile`` the task and sphinx-build run under cProfile, and the
+    profiles are saved next to the build log.
+    """
+    from .scheduler import finish_build, start_build
+    if not start_build(project, version, token, key):
+        return
+    try:
+        _build_release(project, version, build_id, profile)
+    finally:
+        finish_build(project, version, token, key)
+
+
+def _build_release(project, version=None, build_id=None, profile=False):
+    from .models import Build, Release
+    from .scheduler import in_backoff
+    releases = Release.objects.filter(package_id=project)
+    # The latest release is the one the scheduler keyed the build under
+    release = releases.filter(version=version).first() if version else releases.latest_version()
+    if release is None:
+        print('No release {}-{} to build'.format(project, version or 'latest'))
+        return
+    version = release.version
+    build_obj = Build.objects.filter(pk=build_id, release=release).first() if build_id else None
+    if build_obj is None:
+        # Scheduled without a version, or queued before builds were recorded
+        if in_backoff(release.pk):
+            print('Build of {} failed recently, skipping'.format(release))
+            return
+        build_obj = Build.objects.create(release=release)
+    build_obj.start()
 
+    directory_name = "{name}-{version}".format(name=project, version=version)
+    spans = metrics.Spans('build_')
+    profiler = cProfile.Profile() if profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        _run_build(release, build_obj, spans, profile)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(artifact_path(directory_name, 'task.prof'))
+        with open(artifact_path(directory_name, 'json'), 'w') as report:
+            json.dump(build_obj.report(spans.spans), report, indent=2)
 
-@app.task
-def build(project, version=None):
-    from .utils import get_highest_version  # noqa
-    from .models import Release
-    if not version:
-        version = get_highest_version(project)
 
-    release = Release.objects.get(package__name=project, version=version)
+def _run_build(release, build_obj, spans, profile):
+    from .mirror import mirror_distribution
+    from .models import Build, Release
+    from .signals import release_built
+    project, version = release.package_id, release.version
+
     releases = Release.objects.filter(package__name=project, built=True)
+    dist = release.build_distribution()
+    if dist is None:
+        print("No valid wheel or sdist found. Skipping: {}".format(release))
+        build_obj.finish(Build.NO_WHEEL)
+        return
+
     try:
-        dist = release.distributions.filter(filetype='bdist_wheel').first()
-        project_url = dist.url
-        project_filename = dist.filename
-    except Exception:
-        print("No valid wheel found. Skipping: {}".format(release))
+        # Download before taking a build slot, rebuilds read the mirrored file
+        with spans.span('download') as download:
+            archive_path = mirror_distribution(dist)
+        build_obj.download_seconds = download['seconds']
+        with build_slot():
+            build_obj.set_stats(
+                _build_docs(project, version, archive_path, dist.filename, releases, spans,
+                            profile))
+    except BuildError as e:
+        print('Build failed for {}: {}\n{}'.format(release, e, e.log_tail))
+        build_obj.finish(Build.FAILED, str(e), e.log_tail)
+        raise
+    except Exception as e:
+        build_obj.finish(Build.FAILED, '{}: {}'.format(type(e).__name__, e))
         raise
-
-    _build_docs(project, version, project_url, project_filename, releases)
 
     directory_name = "{name}-{version}".format(name=project, version=version)
-    outdir = settings.DOCS_DIR.path(directory_name)
-    if os.path.exists(os.path.join(outdir.root, 'index.html')):
+    if not docstore.exists(directory_name, 'index.html'):
+        build_obj.finish(Build.FAILED, 'The build did not write an index.html')
+        return
+    with transaction.atomic():
         release.built = True
         release.save()
+        release.package.update_latest()
+        build_obj.finish(Build.SUCCESS)
+    release_built.send(sender=Release, release=release)
+    index_docs.delay(release.pk)
+
+
+@app.task
+def index_docs(release_id):
+    from .indexing import index_release
+    from .models import Release
+    index_release(Release.objects.get(pk=release_id))
+
+
+@app.task
+def update_popular_packages():
+    from .utils import update_popular
+    update_popular()
+
+
+@app.task
+def prune_mirror():
+    from .mirror import prune
+    prune()
+
+
+@app.task
+def expire_stale_builds():
+    from .scheduler import expire_stale_builds
+    expire_stale_builds()
+
+
+@app.task
+def advance_campaigns():
+    from .campaigns import advance_all
+    advance_all()
 
 
 @app.task
@@ -1,15 +1,78 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
 from django import template
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.safestring import mark_safe
 from django.utils.encoding import force_bytes, force_text
 
+from pydoc.core import metrics
+
 register = template.Library()
 
+CACHE_TIMEOUT = 60 * 60 * 24
+LRU_SIZE = getattr(settings, 'RESTRUCTUREDTEXT_LRU_SIZE', 512)
+
+# Hot renders kept in process, in front of the shared cache
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def _docutils_settings():
+    docutils_settings = {
+        'raw_enabled': False,
+        'file_insertion_enabled': False,
+    }
+    docutils_settings.update(getattr(settings, 'RESTRUCTUREDTEXT_FILTER_SETTINGS', {}))
+    return docutils_settings
+
+
+def _cache_key(value, docutils_settings):
+    digest = hashlib.sha1(force_bytes(json.dumps(docutils_settings, sort_keys=True)))
+    digest.update(force_bytes(value))
+    return 'rst:{}'.format(digest.hexdigest())
+
+
+def _publish(value, docutils_settings, part="html_body"):
+    from docutils.core import publish_parts
+    start = time.perf_counter()
+    parts = publish_parts(source=force_bytes(value), writer_name="html4css1",
+                          settings_overrides=docutils_settings)
+    metrics.observe('rst_render_cold', time.perf_counter() - start)
+    return force_text(parts[part])
+
+
+def _render(key, value):
+    """Render through the shared cache, the LRU in front keeps hot keys in process."""
+    start = time.perf_counter()
+    with _lru_lock:
+        out = _lru.get(key)
+        if out is not None:
+            _lru.move_to_end(key)
+    if out is not None:
+        metrics.observe('rst_render_warm', time.perf_counter() - start)
+        return out
+    out = cache.get(key)
+    if out is None:
+        out = _publish(value, _docutils_settings())
+        cache.set(key, out, CACHE_TIMEOUT)
+    else:
+        metrics.observe('rst_render_warm', time.perf_counter() - start)
+    with _lru_lock:
+        _lru[key] = out
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+    return out
+
 
 @register.filter(is_safe=True)
 def restructuredtext(value, short=False):
     try:
-        from docutils.core import publish_parts
+        import docutils  # noqa
     except ImportError:
         if settings.DEBUG:
             raise template.TemplateSyntaxError(
@@ -18,14 +81,7 @@ def restructuredtext(value, short=False):
             )
         return force_text(value)
     else:
-        docutils_settings = {
-            'raw_enabled': False,
-            'file_insertion_enabled': False,
-        }
-        docutils_settings.update(getattr(settings, 'RESTRUCTUREDTEXT_FILTER_SETTINGS', {}))
-        parts = publish_parts(source=force_bytes(value), writer_name="html4css1",
-                              settings_overrides=docutils_settings)
-        out = force_text(parts["html_body"])
+        out = _render(_cache_key(value, _docutils_settings()), force_text(value))
         try:
             if short:
                 out = out.split("\n")[0]
@@ -0,0 +1,42 @@
+import json
+import os
+
+from pydoc.core.buildcache import BuildCache, PAGES_FILE
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as out:
+        out.write(content)
+
+
+def test_sync_sources_keeps_unchanged_files(settings, tmpdir):
+    settings.BUILD_CACHE_DIR = str(tmpdir.join('cache'))
+    source = str(tmpdir.join('source'))
+    _write(os.path.join(source, 'pkg', '__init__.py'), '')
+    _write(os.path.join(source, 'pkg', 'old.py'), 'x = 1')
+    cache = BuildCache('pkg')
+    assert cache.sync_sources(source, {'conf.py': 'a'}) == (3, 0, 0)
+    unchanged = os.path.join(cache.src, 'pkg', '__init__.py')
+    os.utime(unchanged, (1, 1))
+
+    os.remove(os.path.join(source, 'pkg', 'old.py'))
+    _write(os.path.join(source, 'pkg', 'new.py'), 'y = 1')
+    assert cache.sync_sources(source, {'conf.py': 'b'}) == (2, 1, 1)
+    assert os.path.getmtime(unchanged) == 1
+    assert not os.path.exists(os.path.join(cache.src, 'pkg', 'old.py'))
+
+
+def test_publish_skips_stale_pages(settings, tmpdir):
+    settings.BUILD_CACHE_DIR = str(tmpdir.join('cache'))
+    cache = BuildCache('pkg')
+    _write(os.path.join(cache.html, 'index.html'), 'index')
+    _write(os.path.join(cache.html, 'removed.html'), 'removed')
+    _write(os.path.join(cache.html, '_static', 'style.css'), 'css')
+    _write(os.path.join(cache.html, PAGES_FILE), json.dumps(['index']))
+    outdir = str(tmpdir.join('out'))
+    _write(os.path.join(outdir, 'leftover.html'), 'leftover')
+
+    assert cache.publish(outdir) == (2, 1)
+    assert sorted(os.listdir(outdir)) == ['_static', 'index.html']
+    assert cache.publish(outdir) == (0, 0)
@@ -0,0 +1,57 @@
+import fcntl
+import os
+import sys
+
+import pytest
+
+from pydoc.core.builder import (BuildError, BuildTimeout, SlotTimeout, build_slot,
+                                run_command)
+
+
+def _python(code):
+    return [sys.executable, '-c', code]
+
+
+def test_run_command_logs_output(tmpdir):
+    log = str(tmpdir.join('build.log'))
+    run_command(_python('print("hello")'), log, timeout=30, memory_limit=0)
+    assert 'hello' in tmpdir.join('build.log').read()
+
+
+def test_run_command_exit_status(tmpdir):
+    log = str(tmpdir.join('build.log'))
+    with pytest.raises(BuildError) as error:
+        run_command(_python('import sys; print("broken"); sys.exit(3)'), log, timeout=30,
+                    memory_limit=0)
+    assert 'exited with status 3' in str(error.value)
+    assert 'broken' in error.value.log_tail
+
+
+def test_run_command_timeout(tmpdir):
+    log = str(tmpdir.join('build.log'))
+    with pytest.raises(BuildTimeout):
+        run_command(_python('import time; time.sleep(30)'), log, timeout=1, memory_limit=0)
+
+
+def test_run_command_memory_limit(tmpdir):
+    log = str(tmpdir.join('build.log'))
+    with pytest.raises(BuildError) as error:
+        run_command(_python('x = b"x" * (512 * 1024 ** 2)'), log, timeout=30,
+                    memory_limit=256 * 1024 ** 2)
+    assert 'MemoryError' in error.value.log_tail
+
+
+def test_build_slot_timeout(settings, tmpdir):
+    settings.BUILD_LOCK_DIR = str(tmpdir)
+    settings.BUILD_CONCURRENCY = 1
+    with build_slot(timeout=1) as slot:
+        assert slot == 0
+        # flock is per open file, so a second open of the slot sees it taken
+        with open(os.path.join(str(tmpdir), 'slot-0.lock')) as lock_file:
+            with pytest.raises(OSError):
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        with pytest.raises(SlotTimeout):
+            with build_slot(poll=0.1, timeout=0.3):
+                pass
+    with build_slot(timeout=1) as slot:
+        assert slot == 0
@@ -0,0 +1,67 @@
+import datetime
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+
+from pydoc.core import caching
+from pydoc.core.models import Build, Package, PackageIndex, Release
+from pydoc.core.signals import package_updated, release_built
+from pydoc.core.views import HomeView
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    cache.clear()
+
+
+def test_cached_fragment_fills_and_serves_stale():
+    values = iter([1, 2, 3])
+    assert caching.cached_fragment('fragment', lambda: next(values), 60) == 1
+    assert caching.cached_fragment('fragment', lambda: next(values), 60) == 1
+
+    # Stale, but somebody else holds the refresh lock
+    caching.invalidate('fragment')
+    cache.add(caching._lock_key('fragment'), True, caching.LOCK_TIMEOUT)
+    assert caching.cached_fragment('fragment', lambda: next(values), 60) == 1
+
+    cache.delete(caching._lock_key('fragment'))
+    assert caching.cached_fragment('fragment', lambda: next(values), 60) == 2
+    assert caching.cached_fragment('fragment', lambda: next(values), 60) == 2
+
+
+def test_invalidate_keeps_missing_keys_missing():
+    caching.invalidate('missing')
+    assert cache.get('missing') is None
+
+
+def test_receivers_mark_home_fragments_stale():
+    for key in (caching.HOME_BUILT_COUNT, caching.HOME_POPULAR, caching.HOME_RECENT):
+        caching.cached_fragment(key, lambda: 'cached', 60)
+
+    package_updated.send(sender=Package, package=None, stats={'inserted': 0})
+    assert cache.get(caching.HOME_POPULAR)[1] > 0
+    package_updated.send(sender=Package, package=None, stats={'inserted': 1})
+    assert cache.get(caching.HOME_POPULAR)[1] == 0
+    assert cache.get(caching.HOME_RECENT)[1] > 0
+
+    release_built.send(sender=Release, release=None)
+    assert cache.get(caching.HOME_BUILT_COUNT)[1] == 0
+    assert cache.get(caching.HOME_RECENT)[1] == 0
+
+
+@pytest.mark.django_db
+def test_home_recent_orders_by_build():
+    index = PackageIndex.objects.first()
+    now = timezone.now()
+    for name, minutes_ago in [('old', 30), ('new', 10), ('rebuilt', 20)]:
+        package = Package.objects.create(index=index, name=name)
+        release = Release.objects.create(package=package, version='1.0', built=True)
+        Build.objects.create(release=release, state=Build.SUCCESS,
+                             finished_at=now - datetime.timedelta(minutes=minutes_ago))
+    rebuilt = Release.objects.get(package_id='rebuilt')
+    Build.objects.create(release=rebuilt, state=Build.SUCCESS, finished_at=now)
+    Build.objects.create(release=Release.objects.get(package_id='old'), state=Build.FAILED,
+                         finished_at=now)
+
+    assert HomeView().recent() == ['rebuilt-1.0', 'new-1.0', 'old-1.0']
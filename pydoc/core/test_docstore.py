@@ -0,0 +1,84 @@
+import os
+
+import environ
+import pytest
+from django.core.management import call_command
+from django.http import Http404
+from django.utils.http import http_date
+
+from pydoc.core import docstore
+from pydoc.core.views import DocsView
+
+
+def _write_docs(tmpdir):
+    source = tmpdir.join('docs', 'example-1.0')
+    source.join('index.html').write('<p>index</p>', ensure=True)
+    source.join('_static', 'style.css').write('p {}', ensure=True)
+    return source
+
+
+def test_archive_serves_members(settings, tmpdir):
+    settings.DOCS_DIR = environ.Path(str(tmpdir.join('docs')))
+    settings.DOCS_STORAGE = 'archive'
+    source = tmpdir.join('html')
+    source.join('index.html').write('<p>index</p>', ensure=True)
+    source.join('_static', 'style.css').write('p {}', ensure=True)
+    files = [('index.html', str(source.join('index.html'))),
+             (os.path.join('_static', 'style.css'), str(source.join('_static', 'style.css')))]
+
+    assert docstore.pack(files, docstore.archive_path('example-1.0')) == 2
+    assert bytes(docstore.read_member('example-1.0', 'index.html')) == b'<p>index</p>'
+    assert bytes(docstore.read_member('example-1.0', '_static/style.css')) == b'p {}'
+    assert docstore.read_member('example-1.0', 'missing.html') is None
+
+    # A rebuild replaces the archive, the next read maps the new one
+    source.join('index.html').write('<p>rebuilt</p>')
+    docstore.pack(files, docstore.archive_path('example-1.0'))
+    assert bytes(docstore.read_member('example-1.0', 'index.html')) == b'<p>rebuilt</p>'
+
+    settings.DOCS_STORAGE = 'files'
+    docstore.unpack(docstore.archive_path('example-1.0'), str(tmpdir.join('docs', 'example-1.0')))
+    assert docstore.read_member('example-1.0', 'index.html') == b'<p>rebuilt</p>'
+    assert docstore.read_member('example-1.0', '../example-1.0.zip') is None
+
+
+def test_convert_docs(settings, tmpdir):
+    settings.DOCS_DIR = environ.Path(str(tmpdir.join('docs')))
+    source = _write_docs(tmpdir)
+
+    call_command('convert_docs', to='archive', delete=True)
+    assert not source.check()
+    settings.DOCS_STORAGE = 'archive'
+    assert bytes(docstore.read_member('example-1.0', '_static/style.css')) == b'p {}'
+
+    call_command('convert_docs', 'example-1.0', to='files', delete=True)
+    assert not os.path.exists(docstore.archive_path('example-1.0'))
+    settings.DOCS_STORAGE = 'files'
+    assert docstore.read_member('example-1.0', 'index.html') == b'<p>index</p>'
+
+
+def test_docs_view(settings, tmpdir, rf):
+    settings.DOCS_DIR = environ.Path(str(tmpdir.join('docs')))
+    _write_docs(tmpdir)
+    call_command('convert_docs')
+    settings.DOCS_STORAGE = 'archive'
+    view = DocsView.as_view()
+
+    response = view(rf.get('/pypi/example-1.0/'), release='example-1.0', path='')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/html')
+    assert b''.join(bytes(chunk) for chunk in response.streaming_content) == b'<p>index</p>'
+
+    mtime = os.path.getmtime(docstore.archive_path('example-1.0'))
+    assert response['Last-Modified'] == http_date(mtime)
+    response = view(rf.get('/pypi/example-1.0/', HTTP_IF_MODIFIED_SINCE=http_date(mtime)),
+                    release='example-1.0', path='')
+    assert response.status_code == 304
+
+    response = view(rf.get('/pypi/example-1.0/_static/style.css'),
+                    release='example-1.0', path='_static/style.css')
+    assert response['Content-Type'].startswith('text/css')
+    with pytest.raises(Http404):
+        view(rf.get('/pypi/example-1.0/missing.html'), release='example-1.0', path='missing.html')
+    with pytest.raises(Http404):
+        view(rf.get('/pypi/../'), release='..', path='')
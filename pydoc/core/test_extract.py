@@ -0,0 +1,95 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from pydoc.core.extract import MODULES_DIR, ExtractError, extract, extract_wheel
+
+RECORD = """example/__init__.py,sha256=x,1
+example/_speedups.cpython-36m-x86_64-linux-gnu.so,sha256=x,4
+example/_vendor/lib.py,sha256=x,1
+namespace/sub/mod.py,sha256=x,1
+single.py,sha256=x,1
+example-1.0.data/scripts/tool.py,sha256=x,1
+example-1.0.dist-info/RECORD,,
+"""
+
+
+def test_extract_wheel(tmpdir):
+    wheel_path = str(tmpdir.join('example-1.0-py3-none-any.whl'))
+    with zipfile.ZipFile(wheel_path, 'w') as wheel:
+        wheel.writestr('example/__init__.py', 'x = 1\n')
+        wheel.writestr('example/_speedups.cpython-36m-x86_64-linux-gnu.so', b'\0' * 4)
+        wheel.writestr('example/_vendor/lib.py', 'y = 1\n')
+        wheel.writestr('namespace/sub/mod.py', 'z = 1\n')
+        wheel.writestr('single.py', 'w = 1\n')
+        wheel.writestr('example-1.0.data/scripts/tool.py', 'v = 1\n')
+        wheel.writestr('example-1.0.dist-info/top_level.txt', 'example\nnamespace\nsingle\n')
+        wheel.writestr('example-1.0.dist-info/RECORD', RECORD)
+
+    target = str(tmpdir.join('src'))
+    extracted = extract_wheel(wheel_path, target, ['vendor*', '_vendor*'])
+    assert extracted.autoapi_dirs == [MODULES_DIR, 'example', 'namespace']
+    assert extracted.files == 3
+    assert extracted.skipped == 1
+    written = sorted(
+        os.path.relpath(os.path.join(root, name), target)
+        for root, _, names in os.walk(target) for name in names
+    )
+    assert written == [
+        os.path.join(MODULES_DIR, 'single.py'),
+        os.path.join('example', '__init__.py'),
+        os.path.join('namespace', 'sub', 'mod.py'),
+    ]
+
+
+def _write_sdist(path, files):
+    with tarfile.open(path, 'w:gz') as sdist:
+        for name, data in files.items():
+            info = tarfile.TarInfo('example-1.0/' + name)
+            info.size = len(data)
+            sdist.addfile(info, io.BytesIO(data))
+
+
+def test_extract_sdist(tmpdir):
+    sdist_path = str(tmpdir.join('example-1.0.tar.gz'))
+    _write_sdist(sdist_path, {
+        'setup.py': b'setup()\n',
+        'README.rst': b'Example\n',
+        'src/example/__init__.py': b'x = 1\n',
+        'src/example/_speedups.so': b'\0' * 4,
+        'src/example/sub/mod.py': b'y = 1\n',
+        'src/single.py': b'z = 1\n',
+        'tests/test_example.py': b'assert True\n',
+        'scripts/tool.py': b'w = 1\n',
+    })
+
+    target = str(tmpdir.join('src'))
+    extracted = extract(sdist_path, 'example-1.0.tar.gz', target)
+    assert extracted.autoapi_dirs == [MODULES_DIR, 'example']
+    written = sorted(
+        os.path.relpath(os.path.join(root, name), target)
+        for root, _, names in os.walk(target) for name in names
+    )
+    assert written == [
+        os.path.join(MODULES_DIR, 'single.py'),
+        os.path.join('example', '__init__.py'),
+        os.path.join('example', 'sub', 'mod.py'),
+    ]
+
+
+def test_extract_sdist_limits(tmpdir):
+    sdist_path = str(tmpdir.join('example-1.0.tar.gz'))
+    _write_sdist(sdist_path, {
+        'example/__init__.py': b'x = 1\n' * 100,
+        'example/data.bin': b'\0' * 1000,
+    })
+
+    with pytest.raises(ExtractError):
+        extract(sdist_path, 'example-1.0.tar.gz', str(tmpdir.join('a')), max_bytes=100)
+    with pytest.raises(ExtractError):
+        extract(sdist_path, 'example-1.0.tar.gz', str(tmpdir.join('b')), max_members=1)
+    with pytest.raises(ExtractError):
+        extract(sdist_path, 'example-1.0.tar.gz', str(tmpdir.join('c')), max_scanned=1000)
@@ -0,0 +1,90 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+
+from pydoc.core import freeze
+from pydoc.core.models import Distribution, Package, PackageIndex, Release
+
+REQUIREMENTS = """# pip freeze
+Django==1.10.2
+requests[security]==2.11.1 ; python_version >= "3"
+requests[security]==2.11.1
+-e git+https://github.com/example/example.git@abc#egg=example
+legacy===1.0-weird
+Zope_Interface==4.3
+six>=1.0
+baz==2.0 \\
+    --hash=sha256:abcd
+pkg @ https://example.com/pkg-1.0.whl
+--index-url https://pypi.org/simple
+""".splitlines(True)
+
+
+def test_parse_requirements():
+    entries = [(entry.name, entry.version, entry.error)
+               for entry in freeze.parse_requirements(REQUIREMENTS)]
+    assert entries == [
+        ('django', '1.10.2', None),
+        ('requests', '2.11.1', None),
+        ('requests', '2.11.1', None),
+        ('example', None, 'editable requirement'),
+        ('legacy', '1.0-weird', None),
+        ('zope-interface', '4.3', None),
+        ('six', None, None),
+        ('baz', '2.0', None),
+        ('pkg', None, 'URL requirement'),
+    ]
+
+
+@pytest.mark.django_db
+def test_process_requirements():
+    cache.clear()
+    index = PackageIndex.objects.first()
+    for name, version, built, filename in [
+            ('django', '1.10.2', True, 'Django-1.10.2-py2.py3-none-any.whl'),
+            ('zope.interface', '4.3', True, 'zope.interface-4.3.tar.gz'),
+            ('requests', '2.11.1', False, 'requests-2.11.1-py2.py3-none-any.whl'),
+            ('six', '1.10.0', False, 'six-1.10.0.tar.gz'),
+            ('baz', '2.0', False, 'baz-2.0.exe')]:
+        package = Package.objects.create(index=index, name=name)
+        release = Release.objects.create(package=package, version=version, built=built)
+        filetype = 'sdist' if filename.endswith('.tar.gz') else (
+            'bdist_wheel' if filename.endswith('.whl') else 'bdist_wininst')
+        Distribution.objects.create(release=release, filename=filename, filetype=filetype,
+                                    pyversion='source', url='https://example.com/' + filename)
+        package.update_latest()
+
+    with mock.patch('pydoc.core.freeze.update_packages') as update_packages, \
+            mock.patch('pydoc.core.tasks.build.apply_async') as apply_async:
+        rows = freeze.process_requirements(REQUIREMENTS)
+    assert list(update_packages.call_args[0][0]) == [
+        'django', 'requests', 'legacy', 'zope.interface', 'six', 'baz']
+    assert apply_async.call_count == 2
+    assert [(name, status) for name, _, status in rows] == [
+        ('django', freeze.BUILT),
+        ('requests', freeze.QUEUED),
+        ('example', 'error: editable requirement'),
+        ('legacy', 'error: not on PyPI'),
+        ('zope.interface', freeze.BUILT),
+        ('six', freeze.QUEUED),
+        ('baz', freeze.NO_WHEEL),
+        ('pkg', 'error: URL requirement'),
+    ]
+    assert freeze.summarize(rows) == {
+        freeze.QUEUED: 2, freeze.NOT_QUEUED: 0, freeze.BUILT: 2, freeze.NO_WHEEL: 1,
+        freeze.ERROR: 3,
+    }
+
+
+def test_process_freeze_batches_files(tmpdir):
+    tmpdir.join('one.txt').write('six==1.10.0\n-r common.txt\n')
+    tmpdir.join('two.txt').write('Django==1.10.2\n')
+    tmpdir.join('common.txt').write('requests==2.11.1\n')
+    with mock.patch('pydoc.core.management.commands.process_freeze.process_requirements',
+                    return_value=[]) as process_requirements:
+        call_command('process_freeze', str(tmpdir.join('one.txt')), str(tmpdir.join('two.txt')))
+    assert process_requirements.call_count == 1
+    entries = freeze.parse_requirements(process_requirements.call_args[0][0])
+    assert [entry.name for entry in entries] == ['six', 'requests', 'django']
@@ -0,0 +1,74 @@
+import json
+
+import environ
+import pytest
+from django.test import Client
+
+from pydoc.core.indexing import extract_symbols, index_release, page_text
+from pydoc.core.models import Package, PackageIndex, Release
+
+BODY = """
+<span class="target" id="module-example.sessions"></span>
+<h1>example.sessions</h1>
+<dl class="class">
+<dt id="example.sessions.Session">
+<em class="property">class </em><code class="descname">Session</code></dt>
+<dd><p>A &lt;session&gt;.</p>
+<dl class="method">
+<dt id="example.sessions.Session.close">
+<code class="descname">close</code></dt>
+</dl>
+</dd></dl>
+"""
+
+
+def test_extract_symbols():
+    symbols = list(extract_symbols('autoapi/example/sessions/index', BODY))
+    assert symbols == [
+        ('example.sessions', 'module',
+         'autoapi/example/sessions/index.html#module-example.sessions'),
+        ('example.sessions.Session', 'class',
+         'autoapi/example/sessions/index.html#example.sessions.Session'),
+        ('example.sessions.Session.close', 'method',
+         'autoapi/example/sessions/index.html#example.sessions.Session.close'),
+    ]
+
+
+SPHINX2_BODY = """
+<dl class="py class">
+<dt class="sig sig-object py" id="example.sessions.Session">
+<em class="property">class </em><span class="sig-name descname">Session</span></dt>
+</dl>
+"""
+
+
+def test_extract_symbols_sphinx2():
+    assert list(extract_symbols('index', SPHINX2_BODY)) == [
+        ('example.sessions.Session', 'class', 'index.html#example.sessions.Session'),
+    ]
+
+
+def test_page_text():
+    assert page_text('<p>A &lt;session&gt;.</p>\n<p>Done</p>') == 'A <session>. Done'
+
+
+@pytest.mark.django_db
+def test_index_release(settings, tmpdir):
+    settings.JSON_DIR = environ.Path(str(tmpdir))
+    package = Package.objects.create(index=PackageIndex.objects.first(), name='example')
+    release = Release.objects.create(package=package, version='1.0', built=True)
+    package.update_latest()
+    page = tmpdir.join('example-1.0', 'autoapi', 'example', 'sessions', 'index.json')
+    page.write(json.dumps({'title': 'example.sessions', 'body': BODY}), ensure=True)
+
+    assert index_release(release) == (1, 3)
+    assert index_release(release) == (1, 3)
+    assert set(release.symbols.values_list('kind', flat=True)) == {'module', 'class', 'method'}
+
+    response = Client().get('/pages/', {'q': 'session'})
+    assert response.json()['results'] == [{
+        'title': 'example.sessions',
+        'package': 'example',
+        'version': '1.0',
+        'url': '/pypi/example-1.0/autoapi/example/sessions/index.html',
+    }]
@@ -0,0 +1,81 @@
+import hashlib
+import os
+from http.server import BaseHTTPRequestHandler
+
+import environ
+import pytest
+
+from pydoc.core.mirror import MirrorError, blob_path, download, mirror_distribution, prune
+from pydoc.core.models import Distribution, Package, PackageIndex, Release
+
+BODY = b'not really a wheel'
+
+
+class StubFileHandler(BaseHTTPRequestHandler):
+
+    requests = 0
+
+    def do_GET(self):
+        StubFileHandler.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def file_url(http_server):
+    return http_server(StubFileHandler) + '/example-1.0-py3-none-any.whl'
+
+
+@pytest.fixture
+def mirror_dir(settings, tmpdir):
+    settings.MEDIA_ROOT = str(tmpdir)
+    settings.MIRROR_DIR = environ.Path(str(tmpdir.join('mirror')))
+    return settings.MIRROR_DIR()
+
+
+def test_download_verifies_digests(file_url, mirror_dir):
+    sha256 = hashlib.sha256(BODY).hexdigest()
+    assert download(file_url, hashlib.md5(BODY).hexdigest(), sha256) == sha256
+    with open(blob_path(sha256), 'rb') as blob:
+        assert blob.read() == BODY
+
+    with pytest.raises(MirrorError):
+        download(file_url, md5_digest='0' * 32)
+    assert os.listdir(os.path.join(mirror_dir, 'tmp')) == []
+
+
+@pytest.mark.django_db
+def test_prune_evicts_least_recently_used(file_url, mirror_dir):
+    sha256 = download(file_url)
+    os.utime(blob_path(sha256), (1, 1))
+    assert prune(max_size=len(BODY)) == 0
+    assert prune(max_size=0) == 1
+    assert not os.path.exists(blob_path(sha256))
+
+
+@pytest.mark.django_db
+def test_mirror_distribution_follows_the_digest(file_url, mirror_dir):
+    package = Package.objects.create(index=PackageIndex.objects.first(), name='example')
+    release = Release.objects.create(package=package, version='1.0')
+    dist = Distribution.objects.create(
+        release=release, filename='example-1.0-py3-none-any.whl', filetype='bdist_wheel',
+        pyversion='py3', url=file_url, sha256_digest=hashlib.sha256(BODY).hexdigest())
+
+    requests = StubFileHandler.requests
+    assert mirror_distribution(dist) == blob_path(dist.sha256_digest)
+    dist.refresh_from_db()
+    assert mirror_distribution(dist) == blob_path(dist.sha256_digest)
+    assert StubFileHandler.requests == requests + 1
+
+    # The file was replaced on PyPI, ingestion updated the row in place
+    Distribution.objects.filter(pk=dist.pk).update(
+        sha256_digest=hashlib.sha256(b'a new wheel').hexdigest())
+    dist.refresh_from_db()
+    with pytest.raises(MirrorError):
+        mirror_distribution(dist)
+    assert StubFileHandler.requests == requests + 2
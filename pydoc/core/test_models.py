@@ -0,0 +1,46 @@
+import pytest
+from django.core.cache import cache
+
+from pydoc.core import metrics
+from pydoc.core.models import Build, Package, PackageIndex, Release
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def release():
+    package = Package.objects.create(index=PackageIndex.objects.first(), name='example')
+    return Release.objects.create(package=package, version='1.0')
+
+
+def test_build_without_parse_stats(release):
+    cache.clear()
+    build = Build.objects.create(release=release)
+    build.finish(Build.NO_WHEEL)
+    report = build.report()
+    assert report['state'] == Build.NO_WHEEL
+    assert report['counters']['parse_cache_hits'] is None
+
+    success = Build.objects.create(release=release)
+    success.set_stats({'read': 1.0, 'pages': 3, 'parse_hits': 2, 'parse_misses': 1})
+    success.finish(Build.SUCCESS)
+    success.refresh_from_db()
+    assert (success.parse_cache_hits, success.parse_cache_misses) == (2, 1)
+
+    samples = {(name, tuple(labels.items())): value
+               for name, _, labels, value in metrics.build_samples()}
+    assert samples[('build_parse_cache_hits_total', ())] == 2
+    assert samples[('build_parse_seconds_saved_total', ())] == 0
+
+
+def test_latest_release_prefers_final_releases(release):
+    for version in ('1.10', '2.0rc1', '1.9', '1.10.post1.dev0'):
+        Release.objects.create(package=release.package, version=version)
+    releases = Release.objects.filter(package=release.package)
+    assert releases.latest().version == '1.10'
+    assert releases.latest_version().version == '1.10'
+    assert releases.earliest().version == '1.10.post1.dev0'
+    assert [r.version for r in releases.by_version()] == [
+        '1.10', '1.9', '1.0', '2.0rc1', '1.10.post1.dev0']
+    with pytest.raises(Release.DoesNotExist):
+        releases.filter(version='3.0').latest()
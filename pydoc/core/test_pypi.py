@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from unittest import mock
+
+import pytest
+
+from pydoc.core.pypi import PyPIClient
+
+
+class StubPyPIHandler(BaseHTTPRequestHandler):
+
+    failures = {}
+
+    def do_GET(self):
+        name = self.path.strip('/').split('/')[-2]
+        if self.failures.get(name, 0) > 0:
+            self.failures[name] -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        if name == 'missing':
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = '"{}"'.format(name)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({'info': {'name': name.upper()}, 'releases': {}}).encode()
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_pypi(http_server):
+    return http_server(StubPyPIHandler) + '/pypi'
+
+
+def test_fetch_retries(stub_pypi):
+    StubPyPIHandler.failures = {'flaky': 2}
+    client = PyPIClient(base_url=stub_pypi, rate=0, backoff=0.01)
+    response = client.fetch('flaky')
+    assert response.status == 200
+    assert json.loads(response.content.decode())['info']['name'] == 'FLAKY'
+    assert client.fetch('missing').status == 404
+
+
+def test_fetch_not_modified(stub_pypi):
+    StubPyPIHandler.failures = {}
+    client = PyPIClient(base_url=stub_pypi, rate=0)
+    etag = client.fetch('cached').etag
+    assert client.fetch('cached', etag=etag).status == 304
+
+
+def test_fetch_many(stub_pypi):
+    StubPyPIHandler.failures = {}
+    client = PyPIClient(base_url=stub_pypi, concurrency=4, rate=0)
+    names = ['package{}'.format(i) for i in range(50)]
+    results = {response.name: response for response in client.fetch_many(names)}
+    assert sorted(results) == sorted(names)
+    assert all(response.status == 200 for response in results.values())
+
+
+def test_fetch_many_stops_with_consumer(stub_pypi):
+    StubPyPIHandler.failures = {}
+    client = PyPIClient(base_url=stub_pypi, concurrency=4, rate=0)
+    before = threading.active_count()
+    responses = client.fetch_many(['package{}'.format(i) for i in range(100)], queue_size=1)
+    next(responses)
+    responses.close()
+    deadline = time.time() + 5
+    while threading.active_count() > before and time.time() < deadline:
+        time.sleep(0.05)
+    assert threading.active_count() == before
+
+
+def test_retry_after_is_capped():
+    client = PyPIClient(base_url='http://pypi.invalid', rate=0, max_retry_after=30)
+    response = mock.Mock(headers={'Retry-After': '3600'})
+    assert client._delay(0, response) == 30
+    response.headers['Retry-After'] = '5'
+    assert client._delay(0, response) == 5
@@ -0,0 +1,187 @@
+import datetime
+from unittest import mock
+
+import pytest
+from django.contrib import admin
+from django.core.cache import cache
+from django.utils import timezone
+
+from pydoc.core import campaigns, scheduler
+from pydoc.core.admin import RebuildCampaignAdmin
+from pydoc.core.models import (Build, Distribution, Package, PackageIndex, RebuildCampaign,
+                               Release)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def apply_async():
+    cache.clear()
+    index = PackageIndex.objects.first()
+    for name in ('example', 'one', 'two'):
+        package = Package.objects.create(index=index, name=name)
+        release = Release.objects.create(package=package, version='1.0')
+        filename = '{}-1.0-py3-none-any.whl'.format(name)
+        Distribution.objects.create(release=release, filename=filename, filetype='bdist_wheel',
+                                    pyversion='py3', url='https://example.com/' + filename)
+    with mock.patch('pydoc.core.tasks.build.apply_async') as apply_async:
+        yield apply_async
+
+
+def test_schedule_dedups_and_promotes(apply_async):
+    assert scheduler.schedule_build('example', '1.0') is not None
+    assert scheduler.schedule_build('example', '1.0') is None
+    assert scheduler.queue_length(scheduler.BACKFILL) == 1
+    assert Build.objects.get().state == Build.QUEUED
+
+    scheduler.schedule_build('example', '1.0', scheduler.INTERACTIVE)
+    assert scheduler.queue_length(scheduler.BACKFILL) == 0
+    assert scheduler.queue_length(scheduler.INTERACTIVE) == 1
+
+    old_token = apply_async.call_args_list[0][1]['kwargs']['token']
+    new_token = apply_async.call_args_list[1][1]['kwargs']['token']
+    assert not scheduler.start_build('example', '1.0', old_token)
+    assert scheduler.start_build('example', '1.0', new_token)
+    assert scheduler.schedule_build('example', '1.0', scheduler.INTERACTIVE) is None
+    scheduler.finish_build('example', '1.0', new_token)
+    assert scheduler.schedule_build('example', '1.0') is not None
+
+
+def test_changelog_builds_coalesce(apply_async, settings):
+    settings.BUILD_COALESCE_DELAY = 30
+    scheduler.schedule_build('example', '1.0', scheduler.CHANGELOG)
+    scheduler.schedule_build('example', '1.1', scheduler.CHANGELOG)
+    assert apply_async.call_count == 1
+    assert apply_async.call_args[1]['kwargs']['version'] is None
+    assert apply_async.call_args[1]['countdown'] == 30
+
+
+def test_profile_replaces_queued_build(apply_async):
+    scheduler.schedule_build('example', '1.0', scheduler.INTERACTIVE)
+    assert scheduler.schedule_build('example', '1.0', profile=True) is not None
+    kwargs = apply_async.call_args[1]['kwargs']
+    assert kwargs['profile'] and apply_async.call_args[1]['queue'] == scheduler.INTERACTIVE
+    assert scheduler.queue_length(scheduler.INTERACTIVE) == 1
+    assert scheduler.queue_length(scheduler.BACKFILL) == 0
+    assert scheduler.schedule_build('example', '1.0', profile=True) is None
+
+    assert scheduler.start_build('example', '1.0', kwargs['token'])
+    assert scheduler.schedule_build('example', '1.0', scheduler.INTERACTIVE, profile=True) is None
+
+
+def test_latest_shares_the_version_key(apply_async, settings):
+    settings.BUILD_COALESCE_DELAY = 30
+    package = Package.objects.get(name='example')
+    package.update_latest()
+    assert scheduler.schedule_build('example', '1.0', scheduler.INTERACTIVE) is not None
+    assert scheduler.schedule_build('example', priority=scheduler.CHANGELOG) is None
+    assert apply_async.call_count == 1
+
+
+def test_changelog_build_left_to_newer_release(apply_async, settings):
+    settings.BUILD_COALESCE_DELAY = 30
+    package = Package.objects.get(name='example')
+    package.update_latest()
+    scheduler.schedule_build('example', priority=scheduler.CHANGELOG)
+    Release.objects.create(package=package, version='1.1')
+    package.update_latest()
+    scheduler.schedule_build('example', priority=scheduler.CHANGELOG)
+    assert apply_async.call_count == 2
+    assert scheduler.queue_length(scheduler.CHANGELOG) == 2
+
+    old, new = [call[1]['kwargs'] for call in apply_async.call_args_list]
+    assert old['key'] == 'build:example:1.0' and new['key'] == 'build:example:1.1'
+    assert not scheduler.start_build('example', None, old['token'], old['key'])
+    assert scheduler.queue_length(scheduler.CHANGELOG) == 1
+    assert scheduler.start_build('example', None, new['token'], new['key'])
+
+
+def test_full_queue_refuses(settings):
+    settings.BUILD_QUEUE_LIMITS = dict(settings.BUILD_QUEUE_LIMITS, **{scheduler.BACKFILL: 1})
+    assert scheduler.schedule_build('one', '1.0') is not None
+    assert scheduler.schedule_build('two', '1.0') is None
+
+
+def test_nothing_to_build_refuses():
+    Distribution.objects.filter(release__package_id='one').update(
+        filetype='bdist_wininst', filename='one-1.0.exe')
+    assert scheduler.schedule_build('one', '1.0') is None
+    assert not Build.objects.exists()
+
+
+def test_failed_builds_back_off(settings):
+    settings.BUILD_RETRY_BASE = 60
+    release = Release.objects.get(package_id='example')
+    build = Build.objects.create(release=release)
+    build.finish(Build.FAILED, 'broken')
+    assert build.attempt == 1
+    assert scheduler.schedule_build('example', '1.0') is None
+
+    Build.objects.filter(pk=build.pk).update(
+        retry_after=timezone.now() - datetime.timedelta(seconds=1))
+    assert scheduler.schedule_build('example', '1.0') is not None
+    retry = Build.objects.filter(state=Build.QUEUED).get()
+    retry.finish(Build.FAILED, 'still broken')
+    assert retry.attempt == 2
+    assert (retry.retry_after - retry.finished_at).total_seconds() == 120
+
+
+def test_campaign_batches(apply_async, settings):
+    settings.BUILD_QUEUE_LIMITS = dict(settings.BUILD_QUEUE_LIMITS, **{scheduler.BACKFILL: 10})
+    Release.objects.update(built=True)
+    campaign = campaigns.create('rebuild', rate=2)
+    assert campaign.total == 3
+
+    assert campaigns.advance(campaign.pk) == 2
+    campaigns.pause(campaign)
+    assert campaigns.advance(campaign.pk) == 0
+    campaigns.resume(campaign)
+    assert campaigns.advance(campaign.pk) == 1
+
+    campaign.refresh_from_db()
+    assert campaign.state == RebuildCampaign.SCHEDULED
+    assert campaign.builds.count() == 3
+    Build.objects.filter(release__package_id='one').update(state=Build.SUCCESS)
+    progress = campaign.progress()
+    assert progress['done'] == 1
+    assert progress['pending'] == 2
+    assert progress['remaining'] == 2
+
+
+def test_campaign_toolchain_uses_latest_success(rf):
+    now = timezone.now()
+    for name, toolchains in [('one', ['old']), ('two', ['old', 'new']), ('example', ['new'])]:
+        release = Release.objects.get(package_id=name)
+        for minutes, toolchain in enumerate(toolchains):
+            Build.objects.create(release=release, state=Build.SUCCESS, toolchain=toolchain,
+                                 finished_at=now + datetime.timedelta(minutes=minutes))
+    Release.objects.update(built=True)
+    campaign = campaigns.create('old toolchain', toolchain='old')
+    assert [package for _, package, _ in campaign.next_batch(10)] == ['one']
+
+    Build.objects.filter(release__package_id='one').update(campaign=campaign)
+    Build.objects.filter(release__package_id='two', toolchain='old').update(
+        campaign=campaign, state=Build.FAILED)
+    changelist = RebuildCampaignAdmin(RebuildCampaign, admin.site).get_queryset(rf.get('/'))
+    annotated = changelist.get(pk=campaign.pk)
+    assert (annotated.done_count, annotated.failed_count) == (1, 1)
+
+
+def test_expire_stale_builds(settings):
+    settings.BUILD_TIMEOUT = 60
+    settings.BUILD_QUEUED_EXPIRY = 3600
+    long_ago = timezone.now() - datetime.timedelta(days=1)
+    one, two, example = [Release.objects.get(package_id=name)
+                         for name in ('one', 'two', 'example')]
+    running = Build.objects.create(release=one, state=Build.RUNNING, started_at=long_ago)
+    queued = Build.objects.create(release=two)
+    Build.objects.filter(pk=queued.pk).update(queued_at=long_ago)
+    fresh = Build.objects.create(release=example, state=Build.RUNNING, started_at=timezone.now())
+
+    assert scheduler.expire_stale_builds() == 2
+    running.refresh_from_db()
+    queued.refresh_from_db()
+    fresh.refresh_from_db()
+    assert running.state == Build.FAILED and running.retry_after is not None
+    assert queued.state == Build.FAILED and queued.retry_after is None
+    assert fresh.state == Build.RUNNING
@@ -0,0 +1,38 @@
+import pytest
+
+from pydoc.core.models import Package, PackageIndex, Release
+from pydoc.core.search import search_packages, update_search_vector
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def packages():
+    index = PackageIndex.objects.first()
+    for name, summary, built in [
+            ('requests', 'Python HTTP for Humans.', True),
+            ('requests-oauthlib', 'OAuthlib authentication support for Requests.', True),
+            ('grequests', 'Requests + Gevent', True),
+            ('requestsunbuilt', 'Never built', False),
+            ('flask', 'A microframework', True)]:
+        package = Package.objects.create(index=index, name=name)
+        info = {'summary': summary, 'keywords': ''}
+        Release.objects.create(package=package, version='1.0', built=built, package_info=info)
+        package.update_latest()
+        update_search_vector(package, info)
+
+
+def test_exact_and_prefix_matches_first():
+    names = list(search_packages('Requests').values_list('name', flat=True))
+    assert names[:2] == ['requests', 'requests-oauthlib']
+    assert 'grequests' in names
+    assert 'requestsunbuilt' not in names
+    assert 'flask' not in names
+
+
+def test_summary_matches():
+    assert list(search_packages('humans').values_list('name', flat=True)) == ['requests']
+
+
+def test_blank_query_matches_nothing():
+    assert not search_packages('   ').exists()
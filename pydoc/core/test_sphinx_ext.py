@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import pytest
+
+from pydoc import sphinx as ext
+from pydoc.sphinx import parsecache
+
+
+def _app(tmpdir, bundle):
+    config = SimpleNamespace(
+        project='example', version='', pydoc_json_bundle=bundle,
+        html_context={'output_directory': str(tmpdir.join('json')), 'pydoc_version': '1.0'},
+    )
+    outdir = tmpdir.join('html')
+    outdir.ensure(dir=True)
+    return SimpleNamespace(config=config, outdir=str(outdir),
+                           env=SimpleNamespace(found_docs={'index', 'api/mod'}))
+
+
+@pytest.mark.parametrize('bundle', [False, True])
+def test_dump_and_iter_pages(tmpdir, bundle):
+    app = _app(tmpdir, bundle)
+    ext.reset_bundle(app)
+    context = {'body': u'<p>caf\xe9</p>', 'title': 'Index', 'script_files': ['x.js']}
+    ext.update_body(app, 'index', 'page.html', context, None)
+    ext.update_body(app, 'api/mod', 'page.html', {'body': 'mod'}, None)
+    ext.write_bundle(app, None)
+
+    pages = dict(ext.iter_pages(ext.json_dir(app)))
+    assert pages == {
+        'index': {'body': u'<p>caf\xe9</p>', 'title': 'Index'},
+        'api/mod': {'body': 'mod'},
+    }
+
+    if bundle:
+        # An incremental build keeps the pages it didn't write again
+        ext.update_body(app, 'index', 'page.html', {'body': 'changed'}, None)
+        ext.write_bundle(app, None)
+        pages = dict(ext.iter_pages(ext.json_dir(app)))
+        assert pages == {'index': {'body': 'changed'}, 'api/mod': {'body': 'mod'}}
+
+
+def test_parse_cache(tmpdir):
+    parses = []
+
+    class Mapper(object):
+        def __init__(self, app):
+            self.app = app
+
+        def read_file(self, path, **kwargs):
+            parses.append(path)
+            with open(path) as source:
+                return {'name': 'mod', 'source': source.read()}
+
+    Mapper.read_file = parsecache.cached_read_file(Mapper.read_file, ext._stats)
+    config = SimpleNamespace(pydoc_parse_cache=str(tmpdir.join('parsed')))
+    source = tmpdir.join('mod.py')
+    source.write('x = 1\n')
+
+    first = SimpleNamespace(config=config)
+    assert Mapper(first).read_file(str(source)) == {'name': 'mod', 'source': 'x = 1\n'}
+    assert first.pydoc_stats['parse_misses'] == 1
+
+    # Another release with the same module
+    second = SimpleNamespace(config=config)
+    assert Mapper(second).read_file(str(source)) == {'name': 'mod', 'source': 'x = 1\n'}
+    assert second.pydoc_stats['parse_hits'] == 1
+    assert len(parses) == 1
+
+    source.write('x = 2\n')
+    third = SimpleNamespace(config=config)
+    assert Mapper(third).read_file(str(source))['source'] == 'x = 2\n'
+    assert third.pydoc_stats['parse_misses'] == 1
@@ -0,0 +1,60 @@
+import json
+import os
+import zipfile
+from unittest import mock
+
+import environ
+import pytest
+
+from pydoc.core import metrics
+from pydoc.core.buildcache import STATS_FILE
+from pydoc.core.models import Build, Package, PackageIndex, Release
+from pydoc.core.tasks import _build_docs, _build_release
+
+
+def _fake_sphinx(srcdir, outdir, doctreedir, log_file_path, profile_path=None):
+    os.makedirs(outdir, exist_ok=True)
+    with open(os.path.join(outdir, 'index.html'), 'w') as index:
+        index.write('<html></html>')
+    with open(os.path.join(outdir, STATS_FILE), 'w') as stats:
+        json.dump({'autoapi': 1.0, 'read': 2.0, 'write': 3.0, 'pages': 1}, stats)
+
+
+def test_build_docs_extracts_and_publishes(settings, tmpdir):
+    settings.BUILD_CACHE_DIR = str(tmpdir.join('cache'))
+    settings.BUILD_TMP_DIR = ''
+    settings.BUILD_LOG_DIR = environ.Path(str(tmpdir.join('logs')))
+    settings.DOCS_DIR = environ.Path(str(tmpdir.join('docs')))
+    settings.JSON_DIR = environ.Path(str(tmpdir.join('json')))
+    settings.DOCS_STORAGE = 'files'
+    wheel_path = str(tmpdir.join('example-1.0-py3-none-any.whl'))
+    with zipfile.ZipFile(wheel_path, 'w') as wheel:
+        wheel.writestr('example/__init__.py', 'x = 1\n')
+
+    spans = metrics.Spans('build_')
+    with mock.patch('pydoc.core.tasks.run_sphinx', side_effect=_fake_sphinx) as run_sphinx:
+        stats = _build_docs('example', '1.0', wheel_path, os.path.basename(wheel_path),
+                            [], spans)
+
+    srcdir = run_sphinx.call_args[1]['srcdir']
+    assert os.path.exists(os.path.join(srcdir, 'example', '__init__.py'))
+    assert stats['extracted_bytes'] == len('x = 1\n')
+    assert stats['read'] == 2.0
+    assert os.path.exists(str(tmpdir.join('docs', 'example-1.0', 'index.html')))
+
+
+@pytest.mark.django_db
+def test_build_release_resolves_latest_from_database(settings, tmpdir):
+    settings.BUILD_LOG_DIR = environ.Path(str(tmpdir))
+    package = Package.objects.create(index=PackageIndex.objects.first(), name='example')
+    with mock.patch('pydoc.core.tasks._run_build') as run_build:
+        _build_release('example')
+        assert not run_build.called and not Build.objects.exists()
+
+        for version in ('1.0', '1.1', '2.0rc1'):
+            Release.objects.create(package=package, version=version)
+        _build_release('example')
+        _build_release('example', '3.0')
+    assert run_build.call_count == 1
+    assert run_build.call_args[0][0].version == '1.1'
+    assert Build.objects.get().release.version == '1.1'
@@ -0,0 +1,43 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+
+from pydoc.core import metrics
+from pydoc.core.templatetags import core_tags
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    cache.clear()
+    core_tags._lru.clear()
+
+
+def test_restructuredtext_renders_and_caches():
+    cold = metrics.snapshot().get('rst_render_cold_count', 0)
+    out = core_tags.restructuredtext('Some *emphasis*')
+    assert '<em>emphasis</em>' in out
+    assert metrics.snapshot()['rst_render_cold_count'] == cold + 1
+
+    # A second process only has the shared cache
+    core_tags._lru.clear()
+    warm = metrics.snapshot().get('rst_render_warm_count', 0)
+    assert core_tags.restructuredtext('Some *emphasis*') == out
+    assert metrics.snapshot()['rst_render_cold_count'] == cold + 1
+    assert metrics.snapshot()['rst_render_warm_count'] == warm + 1
+
+
+def test_lru_hits_and_eviction():
+    with mock.patch.object(core_tags, '_publish', side_effect=lambda value, _: value) as publish, \
+            mock.patch.object(core_tags, 'LRU_SIZE', 1):
+        warm = metrics.snapshot().get('rst_render_warm_count', 0)
+        assert core_tags._render('a', 'first') == 'first'
+        cache.clear()
+        assert core_tags._render('a', 'first') == 'first'
+        assert publish.call_count == 1
+        assert metrics.snapshot()['rst_render_warm_count'] == warm + 1
+
+        core_tags._render('b', 'second')
+        cache.clear()
+        core_tags._render('a', 'first')
+        assert publish.call_count == 3
@@ -0,0 +1,233 @@
+import copy
+import json
+import time
+import zlib
+from unittest import mock
+
+import pytest
+import requests
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+
+from pydoc.core import scheduler
+from pydoc.core.models import (Package, PackageIndex, PackageMetadata, PopularPackage,
+                               Distribution, Release)
+from pydoc.core.pypi import PackageResponse, fetch_package
+from pydoc.core.utils import (changelog_since_serial, get_popular, ingest_metadata,
+                              ingest_package_json, update_package_list, update_popular)
+
+pytestmark = pytest.mark.django_db
+
+
+PACKAGE_JSON = {
+    'info': {'name': 'example', 'summary': 'An example'},
+    'releases': {
+        '1.0': [{
+            'filename': 'example-1.0-py3-none-any.whl',
+            'md5_digest': 'a' * 32,
+            'size': 100,
+            'url': 'https://example.com/example-1.0-py3-none-any.whl',
+            'comment_text': '',
+            'upload_time': '2017-01-01T00:00:00',
+            'packagetype': 'bdist_wheel',
+            'python_version': 'py3',
+        }],
+        '1.1': [{
+            'filename': 'example-1.1.tar.gz',
+            'md5_digest': 'b' * 32,
+            'size': 200,
+            'url': 'https://example.com/example-1.1.tar.gz',
+            'comment_text': '',
+            'upload_time': '2017-02-01T00:00:00',
+            'packagetype': 'sdist',
+            'python_version': 'source',
+        }],
+    },
+}
+
+
+@pytest.fixture
+def package():
+    return Package.objects.create(index=PackageIndex.objects.first(), name='example')
+
+
+def test_ingest_inserts_then_is_idempotent(package):
+    stats = ingest_package_json(package, PACKAGE_JSON)
+    assert stats == {'inserted': 4, 'updated': 0, 'unchanged': 0}
+    assert package.releases.count() == 2
+
+    stats = ingest_package_json(package, PACKAGE_JSON)
+    assert stats == {'inserted': 0, 'updated': 0, 'unchanged': 4}
+
+
+def test_ingest_updates_changed_rows(package):
+    ingest_package_json(package, PACKAGE_JSON)
+    changed = copy.deepcopy(PACKAGE_JSON)
+    changed['info']['summary'] = 'A changed example'
+    changed['releases']['1.0'][0]['size'] = 101
+
+    stats = ingest_package_json(package, changed)
+    assert stats == {'inserted': 0, 'updated': 3, 'unchanged': 1}
+    assert Distribution.objects.get(release__version='1.0').size == 101
+
+
+def test_ingest_skips_long_filenames_only(package):
+    long_names = copy.deepcopy(PACKAGE_JSON)
+    long_names['releases']['1.1'][0]['filename'] = 'example-1.1-{}.tar.gz'.format('x' * 128)
+    long_names['releases']['2.0'] = []
+    stats = ingest_package_json(package, long_names)
+    assert stats['inserted'] == 3
+    assert sorted(package.releases.values_list('version', flat=True)) == ['1.0', '1.1']
+    assert not Distribution.objects.filter(release__version='1.1').exists()
+
+
+def test_ingest_metadata_marks_full_ingests_only(package):
+    meta = PackageMetadata.objects.create(
+        name='example', etag='"1"', body=zlib.compress(json.dumps(PACKAGE_JSON).encode()))
+
+    ingest_metadata(package, meta, update_distributions=False)
+    assert not PackageMetadata.objects.get(name='example').ingested
+    assert not Distribution.objects.exists()
+
+    assert ingest_metadata(package, meta)['inserted'] == 2
+    assert PackageMetadata.objects.get(name='example').ingested
+    assert ingest_metadata(package, meta) is None
+
+
+def test_fetch_package_shares_recent_fetches():
+    cache.clear()
+    response = PackageResponse('example', 200, json.dumps(PACKAGE_JSON).encode(), '"1"', '')
+    with mock.patch('pydoc.core.pypi.get_client') as get_client:
+        get_client.return_value.fetch.return_value = response
+        assert fetch_package('example').package_json == PACKAGE_JSON
+        assert fetch_package('example').package_json == PACKAGE_JSON
+        assert get_client.return_value.fetch.call_count == 1
+
+        cache.clear()
+        fetch_package('example')
+        assert get_client.return_value.fetch.call_args[0] == ('example', '"1"', '')
+
+
+def _libraries_page(*names):
+    return mock.Mock(status_code=200, json=mock.Mock(return_value=[
+        {'name': name, 'rank': 30 - position} for position, name in enumerate(names)]))
+
+
+def test_get_popular_empty_table():
+    cache.clear()
+    assert get_popular() == []
+    PopularPackage.objects.create(name='requests', position=1)
+    # The empty list is cached until the next update
+    assert get_popular() == []
+
+
+def test_update_popular(settings):
+    cache.clear()
+    settings.LIBRARIES_API_KEY = 'key'
+    with mock.patch('pydoc.core.utils.get_client') as get_client:
+        get_client.return_value.get.side_effect = [
+            _libraries_page('requests', 'six'),
+            _libraries_page('Requests', 'django'),
+            _libraries_page(),
+        ]
+        assert update_popular(pages=5) == ['requests', 'six', 'django']
+    assert list(PopularPackage.objects.values_list('name', 'position', 'rank')) == [
+        ('requests', 1, 30), ('six', 2, 29), ('django', 3, 29)]
+    assert get_popular() == ['requests', 'six', 'django']
+
+    # An unreachable libraries.io keeps the stored ranking
+    cache.clear()
+    with mock.patch('pydoc.core.utils.get_client') as get_client:
+        get_client.return_value.get.side_effect = requests.ConnectionError('down')
+        assert update_popular(pages=5) == ['requests', 'six', 'django']
+    assert PopularPackage.objects.count() == 3
+
+    settings.LIBRARIES_API_KEY = None
+    with mock.patch('pydoc.core.utils.get_client') as get_client:
+        assert update_popular() == ['requests', 'six', 'django']
+        assert not get_client.called
+
+
+CHANGELOG = [
+    ('Example', '1.0', 0, 'new release', 10),
+    ('example', '1.0', 0, 'add py3 file example-1.0-py3-none-any.whl', 11),
+    ('gone', '2.0', 0, 'new release', 12),
+    ('gone', None, 0, 'remove project', 13),
+    ('other', '1.0', 0, 'remove release', 14),
+]
+
+
+@pytest.fixture
+def xmlrpc():
+    cache.clear()
+    PackageIndex.objects.update(last_serial=None)
+    with mock.patch('pydoc.core.models.xmlrpc.client.ServerProxy') as server_proxy:
+        yield server_proxy.return_value
+
+
+def test_changelog_coalesces_per_package(xmlrpc):
+    index = PackageIndex.objects.first()
+    index.last_serial = 5
+    xmlrpc.changelog_since_serial.return_value = CHANGELOG
+    names, serial = changelog_since_serial(index)
+    xmlrpc.changelog_since_serial.assert_called_once_with(5)
+    assert sorted(names) == ['example', 'other']
+    assert serial == 14
+
+
+def test_changelog_bootstraps_from_minutes(xmlrpc):
+    xmlrpc.changelog.return_value = []
+    xmlrpc.changelog_last_serial.return_value = 42
+    names, serial = changelog_since_serial(PackageIndex.objects.first(), minutes=30)
+    assert (names, serial) == ([], 42)
+    since, with_serials = xmlrpc.changelog.call_args[0]
+    assert with_serials is True
+    assert abs(time.mktime(time.gmtime()) - 30 * 60 - since) < 60
+
+
+def test_process_changelog_advances_the_serial(xmlrpc, package):
+    Release.objects.create(package=package, version='1.0')
+    PackageIndex.objects.update(last_serial=5)
+    xmlrpc.changelog_since_serial.return_value = CHANGELOG
+    with mock.patch('pydoc.core.utils.update_packages') as update_packages, \
+            mock.patch('pydoc.core.scheduler.schedule_build') as schedule_build:
+        call_command('process_changelog', '--no-build')
+        assert PackageIndex.objects.first().last_serial == 5
+        assert not schedule_build.called
+
+        call_command('process_changelog')
+        assert sorted(update_packages.call_args[0][0]) == ['example', 'other']
+        schedule_build.assert_called_once_with('example', priority=scheduler.CHANGELOG)
+        assert PackageIndex.objects.first().last_serial == 14
+
+        # Another run advanced the serial meanwhile, it is not moved back
+        PackageIndex.objects.update(last_serial=5)
+        update_packages.side_effect = lambda names: PackageIndex.objects.update(last_serial=20)
+        call_command('process_changelog')
+        assert PackageIndex.objects.first().last_serial == 20
+
+
+def test_update_package_list_resumes_and_flags_removed(xmlrpc):
+    index = PackageIndex.objects.first()
+    for name in ('alpha', 'beta', 'delta', 'gone'):
+        Package.objects.create(index=index, name=name)
+    Package.objects.filter(name='delta').update(removed_from_remote_at=timezone.now())
+    PackageIndex.objects.update(list_checkpoint='beta')
+    xmlrpc.list_packages.return_value = ['Alpha', 'beta', 'Charlie', 'delta', 'echo']
+
+    with mock.patch.object(Package.objects, 'bulk_create',
+                           wraps=Package.objects.bulk_create) as bulk_create:
+        update_package_list(chunk_size=2)
+    inserted = [package.name for call in bulk_create.call_args_list for package in call[0][0]]
+    assert inserted == ['charlie', 'echo']
+    removed = dict(Package.objects.values_list('name', 'removed_from_remote_at'))
+    assert [name for name, at in sorted(removed.items()) if at is not None] == ['gone']
+    index = PackageIndex.objects.first()
+    assert index.list_checkpoint == '' and index.updated_from_remote_at is not None
+
+    # The package came back upstream
+    xmlrpc.list_packages.return_value.append('gone')
+    update_package_list(chunk_size=2)
+    assert Package.objects.get(name='gone').removed_from_remote_at is None
+    assert Package.objects.count() == 6
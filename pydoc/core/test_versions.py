@@ -0,0 +1,34 @@
+from pydoc.core.versions import version_sort_key, is_prerelease, latest_version
+
+
+def test_sort_key_follows_pep440():
+    ordered = [
+        'not a version',
+        '0.9',
+        '1.0.dev1',
+        '1.0a1.dev1',
+        '1.0a1',
+        '1.0b2',
+        '1.0rc1',
+        '1.0',
+        '1.0.post1.dev1',
+        '1.0.post1',
+        '1.0.1',
+        '1.9',
+        '1.10',
+        '1!0.1',
+    ]
+    assert sorted(ordered, key=version_sort_key) == ordered
+
+
+def test_equivalent_versions_share_a_key():
+    assert version_sort_key('1.0') == version_sort_key('1.0.0')
+    assert version_sort_key('1.0c1') == version_sort_key('1.0rc1')
+
+
+def test_latest_version_prefers_final_releases():
+    assert is_prerelease('2.0b1')
+    assert not is_prerelease('1.10')
+    assert latest_version(['1.9', '1.10', '2.0b1']) == '1.10'
+    assert latest_version(['2.0b1', '2.0a1']) == '2.0b1'
+    assert latest_version([]) is None
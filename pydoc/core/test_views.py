@@ -16,3 +16,13 @@ class SimpleTest(unittest.TestCase):
 
         # Check that the response is 200 OK.
         self.assertEqual(response.status_code, 200)
+
+    def test_search(self):
+        response = self.client.get('/search/', {'package': 'requests', 'page': 2})
+        self.assertEqual(response.status_code, 200)
+
+    def test_metrics(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE pydoc_build_stage_seconds_total counter', response.content)
+        self.assertIn(b'pydoc_build_queue_length{queue="builds.interactive"}', response.content)
@@ -1,17 +1,27 @@
 # -*- coding: utf-8 -*-
 
 
+import bisect
 import datetime
 import time
-import xmlrpc.client
-import threading
-from queue import Queue
+from collections import OrderedDict
+from urllib.parse import urlencode
 
 import requests
 from django.conf import settings
 from django.core.cache import cache
-
-from .models import Package, Release, Distribution, PackageIndex
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import scheduler
+from .caching import invalidate, HOME_POPULAR
+from .models import (Package, Release, Distribution, PackageIndex, PackageMetadata,
+                     PopularPackage)
+from .search import update_search_vector
+from .signals import package_updated
+from .pypi import get_client, fetch_package, store_response, validators_for
+from .versions import latest_version
 
 PYPI_API_URL = 'https://pypi.python.org/pypi'
 TIMEFORMAT = "%Y%m%dT%H:%M:%S"
@@ -23,27 +33,19 @@ except NameError:
 
 
 def get_highest_version(package, data=None):
-    # Get highest version
-    versions = []
     if not data:
-        package_resp = requests.get(
-            'https://pypi.python.org/pypi/{name}/json'.format(name=package)
-        )
-        data = package_resp.json()
-    for version in data['releases']:
-        versions.append(version)
-    if not versions:
-        return None
-    version = sorted(versions)[-1]
-    return version
+        data = get_package_json(package)
+        if not data:
+            return None
+    return latest_version(data['releases'])
 
 
 def get_package(package, create=False):
     """
     returns a package or none if it does not exist.
     """
-    index = PackageIndex.objects.first()
     if isinstance(package, basestring):
+        index = PackageIndex.objects.first()
         if create:
             package = Package.objects.get_or_create(index=index, name=package.lower())[0]
         else:
@@ -55,28 +57,20 @@ def get_package(package, create=False):
 
 
 def get_package_json(package):
-    package_resp = requests.get(
-        'https://pypi.python.org/pypi/{name}/json'.format(name=package)
-    )
-    if package_resp.status_code != 200:
-        print('Invalid Status code on {}: {}'.format(package, package_resp.status_code))
+    meta = fetch_package(package)
+    if meta is None:
         return ''
-    try:
-        resp_json = package_resp.json()
-        resp_json['info']['name'] = resp_json['info']['name'].lower()
-        return resp_json
-    except Exception as e:
-        print('JSON Error: {}'.format(e))
-    return ''
+    return meta.package_json
 
 
-def handle_build(packages, version='', latest=False, built=True):
-    from .tasks import build  # noqa
+def handle_build(packages, version='', latest=False, built=True, update=True,
+                 priority=scheduler.BACKFILL, profile=False):
 
     if packages:
         # Create objects that don't exist
-        for arg in packages:
-            update_package(arg, create=True)
+        if update:
+            for arg in packages:
+                update_package(arg, create=True)
         queryset = Package.objects.filter(name__in=packages)
     else:
         queryset = Package.objects.all()
@@ -86,20 +80,14 @@ def handle_build(packages, version='', latest=False, built=True):
         return None
 
     if latest:
-        for package in queryset:
-            versions = []
-            for rel in package.releases.all():
-                versions.append(rel.version)
-            if versions:
-                highest_version = sorted(versions)[-1]
-                build.delay(project=package.name, version=highest_version)
-            else:
-                print("No versions; {}".format(package))
+        releases = Release.objects.filter(package__in=queryset).latest_per_package()
+        for release in releases.values_list('package_id', 'version'):
+            scheduler.schedule_build(release[0], release[1], priority, profile)
 
     elif version:
         print("updating %s:%s" % (packages[0], version))
         if queryset and queryset[0].releases.filter(version=version, built=built).exists():
-            build.delay(project=packages[0], version=version)
+            scheduler.schedule_build(packages[0], version, priority, profile)
         else:
             print(
                 'Latest version package already built: {}-{}'.format(
@@ -113,122 +101,374 @@ def handle_build(packages, version='', latest=False, built=True):
                 qs = qs.filter(built=True)
             for release in qs:
                 print("updating %s:%s" % (package, release))
-                build.delay(project=release.package.name, version=release.version)
+                scheduler.schedule_build(release.package_id, release.version, priority, profile)
+
 
+def update_package_list(url=None, chunk_size=5000, restart=False):
+    """
+    Import the full package list of the index.
 
-def update_package_list(url=None):
+    The upstream names are walked in sorted chunks; each chunk is compared
+    with the existing packages in one query and only the new names are bulk
+    inserted. The last stored name is checkpointed on the index, so an
+    interrupted import resumes where it stopped. Once the list is complete,
+    packages missing upstream are flagged with ``removed_from_remote_at``.
+    """
     index = PackageIndex.objects.first()
-    for package_name in index.client.list_packages():
-        print('Adding %s' % package_name)
-        package, created = Package.objects.get_or_create(index=index, name=package_name.lower())
+    upstream = sorted({name.lower() for name in index.client.list_packages()})
+    start = 0
+    if index.list_checkpoint and not restart:
+        start = bisect.bisect_right(upstream, index.list_checkpoint)
+        print('Resuming after {}'.format(index.list_checkpoint))
+
+    added = 0
+    for offset in range(start, len(upstream), chunk_size):
+        chunk = upstream[offset:offset + chunk_size]
+        with transaction.atomic():
+            existing = Package.objects.filter(name__in=chunk)
+            known = set(existing.values_list('name', flat=True))
+            new = [Package(index=index, name=name) for name in chunk if name not in known]
+            Package.objects.bulk_create(new)
+            existing.filter(removed_from_remote_at__isnull=False).update(
+                removed_from_remote_at=None)
+            PackageIndex.objects.filter(pk=index.pk).update(list_checkpoint=chunk[-1])
+        added += len(new)
+        print('Imported {}/{} packages, {} new'.format(
+            offset + len(chunk), len(upstream), added))
+
+    removed = mark_removed_packages(upstream, chunk_size=chunk_size)
+    PackageIndex.objects.filter(pk=index.pk).update(
+        list_checkpoint='', updated_from_remote_at=timezone.now())
+    print('Added {} packages, {} removed upstream'.format(added, removed))
+
+
+def mark_removed_packages(upstream, chunk_size=5000):
+    """
+    Flag local packages that are not in the sorted ``upstream`` name list.
+
+    Local names are read in keyset paginated chunks to keep memory flat.
+    """
+    removed = 0
+    last = ''
+    while True:
+        names = list(
+            Package.objects.filter(name__gt=last).order_by('name')
+            .values_list('name', flat=True)[:chunk_size]
+        )
+        if not names:
+            break
+        missing = []
+        for name in names:
+            position = bisect.bisect_left(upstream, name)
+            if position == len(upstream) or upstream[position] != name:
+                missing.append(name)
+        if missing:
+            removed += Package.objects.filter(
+                name__in=missing, removed_from_remote_at__isnull=True,
+            ).update(removed_from_remote_at=timezone.now())
+        last = names[-1]
+    return removed
 
 
 def update_package(package, create=True, update_releases=True,
                    update_distributions=True, mirror_distributions=False):
     package_obj = get_package(package, create=create)
+    if package_obj is None:
+        return None
     if update_releases:
-        package_json = get_package_json(package_obj.name)
-        if not package_json:
-            return
-        for release, data in package_json['releases'].items():
-            for dist in data:
-                create_or_update_release(
-                    package, release, package_info=package_json['info'], data=dist,
-                    update_distributions=update_distributions,
-                    mirror_distributions=mirror_distributions)
-
-
-def create_or_update_release(package, release, package_info=None, data=None,
-                             update_distributions=False,
-                             mirror_distributions=False):
-    package = get_package(package, create=True)
-    if len(release) > 128:
-        # TODO: more general validation and save to statistics
-        print('ERR: Release too long: {}'.format(release))
-        return
-    release_obj, created = Release.objects.get_or_create(package=package,
-                                                         version=release)
+        meta = fetch_package(package_obj.name)
+        if meta is None:
+            return None
+        return ingest_metadata(package_obj, meta, update_distributions=update_distributions)
+    return None
 
-    release_obj.package_info = package_info
-    release_obj.save()
-    print('Updating release {}'.format(release_obj))
-    update_data = {
+
+def ingest_metadata(package, meta, update_distributions=True):
+    """
+    Ingest a cached PyPI document, unless it has been ingested already.
+
+    Only a full ingest, with distributions, marks the document ingested, so
+    a releases only pass doesn't hide its distributions from the next one.
+    """
+    if meta.ingested:
+        print('Unchanged {}'.format(package))
+        return None
+    package_json = meta.package_json
+    if not package_json:
+        return None
+    stats = ingest_package_json(package, package_json,
+                                update_distributions=update_distributions)
+    if update_distributions:
+        meta.mark_ingested()
+    return stats
+
+
+def _distribution_fields(data):
+    uploaded_at = parse_datetime(data['upload_time']) if data.get('upload_time') else None
+    if uploaded_at is not None and settings.USE_TZ and timezone.is_naive(uploaded_at):
+        uploaded_at = timezone.make_aware(uploaded_at, timezone.utc)
+    return {
         'filename': data['filename'],
-        'md5_digest': data['md5_digest'],
+        'md5_digest': data['md5_digest'] or '',
+        'sha256_digest': (data.get('digests') or {}).get('sha256', ''),
         'size': data['size'],
         'url': data['url'],
-        'comment': data['comment_text'],
-        'uploaded_at': data['upload_time']
+        'comment': data['comment_text'] or '',
+        'uploaded_at': uploaded_at,
     }
-    if len(data['filename']) > 128:
-        # TODO: more general validation and save to statistics
-        print('ERR: Release too long: {}'.format(release))
-        return
-    distribution, created = Distribution.objects.get_or_create(
-        release=release_obj,
-        filetype=data['packagetype'],
-        pyversion=data['python_version'],
-        defaults=update_data)
-    if not created:
-        # this means we have to update the existing record
-        for key, value in update_data.items():
-            setattr(distribution, key, value)
-        distribution.save()
-    return release_obj
-
-
-def updated_packages_since(since):
-    client = xmlrpc.client.ServerProxy(PYPI_API_URL)
-    timestamp = int(time.mktime(since.timetuple()))
-    packages = {}
-    for item in client.changelog(timestamp):
-        packages[item[0]] = True
-    print('{} packages updated since {}'.format(len(packages), since))
-    return packages.keys()
 
 
-def thread_update(queryset, task, thread_count=20, **kwargs):
+def ingest_package_json(package, package_json, update_distributions=True):
+    """
+    Sync the releases and distributions of ``package`` with its PyPI JSON.
 
-    def worker(q):
-        while True:
-            package = q.get()
-            print(threading.current_thread().name, package)
-            task(package, **kwargs)
-            q.task_done()
+    Existing rows are loaded in two queries and diffed against the JSON, so
+    only new or changed rows are written. All writes for the package happen in
+    a single transaction.
+
+    Returns a dict with ``inserted``, ``updated`` and ``unchanged`` row counts.
+    """
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    package_info = package_json['info']
+
+    wanted = {}
+    for version, dists in package_json['releases'].items():
+        if len(version) > 128:
+            print('ERR: Release too long: {}'.format(version))
+            continue
+        if not dists:
+            # Every file of the release was deleted, there is nothing to build
+            continue
+        files = {}
+        for data in dists:
+            if len(data['filename']) > 128:
+                # Only the distribution is skipped, the release is still created
+                print('ERR: Filename too long: {}'.format(data['filename']))
+                continue
+            # Same key as Distribution.unique_together, last one wins
+            files[(data['packagetype'], data['python_version'])] = _distribution_fields(data)
+        wanted[version] = files
+
+    with transaction.atomic():
+        existing = set(
+            Release.objects.filter(package=package).values_list('version', flat=True)
+        )
+        new_releases = [
+            Release(package=package, version=version, package_info=package_info)
+            for version in wanted if version not in existing
+        ]
+        for release in new_releases:
+            release.set_sort_key()
+        if new_releases:
+            Release.objects.bulk_create(new_releases)
+        # Compare the JSON in the database instead of pulling it over the wire
+        kept = existing.intersection(wanted)
+        updated = (
+            Release.objects.filter(package=package, version__in=list(kept))
+            .exclude(package_info=package_info)
+            .update(package_info=package_info)
+        )
+        stats['inserted'] += len(new_releases)
+        stats['updated'] += updated
+        stats['unchanged'] += len(kept) - updated
+
+        if update_distributions:
+            release_ids = dict(
+                Release.objects.filter(package=package, version__in=list(wanted))
+                .values_list('version', 'pk')
+            )
+            current = {}
+            for dist in Distribution.objects.filter(release__package=package).values(
+                    'pk', 'release_id', 'filetype', 'pyversion', 'filename', 'md5_digest',
+                    'sha256_digest', 'size', 'url', 'comment', 'uploaded_at'):
+                current[(dist['release_id'], dist['filetype'], dist['pyversion'])] = dist
+
+            new_dists = []
+            for version, files in wanted.items():
+                release_id = release_ids[version]
+                for (filetype, pyversion), update_data in files.items():
+                    dist = current.get((release_id, filetype, pyversion))
+                    if dist is None:
+                        new_dists.append(Distribution(
+                            release_id=release_id, filetype=filetype,
+                            pyversion=pyversion, **update_data))
+                    elif any(dist[key] != value for key, value in update_data.items()):
+                        Distribution.objects.filter(pk=dist['pk']).update(
+                            updated_at=timezone.now(), **update_data)
+                        stats['updated'] += 1
+                    else:
+                        stats['unchanged'] += 1
+            if new_dists:
+                Distribution.objects.bulk_create(new_dists)
+            stats['inserted'] += len(new_dists)
+
+        if new_releases or package.latest_release_id is None:
+            package.update_latest()
+        if new_releases or updated:
+            update_search_vector(package, package_info)
+
+    if stats['inserted'] or stats['updated']:
+        package_updated.send(sender=Package, package=package, stats=stats)
+    print('Updated {}: {inserted} inserted, {updated} updated, {unchanged} unchanged'.format(
+        package, **stats))
+    return stats
+
+
+def update_packages(names, create=True, update_distributions=True, chunk_size=1000):
+    """
+    Update many packages, fetching their metadata concurrently.
+
+    Fetching happens on the PyPI client's worker pool while the database
+    writes all happen here, on the calling thread. Packages PyPI reports as
+    unchanged (304) are skipped without touching the database.
+    """
+    names = list(names)
+    client = get_client()
+    for start in range(0, len(names), chunk_size):
+        chunk = names[start:start + chunk_size]
+        cached = PackageMetadata.objects.in_bulk(chunk)
+        validators = {name: validators_for(meta) for name, meta in cached.items()}
+        for response in client.fetch_many(chunk, validators=validators):
+            meta = store_response(response, cached.get(response.name))
+            if meta is None or meta.ingested:
+                continue
+            package_obj = get_package(response.name, create=create)
+            if package_obj is None:
+                continue
+            ingest_metadata(package_obj, meta, update_distributions=update_distributions)
+
+
+def changelog_since_serial(index, **time_kwargs):
+    """
+    Return the packages changed since the last processed serial of ``index``.
+
+    Events are coalesced per package, so a package touched many times is
+    returned once. Returns ``(names, serial)`` where ``serial`` is the newest
+    event seen. Without a stored serial, the window given by ``time_kwargs``
+    is used to bootstrap the sync.
+    """
+    client = index.client
+    if index.last_serial is None:
+        since = datetime.datetime.utcnow() - datetime.timedelta(**time_kwargs)
+        events = client.changelog(int(time.mktime(since.timetuple())), True)
+    else:
+        events = client.changelog_since_serial(index.last_serial)
+
+    serial = index.last_serial
+    packages = {}
+    for name, version, _, action, event_serial in events:
+        serial = max(serial or 0, event_serial)
+        name = name.lower()
+        if version is None and action.startswith('remove'):
+            # The whole project is gone, there is nothing left to fetch
+            packages.pop(name, None)
+        else:
+            packages[name] = True
+    if serial is None:
+        serial = client.changelog_last_serial()
+    print('{} packages changed since serial {}'.format(len(packages), index.last_serial))
+    return list(packages), serial
 
-    def run_queue(queryset):
 
-        q = Queue()
+def build_changelog(build=True, **time_kwargs):
+    """
+    Update and build every package changed since the last run.
 
-        for i in range(thread_count):
-            t = threading.Thread(target=worker, args=(q,))
-            t.daemon = True
-            t.start()
+    The serial is only advanced once all the changed packages are processed,
+    and only if no other run advanced it meanwhile, so no event is skipped.
+    A run that fails after processing some packages leaves the serial where
+    it was, and the next run processes them again: delivery is at least once.
 
-        for item in queryset:
-            q.put(item)
+    Without ``build`` the changed packages are only updated and the serial is
+    left alone, so the next run still builds them.
+    """
+    lock_id = 'build-changelog-lock'
+    if not cache.add(lock_id, True, 60 * 60):
+        print('Changelog build already running')
+        return
+    try:
+        index = PackageIndex.objects.first()
+        packages, serial = changelog_since_serial(index, **time_kwargs)
+        update_packages(packages)
+        if not build:
+            return
+        # Changelog builds are coalesced per package, see scheduler.py
+        with_releases = (
+            Release.objects.filter(package__in=packages)
+            .order_by().values_list('package_id', flat=True).distinct()
+        )
+        for package in with_releases:
+            scheduler.schedule_build(package, priority=scheduler.CHANGELOG)
+        PackageIndex.objects.filter(pk=index.pk, last_serial=index.last_serial).update(
+            last_serial=serial)
+    finally:
+        cache.delete(lock_id)
 
-        q.join()
 
-    run_queue(queryset)
+POPULAR_CACHE_KEY = 'homepage_popular'
+LIBRARIES_SEARCH_URL = 'https://libraries.io/api/search'
 
 
-def build_changelog(**time_kwargs):
-    since = datetime.datetime.utcnow() - datetime.timedelta(**time_kwargs)
-    packages = updated_packages_since(since)
-    for package in packages:
-        handle_build([package], latest=True, built=False)
+def get_popular():
+    """
+    Return the names of the popular packages, most popular first.
+
+    Only reads the cache and the database; the list is refreshed from
+    libraries.io by the ``update_popular_packages`` periodic task. An empty
+    list is cached like any other, so a missing API key costs nothing.
+    """
+    popular = cache.get(POPULAR_CACHE_KEY)
+    if popular is None:
+        popular = list(PopularPackage.objects.values_list('name', flat=True))
+        cache.set(POPULAR_CACHE_KEY, popular, settings.POPULAR_CACHE_TIMEOUT)
+    return popular
 
 
-def update_popular():
+def update_popular(pages=None):
+    """
+    Refresh the popular packages from the libraries.io ranking.
+
+    Fetches ``pages`` pages of 100 packages. If libraries.io can't be reached,
+    the stored list is kept as is.
+    """
     api_key = getattr(settings, 'LIBRARIES_API_KEY', None)
     if not api_key:
-        return ()
-    url = 'https://libraries.io/api/search/?platforms=Pypi&sort=rank?api_key={key}'.format(
-        key=api_key,
-    )
-    resp = requests.get(url)
-    data = resp.json()
-    popular = [obj['name'] for obj in data]
-    cache.set('homepage_popular', popular, 3600)
+        print('No libraries.io API key, not updating popular packages')
+        return get_popular()
+
+    pages = pages or settings.POPULAR_PAGES
+    ranked = OrderedDict()
+    for page in range(1, pages + 1):
+        url = '{url}?{query}'.format(url=LIBRARIES_SEARCH_URL, query=urlencode({
+            'platforms': 'Pypi',
+            'sort': 'rank',
+            'per_page': 100,
+            'page': page,
+            'api_key': api_key,
+        }))
+        try:
+            resp = get_client().get(url)
+            data = resp.json() if resp.status_code == 200 else None
+        except (requests.RequestException, ValueError) as e:
+            print('libraries.io Error: {}'.format(e))
+            data = None
+        if data is None:
+            if not ranked:
+                return get_popular()
+            break
+        if not data:
+            break
+        for obj in data:
+            ranked.setdefault(obj['name'].lower(), obj.get('rank'))
+
+    with transaction.atomic():
+        PopularPackage.objects.all().delete()
+        PopularPackage.objects.bulk_create([
+            PopularPackage(name=name, position=position, rank=rank)
+            for position, (name, rank) in enumerate(ranked.items(), start=1)
+        ])
+    popular = list(ranked)
+    cache.set(POPULAR_CACHE_KEY, popular, settings.POPULAR_CACHE_TIMEOUT)
+    invalidate(HOME_POPULAR)
+    print('Updated {} popular packages'.format(len(popular)))
     return popular
@@ -0,0 +1,77 @@
+"""
+PEP 440 aware version ordering.
+
+:func:`version_sort_key` turns a version string into a fixed width string of
+digits whose plain string order is the PEP 440 order, so the database can
+sort releases with an ordinary index.
+"""
+
+from packaging.version import Version, InvalidVersion
+
+RELEASE_PARTS = 6
+NUMBER_WIDTH = 10
+
+PRE_PHASES = {'a': 1, 'b': 2, 'rc': 3}
+DEV_ONLY = 0
+FINAL = 4
+
+
+def _number(value, width=NUMBER_WIDTH):
+    return str(min(value, 10 ** width - 1)).zfill(width)
+
+
+def version_sort_key(version):
+    """
+    Return the sort key for ``version``.
+
+    Valid versions start with ``1`` followed by the epoch, the release
+    segments, the pre-release phase, the post-release and the development
+    release. Versions PEP 440 can't parse start with ``0``, so they sort below
+    every valid version.
+    """
+    try:
+        parsed = Version(version)
+    except InvalidVersion:
+        return '0' + version
+
+    release = list(parsed.release[:RELEASE_PARTS])
+    release += [0] * (RELEASE_PARTS - len(release))
+
+    if parsed.pre is not None:
+        pre = str(PRE_PHASES[parsed.pre[0]]) + _number(parsed.pre[1])
+    elif parsed.dev is not None and parsed.post is None:
+        # 1.0.dev1 comes before 1.0a1
+        pre = str(DEV_ONLY) + _number(0)
+    else:
+        pre = str(FINAL) + _number(0)
+
+    if parsed.post is not None:
+        post = '1' + _number(parsed.post)
+    else:
+        post = '0' + _number(0)
+
+    if parsed.dev is not None:
+        dev = '0' + _number(parsed.dev)
+    else:
+        dev = '1' + _number(0)
+
+    return ''.join(
+        ['1', _number(parsed.epoch, 4)] + [_number(part) for part in release] + [pre, post, dev]
+    )
+
+
+def is_prerelease(version):
+    """Return whether ``version`` is a PEP 440 pre or development release."""
+    try:
+        return Version(version).is_prerelease
+    except InvalidVersion:
+        return False
+
+
+def latest_version(versions):
+    """Return the highest final release of ``versions``, or highest pre-release."""
+    versions = list(versions)
+    if not versions:
+        return None
+    return max(versions, key=lambda version: (not is_prerelease(version),
+                                              version_sort_key(version)))
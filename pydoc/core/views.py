@@ -1,11 +1,24 @@
+import mimetypes
+
 from django import forms
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from django.conf import settings
+from django.http import (Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified,
+                         JsonResponse, StreamingHttpResponse)
+from django.utils.http import http_date
 from django.views.generic import TemplateView
 from django.shortcuts import render
 from django.views import View
-from django.core.cache import cache
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.views.static import was_modified_since
 
-from pydoc.core.utils import handle_build, get_highest_version, update_package, update_popular
-from pydoc.core.models import Release, Distribution, Package
+from pydoc.core import docstore, metrics
+from pydoc.core.scheduler import INTERACTIVE
+from pydoc.core.utils import handle_build, get_highest_version, update_package, get_popular
+from pydoc.core.models import Build, Release, Package, Page, Symbol
+from pydoc.core.search import search_packages
+from pydoc.core.caching import cached_fragment, HOME_BUILT_COUNT, HOME_POPULAR, HOME_RECENT
 
 
 class PackageForm(forms.Form):
@@ -15,20 +28,42 @@ class PackageForm(forms.Form):
 class HomeView(TemplateView):
     template_name = "pages/home.html"
     title = "Pydoc Home"
+    fragment_timeout = 60 * 10
 
     def projects(self):
         return Release.objects.filter(built=True)
 
+    def built_count(self):
+        return cached_fragment(HOME_BUILT_COUNT, self.projects().count, self.fragment_timeout)
+
+    def recent(self):
+        return cached_fragment(HOME_RECENT, self._recent, self.fragment_timeout)
+
     def popular(self):
-        releases = set()
-        popular = cache.get('homepage_popular', None) or update_popular()
-        packages = Package.objects.filter(name__in=popular)
+        return cached_fragment(HOME_POPULAR, self._popular, self.fragment_timeout)
+
+    def _recent(self):
+        # Rebuilds finish more than once, keep each release's last one
+        builds = (
+            Build.objects.filter(state=Build.SUCCESS).order_by('-finished_at')
+            .values_list('release__package_id', 'release__version')[:50]
+        )
+        names = []
+        for package, version in builds:
+            name = '{}-{}'.format(package, version)
+            if name not in names:
+                names.append(name)
+        return names[:10]
 
-        for package in packages:
-            release_qs = package.releases.filter(built=True)
-            if release_qs.exists():
-                releases.add(release_qs.latest())
-        return releases
+    def _popular(self):
+        popular = get_popular()
+        packages = (
+            Package.objects.filter(name__in=popular, latest_built_release__isnull=False)
+            .select_related('latest_built_release')
+        )
+        rank = {name: position for position, name in enumerate(popular)}
+        packages = sorted(packages, key=lambda package: rank.get(package.name))
+        return [package.latest_built_release.release_name for package in packages]
 
 
 class BuildView(View):
@@ -45,17 +80,14 @@ class BuildView(View):
         success = False
         if form.is_valid():
             tried = True
-            package = form.cleaned_data['package']
-            version = get_highest_version(package)
+            package = form.cleaned_data['package'].lower()
             update_package(package)
-            dists = Distribution.objects.filter(
-                release__package__name=package,
-                release__version=version,
-                filetype='bdist_wheel'
-            )
-            if dists.exists():
+            # Served from the metadata cache, update_package just fetched it
+            version = get_highest_version(package)
+            release = Release.objects.filter(package__name=package, version=version).first()
+            if release is not None and release.build_distribution() is not None:
                 success = True
-                handle_build(packages=[package], latest=True)
+                handle_build(packages=[package], latest=True, priority=INTERACTIVE)
             else:
                 success = False
         return render(request, self.template_name, {
@@ -66,16 +98,133 @@ class BuildView(View):
 class ProjectSearchView(View):
     form_class = PackageForm
     template_name = "pages/search.html"
+    paginate_by = 20
 
     def get(self, request, *args, **kwargs):
         query = request.GET.get('package')
         if query:
             form = self.form_class(request.GET)
-            packages = Package.objects.filter(name__icontains=query, releases__built=True)
-            rels = [package.releases.latest() for package in packages]
+            paginator = Paginator(search_packages(query), self.paginate_by)
+            try:
+                page = paginator.page(request.GET.get('page', 1))
+            except PageNotAnInteger:
+                page = paginator.page(1)
+            except EmptyPage:
+                page = paginator.page(paginator.num_pages)
+            rels = [package.latest_built_release for package in page]
             return render(
                 request,
                 self.template_name,
-                {'form': form, 'releases': rels}
+                {'form': form, 'releases': rels, 'page': page, 'query': query}
             )
         return render(request, self.template_name, {'form': self.form_class()})
+
+
+class SymbolSearchView(View):
+
+    """Find documented modules, classes and functions across all packages."""
+
+    limit = 50
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        if not query:
+            return JsonResponse({'results': []})
+        symbols = Symbol.objects.filter(
+            # Only the latest built docs of each package
+            release__package__latest_built_release=F('release'),
+        )
+        if '.' in query:
+            symbols = symbols.filter(name__startswith=query)
+        else:
+            symbols = symbols.filter(short_name=query.lower())
+        results = [
+            {
+                'name': symbol['name'],
+                'kind': symbol['kind'],
+                'package': symbol['release__package_id'],
+                'version': symbol['release__version'],
+                'url': '/pypi/{}-{}/{}'.format(
+                    symbol['release__package_id'], symbol['release__version'], symbol['path']),
+            }
+            for symbol in symbols.order_by('name').values(
+                'name', 'kind', 'path', 'release__package_id', 'release__version',
+            )[:self.limit]
+        ]
+        return JsonResponse({'results': results})
+
+
+class PageSearchView(View):
+
+    """Full text search of the pages of the latest built docs of every package."""
+
+    limit = 20
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        if not query:
+            return JsonResponse({'results': []})
+        search_query = SearchQuery(query)
+        pages = (
+            Page.objects
+            .filter(release__package__latest_built_release=F('release'))
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank')
+        )
+        results = [
+            {
+                'title': page['title'],
+                'package': page['release__package_id'],
+                'version': page['release__version'],
+                'url': '/pypi/{}-{}/{}.html'.format(
+                    page['release__package_id'], page['release__version'], page['path']),
+            }
+            for page in pages.values(
+                'title', 'path', 'release__package_id', 'release__version',
+            )[:self.limit]
+        ]
+        return JsonResponse({'results': results})
+
+
+class MetricsView(View):
+
+    """Prometheus metrics of this process and of the builds."""
+
+    def get(self, request, *args, **kwargs):
+        if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+            return HttpResponseForbidden()
+        text = metrics.prometheus_text(metrics.process_samples() + metrics.build_samples())
+        return HttpResponse(text, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class DocsView(View):
+
+    """Serve built docs from their archives, see :mod:`pydoc.core.docstore`."""
+
+    chunk_size = 256 * 1024
+
+    def get(self, request, release, path=''):
+        if release.startswith('.'):
+            raise Http404
+        if not path or path.endswith('/'):
+            path += 'index.html'
+        content = docstore.read_member(release, path)
+        if content is None:
+            raise Http404
+        mtime = docstore.last_modified(release, path)
+        if mtime is not None and not was_modified_since(
+                request.META.get('HTTP_IF_MODIFIED_SINCE'), mtime):
+            return HttpResponseNotModified()
+        content_type, encoding = mimetypes.guess_type(path)
+        response = StreamingHttpResponse(
+            (content[start:start + self.chunk_size]
+             for start in range(0, len(content), self.chunk_size)),
+            content_type=content_type or 'application/octet-stream',
+        )
+        response['Content-Length'] = len(content)
+        if mtime is not None:
+            response['Last-Modified'] = http_date(mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        return response
@@ -21,6 +21,15 @@ JSON_DIR = APPS_DIR.path('media', 'json')
 env = environ.Env()
 env.read_env()
 
+# Dump the pages of a release to JSON_DIR/<name>-<version>.jsonl.gz instead of a
+# file per page. Install ujson for faster dumps in either mode
+JSON_BUNDLE = env.bool('JSON_BUNDLE', default=False)
+# 'files' keeps the docs of a release as a directory in DOCS_DIR, 'archive' as
+# one zip file served by Django, see pydoc/core/docstore.py
+DOCS_STORAGE = env('DOCS_STORAGE', default='files')
+# Archives each web process keeps mapped
+DOCS_ARCHIVES_OPEN = env.int('DOCS_ARCHIVES_OPEN', default=256)
+
 # APP CONFIGURATION
 # ------------------------------------------------------------------------------
 DJANGO_APPS = (
@@ -37,6 +46,9 @@ DJANGO_APPS = (
 
     # Admin
     'django.contrib.admin',
+
+    # Full text and trigram search
+    'django.contrib.postgres',
 )
 
 THIRD_PARTY_APPS = (
@@ -251,6 +263,8 @@ else:
 CELERY_ACCEPT_CONTENT = ['json', 'msgpack', 'yaml']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# Builds are long, don't let a worker hold back queued builds it can't start
+CELERYD_PREFETCH_MULTIPLIER = 1
 
 CELERYBEAT_SCHEDULE = {
     'update-from-pypi': {
@@ -258,11 +272,90 @@ CELERYBEAT_SCHEDULE = {
         'schedule': timedelta(minutes=5),
         'kwargs': {'minutes': 6},
     },
+    'update-popular': {
+        'task': 'pydoc.core.tasks.update_popular_packages',
+        'schedule': timedelta(hours=6),
+    },
+    'prune-mirror': {
+        'task': 'pydoc.core.tasks.prune_mirror',
+        'schedule': timedelta(hours=1),
+    },
+    'expire-stale-builds': {
+        'task': 'pydoc.core.tasks.expire_stale_builds',
+        'schedule': timedelta(minutes=10),
+    },
+    # RebuildCampaign.rate is per run of this task
+    'advance-campaigns': {
+        'task': 'pydoc.core.tasks.advance_campaigns',
+        'schedule': timedelta(minutes=1),
+    },
 }
 
 CELERY_TIMEZONE = 'UTC'
 
 LIBRARIES_API_KEY = env('LIBRARIES_API_KEY', default='')
+# Pages of 100 packages to fetch from the libraries.io ranking
+POPULAR_PAGES = env.int('POPULAR_PAGES', default=10)
+POPULAR_CACHE_TIMEOUT = 60 * 60 * 24
+
+# BUILDS
+# ------------------------------------------------------------------------------
+BUILD_LOG_DIR = APPS_DIR.path('media', 'logs')
+BUILD_LOCK_DIR = env('BUILD_LOCK_DIR', default='/tmp/pydoc-build-slots')
+# Sphinx sources, environments and output kept between builds of a package
+BUILD_CACHE_DIR = env('BUILD_CACHE_DIR', default=str(APPS_DIR.path('media', 'build-cache')))
+# Builds allowed to run at once on one machine
+BUILD_CONCURRENCY = env.int('BUILD_CONCURRENCY', default=2)
+# Seconds before a build is killed
+BUILD_TIMEOUT = env.int('BUILD_TIMEOUT', default=20 * 60)
+# Seconds a build waits for a free slot before it fails and backs off
+BUILD_SLOT_TIMEOUT = env.int('BUILD_SLOT_TIMEOUT', default=10 * 60)
+# Address space limit of a build in bytes, 0 disables it
+BUILD_MEMORY_LIMIT = env.int('BUILD_MEMORY_LIMIT', default=2 * 1024 ** 3)
+# Scratch space for extracting distributions, a tmpfs like /dev/shm is best
+BUILD_TMP_DIR = env('BUILD_TMP_DIR', default='')
+# Files and directories of distributions that are not documented
+AUTOAPI_IGNORE = ['packages*', 'vendor*', '_vendor*']
+# Limits of extracting a distribution, in bytes of sources written, members
+# and bytes decompressed to read a source archive
+EXTRACT_MAX_BYTES = env.int('EXTRACT_MAX_BYTES', default=100 * 1024 ** 2)
+EXTRACT_MAX_MEMBERS = env.int('EXTRACT_MAX_MEMBERS', default=50000)
+EXTRACT_MAX_SCANNED = env.int('EXTRACT_MAX_SCANNED', default=1024 ** 3)
+# Distribution files used by builds, must be inside MEDIA_ROOT
+MIRROR_DIR = APPS_DIR.path('media', 'mirror')
+# Bytes the mirror may hold before the least recently used files are evicted
+MIRROR_MAX_SIZE = env.int('MIRROR_MAX_SIZE', default=20 * 1024 ** 3)
+# Builds that may wait on each queue, see pydoc/core/scheduler.py
+BUILD_QUEUE_LIMITS = {
+    'builds.interactive': env.int('BUILD_QUEUE_INTERACTIVE', default=500),
+    'builds.changelog': env.int('BUILD_QUEUE_CHANGELOG', default=5000),
+    'builds.backfill': env.int('BUILD_QUEUE_BACKFILL', default=20000),
+}
+# Seconds a changelog build waits for more uploads to the same package
+BUILD_COALESCE_DELAY = env.int('BUILD_COALESCE_DELAY', default=10 * 60)
+# Seconds before a failed release is built again, doubled on each failure
+BUILD_RETRY_BASE = env.int('BUILD_RETRY_BASE', default=60 * 60)
+BUILD_RETRY_MAX = env.int('BUILD_RETRY_MAX', default=30 * 24 * 60 * 60)
+# Seconds a build may stay queued before it's considered lost
+BUILD_QUEUED_EXPIRY = env.int('BUILD_QUEUED_EXPIRY', default=2 * 24 * 60 * 60)
+# sphinx-build -j, 0 splits the cores between the build slots
+SPHINX_BUILD_JOBS = env.int('SPHINX_BUILD_JOBS', default=0)
+
+# Addresses allowed to scrape /metrics
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=['127.0.0.1'])
+
+# PYPI
+PYPI_URL = env('PYPI_URL', default='https://pypi.python.org/pypi')
+PYPI_FETCH_CONCURRENCY = env.int('PYPI_FETCH_CONCURRENCY', default=20)
+# Requests per second per host, 0 disables rate limiting. The JSON API is
+# served from PyPI's CDN, which handles a few hundred a second comfortably.
+PYPI_RATE_LIMIT = env.int('PYPI_RATE_LIMIT', default=300)
+PYPI_RETRIES = env.int('PYPI_RETRIES', default=3)
+PYPI_TIMEOUT = env.int('PYPI_TIMEOUT', default=10)
+# Longest Retry-After, in seconds, a fetcher will honour
+PYPI_MAX_RETRY_AFTER = env.int('PYPI_MAX_RETRY_AFTER', default=60)
+# Seconds a fetched package is reused without asking PyPI again
+PYPI_CACHE_FRESH = env.int('PYPI_CACHE_FRESH', default=60)
 
 # Location of root django.contrib.admin URL, use {% url 'admin:index' %}
 ADMIN_URL = r'^admin/'
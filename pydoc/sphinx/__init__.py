@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
 
 import os
-import environ
+import glob
+import gzip
 import json
-import copy
+import hashlib
 import logging
+import time
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
 
 log = logging.getLogger(__name__)
 
@@ -28,33 +35,283 @@ KEYS = [
     u'page_source_suffix'
 ]
 
+PAGE_LOG = '.pydoc-pages.log'
+STATS_FILE = '.pydoc-stats.json'
+BUNDLE_SUFFIX = '.jsonl.gz'
+
+if ujson is not None:
+    def dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+else:
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+# Directories already created by this process
+_made_dirs = set()
+# Bundle part file descriptors of this process, by pid as the builder forks
+_bundle_parts = {}
+
+
+def json_dir(app):
+    """The release directory in ``output_directory``, ``<name>-<version>``."""
+    if not hasattr(app, 'pydoc_json_dir'):
+        version = app.config.html_context.get('pydoc_version', app.config.version)
+        app.pydoc_json_dir = os.path.join(
+            app.config.html_context['output_directory'],
+            "{name}-{version}".format(name=app.config.project, version=version),
+        )
+    return app.pydoc_json_dir
+
+
+def _makedirs(path):
+    if path not in _made_dirs:
+        os.makedirs(path, exist_ok=True)
+        _made_dirs.add(path)
+
+
+def _write_page(path, data):
+    _makedirs(os.path.dirname(path))
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as out:
+        out.write(data)
+    os.replace(tmp_path, path)
+
+
+def _append_bundle(app, data):
+    """
+    Add a page to this process's part of the bundle.
+
+    Every page is a complete gzip member written with a single unbuffered
+    write, so nothing is lost when a sphinx-build -j worker exits without
+    cleaning up, and concatenated parts are still a valid gzip file.
+    """
+    pid = os.getpid()
+    if pid not in _bundle_parts:
+        _makedirs(os.path.dirname(json_dir(app)))
+        _bundle_parts[pid] = os.open(
+            '{}{}.part-{}'.format(json_dir(app), BUNDLE_SUFFIX, pid),
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    os.write(_bundle_parts[pid], gzip.compress(data + b'\n'))
+
 
 def update_body(app, pagename, templatename, context, doctree):
-    outdir = environ.Path(app.config.html_context['output_directory'])
-    project = app.config.project
-    version = app.config.version
-    if not os.path.exists(outdir.root):
-        os.makedirs(outdir.root)
-    directory_name = "{name}-{version}".format(name=project, version=version)
-    json_dir = outdir.path(directory_name)
-    if not os.path.exists(json_dir.root):
-        os.makedirs(json_dir.root)
+    """
+    Dump the whitelisted page context for search and indexing.
+
+    Pages are written to ``<json dir>/<pagename>.json``, or with
+    ``pydoc_json_bundle`` as lines of ``<json dir>.jsonl.gz``.
+    """
     try:
-        out_dir = json_dir.path('/'.join(pagename.split('/')[:-1]))
-        if not os.path.exists(out_dir()):
-            os.makedirs(out_dir())
-        out_file = json_dir.path(pagename + '.json')
-        to_write = open(out_file(), 'w+')
-        to_context = copy.copy(context)
-        # Use list here so we don't get an error on changing dict during iteration
-        for key in list(context):
-            if key not in KEYS:
-                del to_context[key]
-        to_write.write(json.dumps(to_context, indent=4))
+        started = time.time()
+        to_context = {key: context[key] for key in KEYS if key in context}
+        if app.config.pydoc_json_bundle:
+            data = dumps({'page': pagename, 'context': to_context}).encode('utf-8')
+            _append_bundle(app, data)
+        else:
+            data = dumps(to_context).encode('utf-8')
+            _write_page(os.path.join(json_dir(app), pagename + '.json'), data)
+        record_page(app, time.time() - started, len(data))
     except Exception:
         log.exception('Failure in JSON search dump')
 
 
+def record_page(app, seconds, size):
+    """
+    Count a dumped page towards the build stats.
+
+    Pages are written from several processes with sphinx-build -j, so each
+    one appends a line to a file that :func:`write_stats` adds up.
+    """
+    line = '{:.6f} {}\n'.format(seconds, size).encode('ascii')
+    fd = os.open(os.path.join(app.outdir, PAGE_LOG), os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def _bundle_parts_of(app):
+    return glob.glob('{}{}.part-*'.format(glob.escape(json_dir(app)), BUNDLE_SUFFIX))
+
+
+def reset_bundle(app):
+    """Drop the bundle parts an earlier, failed build left behind."""
+    if app.config.pydoc_json_bundle:
+        for part in _bundle_parts_of(app):
+            os.remove(part)
+
+
+def write_bundle(app, exception):
+    """
+    Join the parts into the release bundle.
+
+    Sphinx only writes the pages that changed, so pages of the previous
+    bundle that weren't written again but still exist are carried over.
+    """
+    if exception is not None or not app.config.pydoc_json_bundle:
+        return
+    for fd in _bundle_parts.values():
+        os.close(fd)
+    _bundle_parts.clear()
+    bundle = json_dir(app) + BUNDLE_SUFFIX
+    parts = _bundle_parts_of(app)
+    written = set()
+    tmp_path = '{}.{}.tmp'.format(bundle, os.getpid())
+    with open(tmp_path, 'wb') as out:
+        for part in parts:
+            with open(part, 'rb') as part_file:
+                data = part_file.read()
+            out.write(data)
+            for line in gzip.decompress(data).splitlines():
+                written.add(json.loads(line.decode('utf-8'))['page'])
+        if os.path.exists(bundle):
+            kept = []
+            for line in _bundle_lines(bundle):
+                page = json.loads(line.decode('utf-8'))['page']
+                if page not in written and page in app.env.found_docs:
+                    kept.append(line)
+            if kept:
+                out.write(gzip.compress(b'\n'.join(kept) + b'\n'))
+    os.replace(tmp_path, bundle)
+    for part in parts:
+        os.remove(part)
+
+
+def _bundle_lines(bundle):
+    with gzip.open(bundle, 'rb') as bundle_file:
+        for line in bundle_file:
+            if line.strip():
+                yield line.rstrip(b'\n')
+
+
+def iter_pages(json_dir):
+    """
+    Yield ``(pagename, context)`` for every page dumped by :func:`update_body`.
+
+    ``json_dir`` is the release directory, ``<output_directory>/<name>-<version>``.
+    The release bundle is read instead when there is one.
+    """
+    bundle = json_dir + BUNDLE_SUFFIX
+    if os.path.exists(bundle):
+        for line in _bundle_lines(bundle):
+            page = json.loads(line.decode('utf-8'))
+            yield page['page'], page['context']
+        return
+    for root, _, files in os.walk(json_dir):
+        for filename in files:
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(root, filename)
+            pagename = os.path.relpath(path, json_dir)[:-len('.json')]
+            with open(path, encoding='utf-8') as page_file:
+                yield pagename.replace(os.sep, '/'), json.load(page_file)
+
+
+def set_version(app, pagename, templatename, context, doctree):
+    """
+    Show the real release version.
+
+    ``version`` in the generated ``conf.py`` stays the same for every release,
+    so the environment cached by a build of one version is reused by the next.
+    """
+    version = app.config.html_context.get('pydoc_version')
+    if version:
+        context['version'] = context['release'] = version
+
+
+def _autoapi_files(app):
+    root = os.path.join(app.srcdir, getattr(app.config, 'autoapi_root', 'autoapi'))
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as source:
+                digest = hashlib.sha256(source.read()).hexdigest()
+            yield os.path.relpath(path, app.srcdir), path, digest
+
+
+def keep_autoapi_mtimes(app):
+    """
+    Give regenerated but unchanged AutoAPI pages back their old mtime.
+
+    AutoAPI writes every page again on each build, which would make Sphinx
+    read them all again. Runs after AutoAPI's own ``builder-inited`` handler.
+    """
+    manifest_path = os.path.join(app.doctreedir, 'pydoc-autoapi.json')
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (IOError, ValueError):
+        manifest = {}
+    new_manifest = {}
+    modules = 0
+    for relpath, path, digest in _autoapi_files(app):
+        if os.path.basename(relpath).startswith('index.'):
+            modules += 1
+        old = manifest.get(relpath)
+        if old and old[0] == digest:
+            os.utime(path, (old[1], old[1]))
+        new_manifest[relpath] = [digest, os.path.getmtime(path)]
+    os.makedirs(app.doctreedir, exist_ok=True)
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump(new_manifest, manifest_file)
+    _stats(app)['modules'] = modules
+
+
+def _stats(app):
+    if not hasattr(app, 'pydoc_stats'):
+        app.pydoc_stats = {}
+    return app.pydoc_stats
+
+
+def time_autoapi(app):
+    """AutoAPI generates its pages in its ``builder-inited`` handler, just before this one."""
+    now = time.time()
+    _stats(app)['autoapi'] = now - app.pydoc_setup_at
+    app.pydoc_stage_at = now
+    # Drop the page log of an earlier build that failed
+    if os.path.exists(os.path.join(app.outdir, PAGE_LOG)):
+        os.remove(os.path.join(app.outdir, PAGE_LOG))
+
+
+def time_read(app, env):
+    now = time.time()
+    _stats(app)['read'] = now - app.pydoc_stage_at
+    app.pydoc_stage_at = now
+
+
+def write_stats(app, exception):
+    """
+    Report the stage durations and counters to the build task.
+
+    Stages are ``autoapi``, ``read`` and ``write``, counters are ``pages``
+    written, ``json_bytes`` and ``json_seconds`` spent in :func:`update_body`,
+    AutoAPI ``modules`` and the parse cache counters of :mod:`.parsecache`.
+    """
+    if exception is not None:
+        return
+    stats = _stats(app)
+    stats['write'] = time.time() - app.pydoc_stage_at
+    stats.update(pages=0, json_bytes=0, json_seconds=0.0)
+    page_log = os.path.join(app.outdir, PAGE_LOG)
+    if os.path.exists(page_log):
+        with open(page_log) as lines:
+            for line in lines:
+                seconds, size = line.split()
+                stats['pages'] += 1
+                stats['json_seconds'] += float(seconds)
+                stats['json_bytes'] += int(size)
+        os.remove(page_log)
+    with open(os.path.join(app.outdir, STATS_FILE), 'w') as stats_file:
+        json.dump(stats, stats_file)
+
+
+def write_page_list(app, exception):
+    """Record the documents of this build, the output dir may hold older pages."""
+    if exception is not None:
+        return
+    with open(os.path.join(app.outdir, '.pydoc-pages.json'), 'w') as pages_file:
+        json.dump(sorted(app.env.found_docs), pages_file)
+
+
 def add_ga_javascript(app, pagename, templatename, context, doctree):
     """
     From the sphinxcontrib.googleanalytics package
@@ -80,7 +337,25 @@ def add_ga_javascript(app, pagename, templatename, context, doctree):
 
 
 def setup(app):
+    from . import parsecache
+    parsecache.install(_stats)
+    app.pydoc_setup_at = app.pydoc_stage_at = time.time()
+    app.connect('html-page-context', set_version)
     app.connect('html-page-context', update_body)
+    app.connect('builder-inited', time_autoapi)
+    app.connect('builder-inited', keep_autoapi_mtimes)
+    app.connect('env-updated', time_read)
+    app.connect('builder-inited', reset_bundle)
+    app.connect('build-finished', write_stats)
+    app.connect('build-finished', write_bundle)
+    app.connect('build-finished', write_page_list)
+    app.connect('build-finished', parsecache.prune)
     app.add_config_value('googleanalytics_id', '', 'html')
     app.add_config_value('googleanalytics_enabled', True, 'html')
+    app.add_config_value('pydoc_json_bundle', False, 'html')
+    app.add_config_value('pydoc_parse_cache', '', '')
     app.connect('html-page-context', add_ga_javascript)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
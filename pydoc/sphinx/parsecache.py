@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the modules AutoAPI parsed, shared by the builds of a package.
+
+AutoAPI parses every source file on every build, while consecutive releases
+usually change a handful of modules. The parsed module is pickled to
+``pydoc_parse_cache`` under a hash of the sphinx-autoapi and Python
+versions, the file's path and its content, so the next build of the package
+loads it instead of parsing the file again. The path is part of the key as
+AutoAPI derives module names from it, builds read from the package's stable
+``BuildCache.src`` so it doesn't change between releases.
+
+Reports ``parse_hits``, ``parse_misses`` and ``parse_saved``, the seconds
+the hits would have taken to parse, in the build stats.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import time
+
+log = logging.getLogger(__name__)
+
+# Entries no build hit for this long are removed
+MAX_AGE = 30 * 24 * 60 * 60
+
+_installed = False
+
+
+def _autoapi_version():
+    try:
+        import autoapi
+    except ImportError:  # pragma: no cover
+        return ''
+    return getattr(autoapi, '__version__', '')
+
+
+def entry_path(cache_dir, path, source):
+    digest = hashlib.sha256()
+    for part in (_autoapi_version(), sys.version, os.path.abspath(path)):
+        digest.update(part.encode('utf-8') + b'\0')
+    digest.update(source)
+    name = digest.hexdigest()
+    return os.path.join(cache_dir, name[:2], name + '.pickle')
+
+
+def _load(path):
+    try:
+        with open(path, 'rb') as entry_file:
+            seconds, data = pickle.load(entry_file)
+    except (IOError, OSError):
+        return None
+    except Exception:
+        log.warning('Dropping unreadable parse cache entry %s', path)
+        os.remove(path)
+        return None
+    # Hits keep their entry from being pruned
+    os.utime(path, None)
+    return seconds, data
+
+
+def _store(path, seconds, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as entry_file:
+            pickle.dump((seconds, data), entry_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception:
+        # Not every parse result pickles, those modules are parsed every time
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def cached_read_file(read_file, stats):
+    """
+    Wrap an AutoAPI mapper's ``read_file`` with the parse cache.
+
+    ``stats(app)`` returns the dict the counters are added to.
+    """
+    def wrapper(self, path, **kwargs):
+        cache_dir = self.app.config.pydoc_parse_cache
+        if not cache_dir:
+            return read_file(self, path, **kwargs)
+        counters = stats(self.app)
+        for name in ('parse_hits', 'parse_misses', 'parse_saved'):
+            counters.setdefault(name, 0)
+        try:
+            with open(path, 'rb') as source_file:
+                source = source_file.read()
+        except (IOError, OSError):
+            return read_file(self, path, **kwargs)
+
+        entry = entry_path(cache_dir, path, source)
+        started = time.time()
+        cached = _load(entry)
+        if cached is not None:
+            seconds, data = cached
+            counters['parse_hits'] += 1
+            counters['parse_saved'] += max(seconds - (time.time() - started), 0)
+            return data
+
+        started = time.time()
+        data = read_file(self, path, **kwargs)
+        counters['parse_misses'] += 1
+        if data is not None:
+            _store(entry, time.time() - started, data)
+        return data
+    wrapper.pydoc_parse_cache = True
+    return wrapper
+
+
+def install(stats):
+    """Patch AutoAPI's Python mapper, a no-op when it's missing or patched already."""
+    global _installed  # pylint: disable=global-statement
+    if _installed:
+        return
+    try:
+        from autoapi.mappers import PythonSphinxMapper
+    except ImportError:
+        return
+    PythonSphinxMapper.read_file = cached_read_file(PythonSphinxMapper.read_file, stats)
+    _installed = True
+
+
+def prune(app, exception):
+    """Remove the entries no build used for ``MAX_AGE``."""
+    cache_dir = app.config.pydoc_parse_cache
+    if exception is not None or not cache_dir or not os.path.isdir(cache_dir):
+        return
+    oldest = time.time() - MAX_AGE
+    for dirpath, _, filenames in os.walk(cache_dir):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                if os.path.getmtime(path) < oldest:
+                    os.remove(path)
+            except OSError:
+                pass
@@ -15,6 +15,9 @@ urlpatterns = [
     url(r'^about/$', TemplateView.as_view(template_name='pages/about.html'), name='about'),
     url(r'^build/$', core_views.BuildView.as_view(), name='build'),
     url(r'^search/$', core_views.ProjectSearchView.as_view(), name='search'),
+    url(r'^symbols/$', core_views.SymbolSearchView.as_view(), name='symbols'),
+    url(r'^pages/$', core_views.PageSearchView.as_view(), name='pages'),
+    url(r'^metrics$', core_views.MetricsView.as_view(), name='metrics'),
 
     # Django Admin, use {% url 'admin:index' %}
     url(settings.ADMIN_URL, admin.site.urls),
@@ -27,7 +30,12 @@ urlpatterns = [
 
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
-urlpatterns += static('/pypi/', document_root=str(settings.DOCS_DIR))
+if settings.DOCS_STORAGE == 'archive':
+    urlpatterns += [
+        url(r'^pypi/(?P<release>[^/]+)/(?P<path>.*)$', core_views.DocsView.as_view(), name='docs'),
+    ]
+else:
+    urlpatterns += static('/pypi/', document_root=str(settings.DOCS_DIR))
 
 if settings.DEBUG:
     # This allows the error pages to be debugged during development, just visit